@@ -0,0 +1,62 @@
+"""
+Throughput benchmark for src.due_parser over the captured period corpus.
+
+Usage:
+    python -m benchmarks.bench_due_parser [--repeat N]
+
+The corpus is replayed with the same skew real postings have (a handful of
+period strings dominate), once with the LRU cache cleared before every call
+(cold) and once with it warm.
+"""
+import argparse
+import os
+import random
+import time
+
+from src.due_parser import parse_period, tokenize_period
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "period_strings.txt")
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def build_workload(corpus, size, seed=7):
+    # Zipf-like skew: earlier lines in the corpus are the common ones.
+    rng = random.Random(seed)
+    weights = [1.0 / (i + 1) for i in range(len(corpus))]
+    return rng.choices(corpus, weights=weights, k=size)
+
+
+def run(workload, cold):
+    start = time.perf_counter()
+    for s in workload:
+        if cold:
+            tokenize_period.cache_clear()
+        parse_period(s)
+    elapsed = time.perf_counter() - start
+    return len(workload) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200_000)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    workload = build_workload(corpus, args.repeat)
+
+    cold = run(workload, cold=True)
+    tokenize_period.cache_clear()
+    warm = run(workload, cold=False)
+    info = tokenize_period.cache_info()
+
+    print(f"corpus: {len(corpus)} distinct strings, workload: {len(workload)}")
+    print(f"cold (no cache): {cold:,.0f} strings/sec")
+    print(f"warm (LRU):      {warm:,.0f} strings/sec  (hits={info.hits}, misses={info.misses})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Local stand-in for the Telegram Bot API, for end-to-end load tests.
+
+Implements the subset the bot uses: getMe, getUpdates (long polling),
+setWebhook / deleteWebhook / getWebhookInfo, sendMessage and
+answerCallbackQuery. Point the bot at it with
+TELEGRAM_API_BASE_URL=http://127.0.0.1:<port>/bot (see
+telegram_bot.create_app and run_once), or use FakeTelegram.base_url.
+
+Faults are configurable (FakeConfig): a random latency per request,
+Telegram's per-chat send rate (429 with retry_after when exceeded), a
+random share of 429s, and the message length limit (400 "message is too
+long").
+
+Tests and the load driver send user messages and wait for the bot's
+first reply with ask() (asyncio), or use send_user_message() / replies(). The
+server runs in its own threads, like the real API runs elsewhere, so a
+busy bot loop doesn't slow the server down.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+# Parameters PTB sends as plain strings; everything else is JSON-encoded
+STRING_PARAMS = {"text", "parse_mode", "callback_query_id", "url", "secret_token"}
+
+
+@dataclass
+class FakeConfig:
+    latency: Tuple[float, float] = (0.0, 0.0)  # seconds, uniform per request
+    per_chat_rate: Optional[float] = None       # sendMessage/s allowed per chat (Telegram: ~1)
+    error_429_rate: float = 0.0                 # share of sendMessage answered with 429
+    retry_after: int = 1
+    max_message_length: int = 4096
+    seed: Optional[int] = None
+
+
+@dataclass
+class SentMessage:
+    chat_id: int
+    text: str
+    at: float                 # time.perf_counter() when accepted
+    message_id: int
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+class TelegramError(Exception):
+    def __init__(self, code: int, description: str, retry_after: Optional[int] = None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.retry_after = retry_after
+
+
+class FakeTelegram:
+    def __init__(self, config: Optional[FakeConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Condition()
+        self._updates: List[dict] = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._last_send: Dict[int, float] = {}
+        self.sent: List[SentMessage] = []
+        self.webhook_url = ""
+        self.stats = {"requests": 0, "sent": 0, "429": 0, "too_long": 0, "callback_answers": 0}
+        self._waiters: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._running = False
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> "FakeTelegram":
+        self._running = True
+        threading.Thread(target=self._server.serve_forever, name="fake-telegram", daemon=True).start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._lock.notify_all()  # release long polls
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- what users do ---
+
+    def send_user_message(self, chat_id: int, text: str) -> int:
+        """Queue a private-chat message from a user; returns its update_id."""
+        with self._lock:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            message_id = self._next_message_id
+            self._next_message_id += 1
+            message = {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+                "text": text,
+            }
+            if text.startswith("/"):
+                command = text.split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+            self._updates.append({"update_id": update_id, "message": message})
+            self._lock.notify_all()
+            return update_id
+
+    def send_callback_query(self, chat_id: int, data: str) -> int:
+        with self._lock:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            self._updates.append({"update_id": update_id, "callback_query": {
+                "id": str(update_id), "chat_instance": str(chat_id), "data": data,
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            }})
+            self._lock.notify_all()
+            return update_id
+
+    def expect_reply(self, chat_id: int) -> asyncio.Future:
+        """Future for the next message the bot sends to `chat_id`; create it before sending the update."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._waiters.setdefault(chat_id, []).append((loop, future))
+        return future
+
+    async def ask(self, chat_id: int, text: str, timeout: float = 10.0) -> Tuple[SentMessage, float]:
+        """Send `text` as the user and wait for the bot's first reply: (reply, seconds)."""
+        future = self.expect_reply(chat_id)
+        started = time.perf_counter()
+        self.send_user_message(chat_id, text)
+        try:
+            reply = await asyncio.wait_for(future, timeout)
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(chat_id, [])
+                waiters[:] = [w for w in waiters if w[1] is not future]
+        return reply, reply.at - started
+
+    def replies(self, chat_id: int) -> List[SentMessage]:
+        with self._lock:
+            return [m for m in self.sent if m.chat_id == chat_id]
+
+    # --- Bot API methods ---
+
+    def _get_me(self, params):
+        return BOT_USER
+
+    def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if self.webhook_url:
+                raise TelegramError(409, "Conflict: can't use getUpdates method while webhook is active")
+            # Confirmed updates are forgotten, as on the real API
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and time.monotonic() < deadline and self._running:
+                self._lock.wait(deadline - time.monotonic())
+            return self._updates[:limit]
+
+    def _set_webhook(self, params):
+        self.webhook_url = params.get("url", "")
+        return True
+
+    def _delete_webhook(self, params):
+        self.webhook_url = ""
+        if params.get("drop_pending_updates"):
+            with self._lock:
+                self._updates.clear()
+        return True
+
+    def _get_webhook_info(self, params):
+        return {"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": len(self._updates)}
+
+    def _send_message(self, params):
+        chat_id = int(params["chat_id"])
+        text = params.get("text", "")
+        if not text:
+            raise TelegramError(400, "Bad Request: message text is empty")
+        with self._lock:
+            now = time.perf_counter()
+            if len(text) > self.config.max_message_length:
+                self.stats["too_long"] += 1
+                raise TelegramError(400, "Bad Request: message is too long")
+            rate = self.config.per_chat_rate
+            last = self._last_send.get(chat_id)
+            if (rate and last is not None and now - last < 1.0 / rate) or self._rng.random() < self.config.error_429_rate:
+                self.stats["429"] += 1
+                raise TelegramError(429, f"Too Many Requests: retry after {self.config.retry_after}",
+                                    retry_after=self.config.retry_after)
+            self._last_send[chat_id] = now
+            message = SentMessage(chat_id, text, now, self._next_message_id, params)
+            self._next_message_id += 1
+            self.sent.append(message)
+            self.stats["sent"] += 1
+            waiters = self._waiters.pop(chat_id, [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(message))
+        return {
+            "message_id": message.message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text,
+        }
+
+    def _answer_callback_query(self, params):
+        with self._lock:
+            self.stats["callback_answers"] += 1
+        return True
+
+    METHODS = {
+        "getme": _get_me,
+        "getupdates": _get_updates,
+        "setwebhook": _set_webhook,
+        "deletewebhook": _delete_webhook,
+        "getwebhookinfo": _get_webhook_info,
+        "sendmessage": _send_message,
+        "answercallbackquery": _answer_callback_query,
+    }
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Tuple[int, dict]:
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self._rng.uniform(*self.config.latency)
+        if delay:
+            time.sleep(delay)
+        func = self.METHODS.get(method.lower())
+        if func is None:
+            return 404, {"ok": False, "error_code": 404, "description": f"Not Found: method {method} not supported"}
+        try:
+            return 200, {"ok": True, "result": func(self, params)}
+        except TelegramError as e:
+            body = {"ok": False, "error_code": e.code, "description": e.description}
+            if e.retry_after is not None:
+                body["parameters"] = {"retry_after": e.retry_after}
+            return e.code, body
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like api.telegram.org
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length).decode("utf-8") if length else ""
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(raw or "{}")
+                else:
+                    params = {k: _decode(k, v) for k, v in parse_qsl(raw, keep_blank_values=True)}
+                status, body = fake.handle(self.path.rstrip("/").rsplit("/", 1)[-1], params)
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (e.g. a long poll cancelled at shutdown)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _decode(name: str, value: str) -> Any:
+    if name in STRING_PARAMS:
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
@@ -0,0 +1,152 @@
+"""
+End-to-end load test of the bot against the fake Bot API (fake_telegram.py).
+
+Usage:
+    python -m benchmarks.load_bot [--chats 50] [--sessions 2] [--programs 2000]
+                                  [--latency-ms 20,60] [--per-chat-rate 0] [--rate-429 0]
+                                  [--digest]
+
+Runs the real application (create_app handlers, polling through PTB)
+against a throwaway database seeded with synthetic postings. Every
+simulated chat replays SESSION --sessions times, one command after the
+other's reply, all chats at once. Reports latency (command sent -> first
+reply accepted by the API) per command, plus overall throughput. With
+--digest, every profile's scheduled digest job is run concurrently
+afterwards.
+
+The database and chat allow-list come from the environment at import
+time, so they are set before anything from src is imported.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.fake_telegram import FakeConfig, FakeTelegram
+
+TOKEN = "123456:FAKE"
+FIRST_CHAT = 10_001
+# One user's visit; {key} is a seeded posting's link key
+SESSION = ["/start", "/digest", "/support 5", "/events", "/due", "/save_{key}", "/changes 7", "/profile"]
+
+
+def seed(count: int):
+    from src.db import upsert_program
+    from src.normalizer import normalize_support
+    topics = ["AI", "빅데이터", "수출", "R&D", "창업", "스마트공장", "바우처", "인력"]
+    regions = ["서울", "경기", "부산", "전국", "대구", "인천"]
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        upsert_program(normalize_support({
+            "pblancId": f"PBLN_{i:06d}",
+            "pblancNm": f"[{regions[i % len(regions)]}] 2026년 {topic} 지원사업 {i}차 공고",
+            "bsnsSumryCn": f"{topic} 분야 중소기업 대상 지원. 사업화 자금 및 컨설팅 제공.",
+            "jrsdinstNm": "중소벤처기업부",
+            "reqstBeginEndDe": f"20260101 ~ 2026{(i % 12) + 1:02d}28",
+        }))
+
+
+def script(n: int, args) -> list:
+    key = f"support_PBLN_{n % args.programs:06d}"
+    return [command.format(key=key) for command in SESSION]
+
+
+def command_name(text: str) -> str:
+    name = text.split()[0]
+    return "/save" if name.startswith("/save_") else name
+
+
+async def run_session(fake, chat_id, script, timeout, latencies, failures):
+    for text in script:
+        try:
+            _, seconds = await fake.ask(chat_id, text, timeout)
+            latencies[command_name(text)].append(seconds)
+        except asyncio.TimeoutError:
+            failures[command_name(text)] += 1
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def report(latencies, failures, elapsed, fake):
+    total = sum(len(v) for v in latencies.values())
+    print(f"{'command':<12}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'timeouts':>10}")
+    for name in sorted(set(latencies) | set(failures)):
+        values = latencies.get(name) or [float("nan")]
+        print(f"{name:<12}{len(latencies.get(name, [])):>6}{statistics.median(values) * 1000:>10.1f}"
+              f"{percentile(values, 0.95) * 1000:>10.1f}{max(values) * 1000:>10.1f}{failures.get(name, 0):>10}")
+    print(f"\n{total} replies in {elapsed:.2f}s: {total / elapsed:.1f} commands/s")
+    print(f"API: {fake.stats}")
+
+
+async def drive(args):
+    config = FakeConfig(
+        latency=tuple(float(x) / 1000 for x in args.latency_ms.split(",")),
+        per_chat_rate=args.per_chat_rate or None,
+        error_429_rate=args.rate_429,
+        seed=1,
+    )
+    chats = list(range(FIRST_CHAT, FIRST_CHAT + args.chats))
+    with FakeTelegram(config) as fake, tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "DB_PATH": os.path.join(tmp, "bot.db"),
+            "TELEGRAM_ALLOWED_CHAT_ID": str(chats[0]),
+            "TELEGRAM_ALLOWED_CHAT_IDS": ",".join(map(str, chats)),
+            "TELEGRAM_API_BASE_URL": fake.base_url,
+        })
+        from src import hot_set
+        from src.db import init_db
+        from src.telegram_bot import create_app
+
+        init_db()
+        seed(args.programs)
+        hot_set.load()
+
+        app = create_app(TOKEN)
+        await app.initialize()
+        await app.start()
+        await app.updater.start_polling(poll_interval=0, timeout=1)
+        try:
+            latencies, failures = defaultdict(list), defaultdict(int)
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                run_session(fake, chat, script(n, args) * args.sessions, args.timeout, latencies, failures)
+                for n, chat in enumerate(chats)
+            ))
+            report(latencies, failures, time.perf_counter() - started, fake)
+
+            if args.digest:
+                from src.db import list_profiles
+                from src.scheduler import run_digest_job
+                profiles = [p["id"] for p in list_profiles()]
+                sent_before = fake.stats["sent"]
+                started = time.perf_counter()
+                await asyncio.gather(*(run_digest_job(app, pid) for pid in profiles))
+                elapsed = time.perf_counter() - started
+                print(f"\ndigest: {len(profiles)} profiles, {fake.stats['sent'] - sent_before} sent in {elapsed:.2f}s")
+        finally:
+            await app.updater.stop()
+            await app.stop()
+            await app.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=2, help="times each chat replays SESSION")
+    parser.add_argument("--programs", type=int, default=2000)
+    parser.add_argument("--latency-ms", default="20,60", help="fake API latency range per request")
+    parser.add_argument("--per-chat-rate", type=float, default=0, help="sendMessage/s per chat before 429 (0: off)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of sendMessage answered with 429")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for a reply")
+    parser.add_argument("--digest", action="store_true", help="also run every profile's digest job")
+    asyncio.run(drive(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import re
+from typing import Optional, Tuple
+
+ACTIONS = {"save": "saved", "dismiss": "dismissed"}
+
+# /save_<key> (clickable links in lists) or /save <key> (PRD); same for /dismiss.
+# Anchored, so ordinary chat text ("saved it", "unsave x") is never an action.
+_ACTION_RE = re.compile(r"^/(save|dismiss)(?:_(\S+)|(?:@\w+)?\s+(\S+))")
+# /open_<key> (links in digests and /changes)
+_OPEN_RE = re.compile(r"^/open_(\S+)")
+
+def _link_key(link_key: str) -> str:
+    # Telegram commands can't contain ':', so links use '_':
+    # "support:123" -> "support_123". "event:ABC" -> "event_ABC".
+    # Bizinfo IDs are usually numeric or alphanumeric; only the first '_' is the separator.
+    # In groups Telegram appends "@botname" to the command.
+    return link_key.split("@", 1)[0].replace("_", ":", 1)
+
+def parse_action_command(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Parses a save/dismiss command into (action, program_key).
+    Supports both /save <id> (PRD) and /save_<id> (clickable links in lists).
+    Returns None if the text isn't one.
+    """
+    match = _ACTION_RE.match(text or "")
+    if not match:
+        return None
+    command, link_key, key = match.groups()
+    if link_key:
+        key = _link_key(link_key)
+    if not key:
+        return None
+    return ACTIONS[command], key
+
+def parse_open_command(text: str) -> Optional[str]:
+    """Program key of an /open_<key> link, or None."""
+    match = _OPEN_RE.match(text or "")
+    if not match:
+        return None
+    return _link_key(match.group(1)) or None
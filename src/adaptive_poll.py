@@ -0,0 +1,66 @@
+"""
+Adaptive ingestion interval per feed.
+
+Each poll records how many items were new or changed, as a rate per hour,
+into an EWMA bucket for the KST hour of week it ran in (db.poll_stats).
+The next poll is scheduled when the expected number of changes since the
+last poll reaches TARGET_CHANGES, walking forward hour by hour through the
+learned rates, and clamped to [min, max] interval. Busy hours (weekday
+mornings) get polled often, quiet ones (nights, weekends) rarely.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from .db import record_poll, get_poll_rates, get_feed_state
+
+KST = timezone(timedelta(hours=9))
+
+MIN_INTERVAL = timedelta(minutes=int(os.getenv("INGEST_MIN_INTERVAL_MINUTES", "30")))
+MAX_INTERVAL = timedelta(minutes=int(os.getenv("INGEST_MAX_INTERVAL_MINUTES", "360")))
+
+# Poll once about this many changes are expected to have accumulated
+TARGET_CHANGES = 1.0
+# Rate assumed for hours never observed yet (changes/hour): polls hourly
+# until real data exists.
+DEFAULT_RATE = 1.0
+EWMA_ALPHA = 0.3
+
+
+def hour_of_week(dt: datetime) -> int:
+    """0 = Monday 00:00-00:59 KST ... 167 = Sunday 23:00-23:59 KST."""
+    dt = dt.astimezone(KST)
+    return dt.weekday() * 24 + dt.hour
+
+
+def next_interval(rates: Dict[int, float], now: datetime,
+                  min_interval: timedelta = MIN_INTERVAL,
+                  max_interval: timedelta = MAX_INTERVAL) -> timedelta:
+    expected = 0.0
+    elapsed = timedelta(0)
+    t = now.astimezone(KST)
+    while elapsed < max_interval:
+        # Remainder of the current hour, then whole hours
+        step = timedelta(minutes=60 - t.minute) if elapsed == timedelta(0) else timedelta(hours=1)
+        rate = rates.get(hour_of_week(t), DEFAULT_RATE)
+        gain = rate * step.total_seconds() / 3600
+        if rate > 0 and expected + gain >= TARGET_CHANGES:
+            elapsed += timedelta(hours=(TARGET_CHANGES - expected) / rate)
+            break
+        expected += gain
+        elapsed += step
+        t += step
+    return max(min_interval, min(max_interval, elapsed))
+
+
+def record_and_plan(feed: str, changes: int, now: Optional[datetime] = None) -> timedelta:
+    """
+    Record one poll of `feed` that found `changes` new/changed items and
+    return the delay until the next poll.
+    """
+    now = now or datetime.now(KST)
+    last = get_feed_state(feed).get("last_polled_at")
+    if last:
+        hours = max((now - datetime.fromisoformat(last)).total_seconds() / 3600, 1 / 60)
+        record_poll(feed, hour_of_week(now), changes / hours, EWMA_ALPHA)
+    return next_interval(get_poll_rates(feed), now)
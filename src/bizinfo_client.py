@@ -1,24 +1,170 @@
 import os
+import hashlib
+import time
 import requests
 import json
-import xmltodict
-from typing import List, Dict, Any, Optional
+from collections import deque
+from typing import Deque, List, Dict, Any, Optional, Tuple
 import logging
 
+from . import fetch_policy, tracing
+from .fetch_policy import FetchError
+
 logger = logging.getLogger(__name__)
 
 SUPPORT_API_URL = "https://www.bizinfo.go.kr/uss/rss/bizinfoApi.do"
 EVENT_API_URL = "https://www.bizinfo.go.kr/uss/rss/bizinfoEventApi.do"
+# Feed kind of each endpoint (per-endpoint deadlines, see fetch_policy.py)
+FEED_KINDS = {SUPPORT_API_URL: "support", EVENT_API_URL: "event"}
+
+def _item_list(url: str, items: Any) -> List[Dict[str, Any]]:
+    # A single item comes back as an object instead of a list (XML); anything
+    # else the normalizers can't read is a bad response, not an empty feed.
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise FetchError(f"Unexpected item list from {url}: {type(items).__name__}")
+    return items
+
+def empty_stats() -> Dict[str, Any]:
+    """
+    Per-fetch telemetry: HTTP requests made and succeeded (pages), bytes, last
+    status, ms spent, and hedged second requests sent.
+    """
+    return {"attempts": 0, "pages": 0, "bytes": 0, "http_status": None, "http_ms": 0, "decode_ms": 0, "hedges": 0}
+
+def _attempt_stats() -> Dict[str, Any]:
+    return {"attempts": 1, "pages": 0, "bytes": 0, "http_status": None, "http_ms": 0}
 
 class BizinfoClient:
     def __init__(self):
         self.support_key = os.getenv("BIZINFO_SUPPORT_KEY")
         self.event_key = os.getenv("BIZINFO_EVENT_KEY")
+        # Conditional-fetch validators per URL: etag / last_modified / body_hash.
+        # Callers may preload them (e.g. from the feed_state table) and read them back.
+        self.validators: Dict[str, Dict[str, Optional[str]]] = {}
+        # Validators of the last changed response, adopted by commit_validators()
+        # only once the caller has stored its items: a run that fails halfway
+        # must not make the next poll skip a body that was never ingested.
+        self.pending_validators: Dict[str, Dict[str, Optional[str]]] = {}
+        # Whether the last fetch of a URL found nothing new (304 or identical body)
+        self.not_modified: Dict[str, bool] = {}
+        # Telemetry of the last fetch of a URL (see empty_stats), and recent
+        # request latencies in seconds (hedging threshold; callers may preload them)
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.latencies: Dict[str, Deque[float]] = {}
+    
+    def _conditional_headers(self, url: str) -> Dict[str, str]:
+        validators = self.validators.get(url, {})
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+    
+    def _is_unchanged(self, url: str, response) -> bool:
+        # 304, or the same body as last time (the API may ignore validators):
+        # either way an idle poll costs no decoding or upserts.
+        if response.status_code == 304:
+            return True
+        body_hash = hashlib.sha1(response.content).hexdigest()
+        if body_hash == self.validators.get(url, {}).get("body_hash"):
+            return True
+        self.pending_validators[url] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "body_hash": body_hash,
+        }
+        return False
+    
+    def commit_validators(self, url: str) -> Dict[str, Optional[str]]:
+        """Adopt the last response's validators after its items were stored; returns them to persist."""
+        pending = self.pending_validators.pop(url, None)
+        if pending is not None:
+            self.validators[url] = pending
+        return self.validators.get(url, {})
+    
+    def _policy(self, url: str, probe: bool) -> fetch_policy.Policy:
+        # A half-open circuit gets a single probe; hedging needs enough latency samples
+        hedge_after = fetch_policy.p95(self.latencies.get(url, ())) if fetch_policy.FETCH_HEDGE else None
+        deadline = fetch_policy.FETCH_DEADLINES.get(FEED_KINDS.get(url), fetch_policy.FETCH_DEADLINE_SECONDS)
+        return fetch_policy.Policy(deadline=deadline, retries=0 if probe else fetch_policy.FETCH_RETRIES,
+                                   hedge_after=hedge_after)
+    
+    def _get(self, url: str, params: Dict, headers: Optional[Dict[str, str]], timeout: float,
+             stats: Dict[str, Any]):
+        # `stats` belongs to this attempt only (see _call); hedged attempts run on other threads
+        started = time.monotonic()
+        with tracing.span("http.get", attempt=self.stats[url]["attempts"] + 1, timeout=round(timeout, 1)) as span:
+            try:
+                response = requests.get(url, params=params, headers=headers, timeout=timeout)
+                stats["http_status"] = response.status_code
+                span.set(status=response.status_code, bytes=len(response.content))
+                response.raise_for_status()
+            finally:
+                stats["http_ms"] += round((time.monotonic() - started) * 1000)
+        stats["pages"] += 1
+        stats["bytes"] += len(response.content)
+        self.latencies.setdefault(url, deque(maxlen=fetch_policy.LATENCY_WINDOW)).append(time.monotonic() - started)
+        return response
+    
+    def _call(self, url: str, params: Dict, headers, policy: fetch_policy.Policy, deadline_at: float):
+        """
+        One fetch_policy.call of a GET. Each attempt records into its own
+        stats; the failed ones and the winner are added to self.stats[url]
+        here, on the caller's thread. A hedged request that lost may still
+        be running and is never counted, so nothing is counted twice.
+        """
+        failed: List[Dict[str, Any]] = []
+        hedges = []
+
+        def request(timeout: float) -> Tuple[Any, Dict[str, Any]]:
+            attempt = _attempt_stats()
+            try:
+                return self._get(url, params, headers(), timeout, attempt), attempt
+            except Exception:
+                failed.append(attempt)
+                raise
+
+        try:
+            response, won = fetch_policy.call(request, policy, deadline_at, on_hedge=lambda: hedges.append(1))
+        except FetchError:
+            self._merge_stats(url, list(failed), len(hedges))
+            raise
+        self._merge_stats(url, list(failed) + [won], len(hedges))
+        return response
+    
+    def _merge_stats(self, url: str, attempts: List[Dict[str, Any]], hedges: int):
+        stats = self.stats[url]
+        for attempt in attempts:
+            for key in ("attempts", "pages", "bytes", "http_ms"):
+                stats[key] += attempt[key]
+            if attempt["http_status"] is not None:
+                stats["http_status"] = attempt["http_status"]
+        stats["hedges"] += hedges
     
-    def _fetch(self, url: str, api_key: str, params: Optional[Dict] = None) -> List[Dict[str, Any]]:
+    def _fetch(self, url: str, api_key: str, params: Optional[Dict] = None, probe: bool = False) -> List[Dict[str, Any]]:
+        """
+        Items of one feed; [] only when there really is nothing (new).
+        Raises FetchError when the feed can't be fetched (see fetch_policy.py).
+        """
+        with tracing.span("bizinfo.fetch", url=url.rsplit("/", 1)[-1], probe=probe) as span:
+            try:
+                items = self._fetch_items(url, api_key, params, probe)
+            finally:
+                stats = self.stats[url]
+                span.set(attempts=stats["attempts"], pages=stats["pages"], bytes=stats["bytes"],
+                         hedges=stats["hedges"], not_modified=self.not_modified[url])
+            span.set(items=len(items))
+            return items
+
+    def _fetch_items(self, url: str, api_key: str, params: Optional[Dict], probe: bool) -> List[Dict[str, Any]]:
+        self.not_modified[url] = False
+        self.pending_validators.pop(url, None)
+        self.stats[url] = empty_stats()
         if not api_key:
-            logger.warning("API key not provided for %s", url)
-            return []
+            raise FetchError(f"API key not provided for {url}")
             
         base_params = {
             "crtfcKey": api_key,
@@ -27,57 +173,57 @@ class BizinfoClient:
         }
         if params:
             base_params.update(params)
+        
+        # JSON and the XML fallback share one deadline
+        policy = self._policy(url, probe)
+        deadline_at = time.monotonic() + policy.deadline
             
         # Try JSON
+        response = self._call(url, base_params, lambda: self._conditional_headers(url), policy, deadline_at)
+        if self._is_unchanged(url, response):
+            self.not_modified[url] = True
+            return []
+        
+        # Check if response is actually JSON (sometimes APIs return XML even if dataType=json on error or quirk)
+        started = time.monotonic()
         try:
-            response = requests.get(url, params=base_params, timeout=10)
-            response.raise_for_status()
-            
-            # Check if response is actually JSON (sometimes APIs return XML even if dataType=json on error or quirk)
-            try:
-                data = response.json()
-                # Structure: { "jsonArray": [ ... ] } usually
-                items = data.get("jsonArray", [])
-                if items:
-                    return items
-            except json.JSONDecodeError:
-                logger.info("JSON decode failed, attempting XML fallback for %s", url)
-                pass # Fallback to XML
-        except Exception as e:
-            logger.error(f"Error fetching JSON from {url}: {e}")
-            # Depending on error, we might want to fail or try XML. 
-            # If 404/500, XML might not help. But if content-type issue, maybe.
-            pass
+            data = response.json()
+        except json.JSONDecodeError:
+            logger.info("JSON decode failed, attempting XML fallback for %s", url)
+        else:
+            # Structure: { "jsonArray": [ ... ] } usually
+            if not isinstance(data, dict):
+                raise FetchError(f"Unexpected JSON from {url}: {type(data).__name__} body")
+            items = _item_list(url, data.get("jsonArray") or [])
+            if items:
+                return items
+        finally:
+            self.stats[url]["decode_ms"] += round((time.monotonic() - started) * 1000)
 
         # Fallback to XML (remove dataType=json)
-        base_params.pop("dataType", None)
+        xml_params = {k: v for k, v in base_params.items() if k != "dataType"}
+        response = self._call(url, xml_params, lambda: None, policy, deadline_at)
+        started = time.monotonic()
         try:
-            response = requests.get(url, params=base_params, timeout=10)
-            response.raise_for_status()
-            
-            # Parse XML
+            # Parse XML (xmltodict is only needed on this fallback path)
+            import xmltodict
             xml_data = xmltodict.parse(response.content)
-            # Structure: <rss><channel><item>...</item></channel></rss>
-            # OR <response><body><items>...
-            # Bizinfo RSS usually: rss -> channel -> item (list or dict)
-            
-            rss = xml_data.get('rss', {})
-            channel = rss.get('channel', {})
-            items = channel.get('item', [])
-            
-            if isinstance(items, dict):
-                return [items]
-            elif isinstance(items, list):
-                return items
-            else:
-                return []
-                
         except Exception as e:
-            logger.error(f"Error fetching/parsing XML from {url}: {e}")
-            return []
+            raise FetchError(f"Unparseable XML from {url}: {e}") from e
+        finally:
+            self.stats[url]["decode_ms"] += round((time.monotonic() - started) * 1000)
+        
+        # Structure: <rss><channel><item>...</item></channel></rss>
+        # OR <response><body><items>...
+        # Bizinfo RSS usually: rss -> channel -> item (list or dict)
+        rss = xml_data.get('rss') or {}
+        channel = (rss.get('channel') if isinstance(rss, dict) else None) or {}
+        if not isinstance(channel, dict):
+            raise FetchError(f"Unexpected XML from {url}: no <channel>")
+        return _item_list(url, channel.get('item') or [])
 
-    def fetch_support_programs(self) -> List[Dict[str, Any]]:
-        return self._fetch(SUPPORT_API_URL, self.support_key)
+    def fetch_support_programs(self, probe: bool = False) -> List[Dict[str, Any]]:
+        return self._fetch(SUPPORT_API_URL, self.support_key, probe=probe)
 
-    def fetch_events(self) -> List[Dict[str, Any]]:
-        return self._fetch(EVENT_API_URL, self.event_key)
+    def fetch_events(self, probe: bool = False) -> List[Dict[str, Any]]:
+        return self._fetch(EVENT_API_URL, self.event_key, probe=probe)
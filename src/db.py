@@ -1,21 +1,106 @@
 import sqlite3
+from array import array
 import json
 import os
-from datetime import datetime
-from typing import List, Optional, Any
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Any, Set, Tuple
+from . import dedup, metrics, profile_index, regions, tracing
+from .models import (
+    Program, ProgramLike, PROGRAM_COLUMNS, CONTENT_COLUMNS, FIELD_HASH_SIZE, MATCH_COLUMNS, field_hashes,
+    index_terms, match_text, program_row_factory
+)
 
 DB_PATH = os.getenv("DB_PATH", "data/bot.db")
 
+# Fixed column order shared with models.Program, so statements are built once.
+_INSERT_PROGRAM_SQL = f"""
+INSERT INTO programs ({",".join(PROGRAM_COLUMNS)}, field_hashes) VALUES ({",".join(["?"] * (len(PROGRAM_COLUMNS) + 1))})
+"""
+
+# Change detection compares the stored per-field hashes (one small blob)
+# and reads old values only for the fields that differ.
+_SELECT_FIELD_HASHES_SQL = "SELECT field_hashes FROM programs WHERE program_key=?"
+
+# Columns never needed to list or score programs; read as NULL so list
+# queries keep the Program column order without dragging blobs into memory.
+LAZY_PROGRAM_COLUMNS = ("raw_item",)
+_PROGRAM_SELECT = ", ".join("NULL" if c in LAZY_PROGRAM_COLUMNS else c for c in PROGRAM_COLUMNS)
+
 def get_connection():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    # MeteredConnection charges its open time to the handler/job being measured
+    conn = sqlite3.connect(DB_PATH, factory=metrics.MeteredConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
+# Bump on every change to _create_schema (tables, columns, indexes,
+# backfills) so existing databases run it once more.
+SCHEMA_VERSION = 3
+
+def _add_missing_columns(cursor, table: str, columns: dict):
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+def env_profile_overrides() -> dict:
+    """Profile fields set through PROFILE_* env vars (GitHub secrets)."""
+    # Handle empty strings (if secret exists but is empty)
+    overrides = {}
+    for env_name, column in (
+        ("PROFILE_REGIONS", "region_allow"),  # Already JSON string expected in env
+        ("PROFILE_INTERESTS", "interests"),
+        ("PROFILE_KEYWORDS", "include_keywords"),
+        ("PROFILE_EXCLUDES", "exclude_keywords"),
+    ):
+        value = os.getenv(env_name)
+        if value and value.strip():
+            overrides[column] = value
+    min_score = os.getenv("PROFILE_MIN_SCORE")
+    if min_score and min_score.strip():
+        overrides["min_score"] = int(min_score)
+    return overrides
+
+def _rebuild_if_outdated(cursor, table: str, old_marker: str, create_sql: str):
+    """
+    Create `table`, or rebuild it from `create_sql` when its stored schema
+    still contains `old_marker` (SQLite can't drop constraints in place).
+    Common columns are copied over; new ones take their defaults.
+    """
+    row = cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    if row and old_marker in row[0].replace(" ", "").replace("\n", ""):
+        old_columns = {r[1] for r in cursor.execute(f"PRAGMA table_info({table})")}
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        cursor.execute(create_sql)
+        new_columns = [r[1] for r in cursor.execute(f"PRAGMA table_info({table})")]
+        common = ", ".join(c for c in new_columns if c in old_columns)
+        cursor.execute(f"INSERT INTO {table} ({common}) SELECT {common} FROM {table}_old")
+        cursor.execute(f"DROP TABLE {table}_old")
+    else:
+        cursor.execute(create_sql)
+
 def init_db():
+    global _profile_cache, _profile_index, _chat_profiles
+    _profile_cache = {}
+    _profile_index = None
+    _chat_profiles = {}
     conn = get_connection()
     cursor = conn.cursor()
 
+    # The DDL, migrations and backfills only run when the file is behind
+    # SCHEMA_VERSION; an up-to-date database starts with one PRAGMA read.
+    if cursor.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        _create_schema(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    owner_chat = os.getenv("TELEGRAM_ALLOWED_CHAT_ID", "").strip()
+    if owner_chat:
+        cursor.execute("UPDATE company_profile SET chat_id=? WHERE id=1 AND chat_id IS NULL", (owner_chat,))
+
+    conn.commit()
+    conn.close()
+
+def _create_schema(cursor):
     # 1. programs table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS programs (
@@ -37,14 +122,28 @@ def init_db():
         url TEXT,
         created_at_source TEXT,
         updated_at_source TEXT,
-        ingested_at TEXT
+        ingested_at TEXT,
+        raw_item BLOB
     )
     """)
+    # Columns added after the first release; CREATE TABLE IF NOT EXISTS won't add them.
+    _add_missing_columns(cursor, "programs", {
+        "raw_item": "BLOB", "field_hashes": "BLOB", "cluster_id": "TEXT", "minhash": "BLOB",
+        "region_mask": "INTEGER", "doc_len": "INTEGER",
+    })
+    # Rows from before region masks, or resolved by an older gazetteer
+    rows = cursor.execute(f"SELECT program_key, region_mask, {','.join(regions.SOURCE_COLUMNS)} "
+                          "FROM programs").fetchall()
+    masks = [(regions.program_mask(dict(zip(regions.SOURCE_COLUMNS, r[2:]))), r[0], r[1]) for r in rows]
+    cursor.executemany("UPDATE programs SET region_mask=? WHERE program_key=?",
+                       [(mask, key) for mask, key, old in masks if mask != old])
 
-    # 2. company_profile table
-    cursor.execute("""
+    # 2. company_profile table (one row per chat; id 1 is the owner's,
+    # TELEGRAM_ALLOWED_CHAT_ID)
+    _rebuild_if_outdated(cursor, "company_profile", "CHECK(id=1)", """
     CREATE TABLE IF NOT EXISTS company_profile (
-        id INTEGER PRIMARY KEY CHECK(id=1),
+        id INTEGER PRIMARY KEY,
+        chat_id TEXT UNIQUE,
         region_allow TEXT,
         interests TEXT,
         include_keywords TEXT,
@@ -56,13 +155,14 @@ def init_db():
     )
     """)
 
-    # 3. user_actions table
-    cursor.execute("""
+    # 3. user_actions table (per profile)
+    _rebuild_if_outdated(cursor, "user_actions", "UNIQUE(program_key,action)", """
     CREATE TABLE IF NOT EXISTS user_actions (
         program_key TEXT,
         action TEXT,
         created_at TEXT,
-        UNIQUE(program_key, action)
+        profile_id INTEGER DEFAULT 1,
+        UNIQUE(program_key, action, profile_id)
     )
     """)
 
@@ -77,84 +177,472 @@ def init_db():
         error TEXT
     )
     """)
+    # Fetch/stage telemetry (see telemetry.py); circuit is the breaker state
+    # the run ran under (see fetch_policy.py)
+    _add_missing_columns(cursor, "ingestion_runs", {
+        "attempts": "INTEGER", "fetch_ms": "INTEGER", "circuit": "TEXT",
+        "unchanged_count": "INTEGER", "retries": "INTEGER", "pages": "INTEGER", "bytes_downloaded": "INTEGER",
+        "http_status": "INTEGER", "http_ms": "INTEGER", "decode_ms": "INTEGER", "normalize_ms": "INTEGER",
+        "upsert_ms": "INTEGER", "score_ms": "INTEGER",
+    })
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingestion_runs_kind ON ingestion_runs(kind, run_at)")
+
+    # 5. digest_artifacts table (next digest, built right after ingestion)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS digest_artifacts (
+        profile_id INTEGER PRIMARY KEY,
+        built_at TEXT,
+        profile_version TEXT,
+        program_keys TEXT,
+        text TEXT
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_programs_ingested_at ON programs(ingested_at)")
+
+    # 6. feed_state table (conditional-fetch validators, last poll per feed)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS feed_state (
+        feed TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        body_hash TEXT,
+        last_polled_at TEXT
+    )
+    """)
+
+    # 7. poll_stats table (observed change rate per feed and KST hour of week)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS poll_stats (
+        feed TEXT,
+        hour_of_week INTEGER,
+        polls INTEGER DEFAULT 0,
+        change_rate REAL DEFAULT 0,
+        PRIMARY KEY (feed, hour_of_week)
+    )
+    """)
+
+    # 8. job_runs table (last handled fire time per scheduler job, for catch-up)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS job_runs (
+        job_id TEXT PRIMARY KEY,
+        last_run_at TEXT
+    )
+    """)
+
+    # 9. notifications table (ledger of what was pushed, per channel)
+    # content_hash is models.notify_hash: a re-send happens only when the
+    # title or a deadline changed since.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS notifications (
+        program_key TEXT,
+        channel TEXT,
+        content_hash TEXT,
+        sent_at TEXT,
+        PRIMARY KEY (program_key, channel)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notifications_sent_at ON notifications(sent_at)")
+
+    # 10. program_changes table (field-level history of updated programs)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS program_changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        program_key TEXT,
+        field TEXT,
+        old_value TEXT,
+        new_value TEXT,
+        changed_at TEXT
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_program_changes_changed_at ON program_changes(changed_at)")
+
+    # 11. program_lsh table (MinHash band buckets for near-duplicate lookup)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS program_lsh (
+        band INTEGER,
+        bucket INTEGER,
+        program_key TEXT,
+        PRIMARY KEY (band, bucket, program_key)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_program_lsh_key ON program_lsh(program_key)")
+
+    # 12. preference_model table (online model from save/dismiss, see preferences.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS preference_model (
+        profile_id INTEGER PRIMARY KEY,
+        weights BLOB,
+        updates INTEGER DEFAULT 0,
+        updated_at TEXT
+    )
+    """)
+
+    # 13. profile_matches table (candidate profiles per program, see profile_index.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profile_matches (
+        profile_id INTEGER,
+        program_key TEXT,
+        matched_at TEXT,
+        PRIMARY KEY (profile_id, program_key)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profile_matches_time ON profile_matches(profile_id, matched_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profile_matches_key ON profile_matches(program_key)")
+
+    # 14. traces table (spans of sampled runs, see tracing.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS traces (
+        trace_id TEXT,
+        span_id TEXT PRIMARY KEY,
+        parent_id TEXT,
+        name TEXT,
+        started_at TEXT,
+        offset_ms REAL,
+        duration_ms REAL,
+        attrs TEXT
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_traces_trace ON traces(trace_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_traces_started ON traces(started_at)")
+
+    # 15. program_terms table (term index for BM25; doc_len on programs is the norm)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS program_terms (
+        term TEXT,
+        program_key TEXT,
+        tf INTEGER,
+        PRIMARY KEY (term, program_key)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_program_terms_key ON program_terms(program_key)")
+    # Rows from before the term index
+    for row in cursor.execute(f"SELECT program_key, {','.join(MATCH_COLUMNS)} FROM programs WHERE doc_len IS NULL").fetchall():
+        _index_terms(cursor, row[0], dict(zip(MATCH_COLUMNS, row[1:])))
 
     # Initialize default profile if running for the first time
     cursor.execute("SELECT count(*) FROM company_profile WHERE id=1")
     if cursor.fetchone()[0] == 0:
         # Load defaults from ENV if available (for GitHub Actions)
-        # Handle empty strings (if secret exists but is empty)
-        env_region = os.getenv("PROFILE_REGIONS")
-        env_region = env_region if env_region and env_region.strip() else '["전국"]'
-        
-        env_interests = os.getenv("PROFILE_INTERESTS")
-        env_interests = env_interests if env_interests and env_interests.strip() else '[]'
-        
-        env_keywords = os.getenv("PROFILE_KEYWORDS")
-        env_keywords = env_keywords if env_keywords and env_keywords.strip() else '[]'
-        
-        env_excludes = os.getenv("PROFILE_EXCLUDES")
-        env_excludes = env_excludes if env_excludes and env_excludes.strip() else '[]'
-        env_min_score_str = os.getenv("PROFILE_MIN_SCORE")
-        env_min_score = int(env_min_score_str) if env_min_score_str and env_min_score_str.strip() else 0
-        
-        default_profile = (
-            1,
-            env_region, # Already JSON string expected in env or default
-            env_interests,
-            env_keywords, # include
-            env_excludes,
-            env_min_score,
-            1,
-            "08:30",
-            7
-        )
-        cursor.execute("""
-        INSERT INTO company_profile (id, region_allow, interests, include_keywords, exclude_keywords, min_score, notify_enabled, notify_time_kst, due_days_threshold)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, default_profile)
+        default_profile = {
+            "id": 1,
+            "region_allow": '["전국"]',
+            "interests": '[]',
+            "include_keywords": '[]',
+            "exclude_keywords": '[]',
+            "min_score": 0,
+            "notify_enabled": 1,
+            "notify_time_kst": "08:30",
+            "due_days_threshold": 7,
+            **env_profile_overrides()
+        }
+        columns = ", ".join(default_profile.keys())
+        placeholders = ", ".join(["?"] * len(default_profile))
+        cursor.execute(f"INSERT INTO company_profile ({columns}) VALUES ({placeholders})",
+                       list(default_profile.values()))
+
+def _index_terms(cursor, program_key: str, program: ProgramLike):
+    terms = index_terms(program)
+    cursor.execute("DELETE FROM program_terms WHERE program_key=?", (program_key,))
+    cursor.executemany("INSERT INTO program_terms (term, program_key, tf) VALUES (?, ?, ?)",
+                       [(term, program_key, tf) for term, tf in terms.items()])
+    cursor.execute("UPDATE programs SET doc_len=? WHERE program_key=?", (sum(terms.values()), program_key))
+
+def _match_profiles(cursor, program: ProgramLike):
+    """Record which profiles may recommend this program (one pass over its text)."""
+    matched_at = program.get('ingested_at') or datetime.now().isoformat()
+    profile_ids = profile_index.candidates(_get_profile_index(), match_text(program), program.get('region_mask'))
+    cursor.execute("DELETE FROM profile_matches WHERE program_key=?", (program.get('program_key'),))
+    cursor.executemany("INSERT INTO profile_matches (profile_id, program_key, matched_at) VALUES (?, ?, ?)",
+                       [(pid, program.get('program_key'), matched_at) for pid in profile_ids])
+
+# Longer than the digest window, so a profile edit shows up in the next digest
+REMATCH_WINDOW_DAYS = 2
+
+def _rematch_profile(cursor, profile_id: int):
+    since = (datetime.now() - timedelta(days=REMATCH_WINDOW_DAYS)).isoformat()
+    # Same cursor: the profile update isn't committed yet
+    profile = cursor.execute("SELECT * FROM company_profile WHERE id=?", (profile_id,)).fetchone()
+    if profile is None:
+        return
+    index = profile_index.build([dict(profile)])
+    cursor.execute("DELETE FROM profile_matches WHERE profile_id=? AND matched_at >= ?", (profile_id, since))
+    # Region exclusion happens in SQL; the index only checks terms
+    region_where, region_params = regions.sql_filter(regions.allow_mask(profile['region_allow']))
+    rows = cursor.execute(f"SELECT program_key, ingested_at, {','.join(MATCH_COLUMNS)} FROM programs "
+                          f"WHERE ingested_at >= ? AND {region_where}", (since, *region_params)).fetchall()
+    cursor.executemany("INSERT OR REPLACE INTO profile_matches (profile_id, program_key, matched_at) VALUES (?, ?, ?)",
+                       [(profile_id, r[0], r[1]) for r in rows
+                        if profile_index.candidates(index, match_text(dict(zip(MATCH_COLUMNS, r[2:]))))])
+
+def list_matched_programs(profile_id: int, since_iso: str) -> List[Program]:
+    """Programs matched to the profile (see profile_index.py) since `since_iso`."""
+    return _query_programs(
+        "program_key IN (SELECT program_key FROM profile_matches WHERE profile_id=? AND matched_at >= ?)",
+        (profile_id, since_iso))
+
+def _changed_columns(old_hashes: Optional[bytes], new_hashes: bytes) -> List[str]:
+    if not old_hashes or len(old_hashes) != len(new_hashes):
+        # Row from before field hashes (or a different column set): compare everything
+        return list(CONTENT_COLUMNS)
+    size = FIELD_HASH_SIZE
+    return [c for i, c in enumerate(CONTENT_COLUMNS)
+            if old_hashes[i * size:(i + 1) * size] != new_hashes[i * size:(i + 1) * size]]
+
+def upsert_program(program: ProgramLike) -> str:
+    """
+    Upsert and return "inserted", "updated" or "unchanged".
+    Unchanged rows are not written at all; updates set only the changed
+    fields (plus raw_item/ingested_at) and log them to program_changes.
+    """
+    if not isinstance(program, Program):
+        program = Program.from_dict(program)
+    program = program._replace(region_mask=regions.program_mask(program))
+    hashes = field_hashes(program)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    existing = cursor.execute(_SELECT_FIELD_HASHES_SQL, (program.program_key,)).fetchone()
+    if existing is None:
+        # Program is a tuple in column order, so it binds directly.
+        cursor.execute(_INSERT_PROGRAM_SQL, (*program, hashes))
+        dedup.assign_cluster(cursor, program.program_key, dedup.signature(program))
+        _index_terms(cursor, program.program_key, program)
+        _match_profiles(cursor, program)
+        conn.commit()
+        conn.close()
+        return "inserted"
+    if existing[0] == hashes:
+        conn.close()
+        return "unchanged"
 
+    columns = _changed_columns(existing[0], hashes)
+    old = cursor.execute(f"SELECT {','.join(columns)} FROM programs WHERE program_key=?",
+                         (program.program_key,)).fetchone()
+    diffs = [(c, old[i], getattr(program, c)) for i, c in enumerate(columns) if old[i] != getattr(program, c)]
+    if not diffs:
+        # Same values, stale hashes (e.g. rows written before field hashes existed)
+        cursor.execute("UPDATE programs SET field_hashes=? WHERE program_key=?", (hashes, program.program_key))
+        conn.commit()
+        conn.close()
+        return "unchanged"
+
+    _apply_update(cursor, program, diffs, {"raw_item": program.raw_item, "ingested_at": program.ingested_at,
+                                           "field_hashes": hashes},
+                  program.ingested_at or datetime.now().isoformat())
     conn.commit()
     conn.close()
+    return "updated"
 
-def upsert_program(program_data: dict):
+def _apply_update(cursor, program: Program, diffs: List[Tuple[str, Any, Any]], extra: Dict[str, Any],
+                  changed_at: str):
+    """
+    Write the changed fields (plus `extra` columns) of an existing row and
+    run what follows a content change: the program_changes log, dedup
+    cluster, term index and profile matches. Shared by upsert_program and
+    rederive.py; the caller commits.
+    """
+    assignments = [c for c, _, _ in diffs] + list(extra)
+    values = [new for _, _, new in diffs] + list(extra.values())
+    if any(c in regions.SOURCE_COLUMNS for c, _, _ in diffs):
+        assignments.append("region_mask")
+        values.append(program.region_mask)
+    cursor.execute(f"UPDATE programs SET {','.join(f'{c}=?' for c in assignments)} WHERE program_key=?",
+                   (*values, program.program_key))
+    cursor.executemany(
+        "INSERT INTO program_changes (program_key, field, old_value, new_value, changed_at) VALUES (?, ?, ?, ?, ?)",
+        [(program.program_key, c, o, n, changed_at) for c, o, n in diffs],
+    )
+    if any(c in dedup.TEXT_COLUMNS for c, _, _ in diffs):
+        dedup.assign_cluster(cursor, program.program_key, dedup.signature(program))
+    if any(c in MATCH_COLUMNS for c, _, _ in diffs):
+        _index_terms(cursor, program.program_key, program)
+    # Re-match on any change: the digest picks matches up by matched_at
+    _match_profiles(cursor, program)
+
+def apply_rederived(conn, program: Program) -> bool:
+    """
+    Store re-derived columns of an existing row (rederive.py) through the same
+    path as an ingest update; the caller commits. The row keeps its raw_item
+    and ingested_at, so re-derived postings don't count as freshly ingested.
+    Returns False when nothing differs from what is stored.
+    """
+    program = program._replace(region_mask=regions.program_mask(program))
+    cursor = conn.cursor()
+    row = cursor.execute(f"SELECT ingested_at, {','.join(CONTENT_COLUMNS)} FROM programs WHERE program_key=?",
+                         (program.program_key,)).fetchone()
+    if row is None:
+        return False
+    program = program._replace(ingested_at=row[0], raw_item=None)
+    diffs = [(c, row[i + 1], getattr(program, c)) for i, c in enumerate(CONTENT_COLUMNS)
+             if row[i + 1] != getattr(program, c)]
+    if not diffs:
+        return False
+    _apply_update(cursor, program, diffs, {"field_hashes": field_hashes(program)}, datetime.now().isoformat())
+    return True
+
+def _query_programs(where: str, params=()) -> List[Program]:
+    with tracing.span("db.query_programs") as span:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = program_row_factory
+        cursor.execute(f"SELECT {_PROGRAM_SELECT} FROM programs WHERE {where}", params)
+        rows = cursor.fetchall()
+        conn.close()
+        span.set(rows=len(rows))
+    metrics.add_rows(len(rows))
+    return rows
+
+def list_open_programs(kind: Optional[str] = None, today: Optional[str] = None) -> List[Program]:
+    """Programs not clearly closed (apply_end_at is NULL or >= today)."""
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    where = "(apply_end_at IS NULL OR apply_end_at >= ?)"
+    params = [today]
+    if kind:
+        where += " AND kind = ?"
+        params.append(kind)
+    return _query_programs(where, params)
+
+def list_programs_ingested_since(since_iso: str) -> List[Program]:
+    return _query_programs("ingested_at >= ?", (since_iso,))
+
+def list_program_changes(since_iso: str) -> List[dict]:
+    """Field changes since `since_iso`, newest first, with the program's current title/kind."""
+    conn = get_connection()
+    rows = conn.execute("""
+    SELECT c.program_key, c.field, c.old_value, c.new_value, c.changed_at, p.title, p.kind
+    FROM program_changes c JOIN programs p ON p.program_key = c.program_key
+    WHERE c.changed_at >= ?
+    ORDER BY c.changed_at DESC, c.id
+    """, (since_iso,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+def get_programs(keys: Iterable[str]) -> List[Program]:
+    keys = list(keys)
+    if not keys:
+        return []
+    return _query_programs(f"program_key IN ({','.join('?' * len(keys))})", keys)
+
+def get_program_terms(keys: Iterable[str]) -> Dict[str, Tuple[Dict[str, int], int]]:
+    """program_key -> (term counts, doc_len) from the term index, for indexed keys."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    marks = ','.join('?' * len(keys))
+    conn = get_connection()
+    indexed = {key: ({}, doc_len) for key, doc_len in conn.execute(
+        f"SELECT program_key, doc_len FROM programs WHERE program_key IN ({marks}) AND doc_len IS NOT NULL", keys)}
+    for term, key, tf in conn.execute(f"SELECT term, program_key, tf FROM program_terms WHERE program_key IN ({marks})", keys):
+        if key in indexed:
+            indexed[key][0][term] = tf
+    conn.close()
+    return indexed
+
+def get_dismissed_keys(profile_id: int = 1) -> Set[str]:
     conn = get_connection()
     cursor = conn.cursor()
-    
-    keys = list(program_data.keys())
-    placeholders = ",".join(["?"] * len(keys))
-    columns = ",".join(keys)
-    updates = ",".join([f"{k}=excluded.{k}" for k in keys if k != 'program_key'])
-    
-    sql = f"""
-    INSERT INTO programs ({columns}) VALUES ({placeholders})
-    ON CONFLICT(program_key) DO UPDATE SET {updates}
-    """
-    
-    cursor.execute(sql, list(program_data.values()))
-    conn.commit()
+    cursor.execute("SELECT program_key FROM user_actions WHERE action='dismissed' AND profile_id=?", (profile_id,))
+    keys = {r[0] for r in cursor.fetchall()}
+    conn.close()
+    return keys
+
+def get_dismissed_pairs() -> Set[Tuple[int, str]]:
+    """(profile_id, program_key) of every dismissal."""
+    conn = get_connection()
+    rows = conn.execute("SELECT profile_id, program_key FROM user_actions WHERE action='dismissed'").fetchall()
     conn.close()
+    return {(r[0], r[1]) for r in rows}
 
-def get_profile():
+def get_saved_keys(profile_id: int = 1) -> Set[str]:
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM company_profile WHERE id=1")
-    row = cursor.fetchone()
+    cursor.execute("SELECT program_key FROM user_actions WHERE action='saved' AND profile_id=?", (profile_id,))
+    keys = {r[0] for r in cursor.fetchall()}
     conn.close()
-    if row:
-        return dict(row)
-    return None
+    return keys
+
+# Profiles are read on every command but only change via update_profile /
+# get_profile_for_chat, so they are kept in memory after the first read.
+_profile_cache: Dict[int, dict] = {}
+_profile_index: Optional[profile_index.ProfileIndex] = None
+# chat_id -> profile id; a chat's profile never changes once created
+_chat_profiles: Dict[str, int] = {}
+
+def get_profile(profile_id: int = 1):
+    if profile_id not in _profile_cache:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM company_profile WHERE id=?", (profile_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return None
+        _profile_cache[profile_id] = dict(row)
+    return dict(_profile_cache[profile_id])
 
-def update_profile(updates: dict):
+def list_profiles() -> List[dict]:
+    conn = get_connection()
+    rows = conn.execute("SELECT * FROM company_profile ORDER BY id").fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+def get_profile_for_chat(chat_id, create: bool = True) -> Optional[dict]:
+    """
+    The chat's profile; a new chat starts from a copy of the owner's settings
+    and is matched against recent programs right away. Callers schedule the
+    new profile's digest (telegram_bot.chat_profile).
+    """
+    chat_id = str(chat_id)
+    if chat_id in _chat_profiles:
+        return get_profile(_chat_profiles[chat_id])
+    conn = get_connection()
+    row = conn.execute("SELECT id FROM company_profile WHERE chat_id=?", (chat_id,)).fetchone()
+    if row is None and create:
+        owner = conn.execute("SELECT * FROM company_profile WHERE id=1").fetchone()
+        template = {k: owner[k] for k in owner.keys() if k not in ("id", "chat_id")} if owner else {}
+        template["chat_id"] = chat_id
+        cursor = conn.execute(
+            f"INSERT INTO company_profile ({', '.join(template)}) VALUES ({', '.join('?' * len(template))})",
+            list(template.values()))
+        row = (cursor.lastrowid,)
+        _rematch_profile(cursor, row[0])
+        conn.commit()
+        _invalidate_profiles()
+    conn.close()
+    if row is None:
+        return None
+    _chat_profiles[chat_id] = row[0]
+    return get_profile(row[0])
+
+def _invalidate_profiles():
+    global _profile_index
+    _profile_cache.clear()
+    _profile_index = None
+
+def _get_profile_index() -> profile_index.ProfileIndex:
+    global _profile_index
+    if _profile_index is None:
+        _profile_index = profile_index.build(list_profiles())
+    return _profile_index
+
+def profile_fingerprint(profile: Optional[dict]) -> str:
+    """Stable version of a profile's contents; changes whenever any field does."""
+    return json.dumps(profile, sort_keys=True, ensure_ascii=False)
+
+def update_profile(updates: dict, profile_id: int = 1):
     conn = get_connection()
     cursor = conn.cursor()
     
     set_clause = ", ".join([f"{k}=?" for k in updates.keys()])
     values = list(updates.values())
     
-    sql = f"UPDATE company_profile SET {set_clause} WHERE id=1"
-    cursor.execute(sql, values)
+    sql = f"UPDATE company_profile SET {set_clause} WHERE id=?"
+    cursor.execute(sql, values + [profile_id])
+    # New terms: match this profile against recent programs again
+    _rematch_profile(cursor, profile_id)
     conn.commit()
     conn.close()
+    _invalidate_profiles()
 
 def log_ingestion_run(run_data: dict):
     conn = get_connection()
@@ -168,3 +656,203 @@ def log_ingestion_run(run_data: dict):
     cursor.execute(sql, list(run_data.values()))
     conn.commit()
     conn.close()
+
+def get_recent_runs(kind: str, limit: int = 20) -> List[dict]:
+    """Latest ingestion runs of a feed, newest first."""
+    conn = get_connection()
+    rows = conn.execute("SELECT * FROM ingestion_runs WHERE kind=? ORDER BY run_at DESC LIMIT ?", (kind, limit)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+def get_fetch_latencies(kind: str, limit: int = 50) -> List[float]:
+    """Seconds taken by recent single-request fetches of a feed (for the hedging threshold)."""
+    conn = get_connection()
+    rows = conn.execute("""
+    SELECT fetch_ms FROM ingestion_runs
+    WHERE kind=? AND error IS NULL AND attempts=1 AND fetch_ms IS NOT NULL
+    ORDER BY run_at DESC LIMIT ?
+    """, (kind, limit)).fetchall()
+    conn.close()
+    return [r[0] / 1000 for r in reversed(rows)]
+
+def get_stage_percentiles(kind: str, stages: Iterable[str], runs: int = 50) -> Dict[str, Tuple[Optional[int], Optional[int], int]]:
+    """
+    Stage -> (p50, p95, samples) in ms over the feed's last `runs` runs,
+    nearest-rank, computed in SQL off the (kind, run_at) index.
+    """
+    conn = get_connection()
+    result = {}
+    for stage in stages:
+        column = f"{stage}_ms"
+        row = conn.execute(f"""
+        WITH recent AS (
+            SELECT {column} AS ms FROM ingestion_runs
+            WHERE kind=? AND {column} IS NOT NULL
+            ORDER BY run_at DESC LIMIT ?
+        ), n AS (SELECT COUNT(*) AS c FROM recent)
+        SELECT
+            (SELECT ms FROM recent ORDER BY ms LIMIT 1 OFFSET (SELECT MAX((c * 50 + 99) / 100 - 1, 0) FROM n)),
+            (SELECT ms FROM recent ORDER BY ms LIMIT 1 OFFSET (SELECT MAX((c * 95 + 99) / 100 - 1, 0) FROM n)),
+            (SELECT c FROM n)
+        """, (kind, runs)).fetchone()
+        result[stage] = (row[0], row[1], row[2])
+    conn.close()
+    return result
+
+def prune_ingestion_runs(before_iso: str):
+    conn = get_connection()
+    conn.execute("DELETE FROM ingestion_runs WHERE run_at < ?", (before_iso,))
+    conn.commit()
+    conn.close()
+
+def save_spans(rows: List[dict]):
+    """Store finished spans (see tracing.flush)."""
+    conn = get_connection()
+    conn.executemany("""
+    INSERT OR REPLACE INTO traces (trace_id, span_id, parent_id, name, started_at, offset_ms, duration_ms, attrs)
+    VALUES (:trace_id, :span_id, :parent_id, :name, :started_at, :offset_ms, :duration_ms, :attrs)
+    """, rows)
+    conn.commit()
+    conn.close()
+
+def prune_traces(before_iso: str):
+    conn = get_connection()
+    conn.execute("DELETE FROM traces WHERE started_at < ?", (before_iso,))
+    conn.commit()
+    conn.close()
+
+def get_last_trace(name_prefix: str = "") -> List[dict]:
+    """Spans of the newest trace whose root name starts with `name_prefix`."""
+    conn = get_connection()
+    row = conn.execute("""
+    SELECT trace_id FROM traces WHERE parent_id IS NULL AND name LIKE ? || '%'
+    ORDER BY started_at DESC LIMIT 1
+    """, (name_prefix,)).fetchone()
+    spans = []
+    if row:
+        spans = [dict(r) for r in conn.execute("SELECT * FROM traces WHERE trace_id=? ORDER BY offset_ms", (row[0],))]
+    conn.close()
+    return spans
+
+def save_digest_artifact(profile_id: int, built_at: str, profile_version: str, program_keys: str, text: str):
+    conn = get_connection()
+    conn.execute("""
+    INSERT OR REPLACE INTO digest_artifacts (profile_id, built_at, profile_version, program_keys, text)
+    VALUES (?, ?, ?, ?, ?)
+    """, (profile_id, built_at, profile_version, program_keys, text))
+    conn.commit()
+    conn.close()
+
+def get_digest_artifact(profile_id: int = 1) -> Optional[dict]:
+    conn = get_connection()
+    row = conn.execute("SELECT * FROM digest_artifacts WHERE profile_id=?", (profile_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def digest_inputs_changed_since(since_iso: str) -> bool:
+    """True if programs were ingested, user actions recorded or notifications sent after `since_iso`."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT EXISTS(SELECT 1 FROM programs WHERE ingested_at > ?)
+        OR EXISTS(SELECT 1 FROM user_actions WHERE created_at > ?)
+        OR EXISTS(SELECT 1 FROM notifications WHERE sent_at > ?)
+    """, (since_iso, since_iso, since_iso))
+    changed = bool(cursor.fetchone()[0])
+    conn.close()
+    return changed
+
+def get_feed_state(feed: str) -> dict:
+    conn = get_connection()
+    row = conn.execute("SELECT * FROM feed_state WHERE feed=?", (feed,)).fetchone()
+    conn.close()
+    return dict(row) if row else {"feed": feed}
+
+def save_feed_state(feed: str, etag: Optional[str], last_modified: Optional[str], body_hash: Optional[str], last_polled_at: str):
+    conn = get_connection()
+    conn.execute("""
+    INSERT OR REPLACE INTO feed_state (feed, etag, last_modified, body_hash, last_polled_at)
+    VALUES (?, ?, ?, ?, ?)
+    """, (feed, etag, last_modified, body_hash, last_polled_at))
+    conn.commit()
+    conn.close()
+
+def record_poll(feed: str, hour_of_week: int, observed_rate: float, alpha: float):
+    """Fold one observation (changes per hour) into the EWMA for that hour of week."""
+    conn = get_connection()
+    conn.execute("""
+    INSERT INTO poll_stats (feed, hour_of_week, polls, change_rate) VALUES (?, ?, 1, ?)
+    ON CONFLICT(feed, hour_of_week) DO UPDATE SET
+        polls = polls + 1,
+        change_rate = change_rate * (1 - ?) + excluded.change_rate * ?
+    """, (feed, hour_of_week, observed_rate, alpha, alpha))
+    conn.commit()
+    conn.close()
+
+def get_poll_rates(feed: str) -> dict:
+    conn = get_connection()
+    rows = conn.execute("SELECT hour_of_week, change_rate FROM poll_stats WHERE feed=?", (feed,)).fetchall()
+    conn.close()
+    return {r[0]: r[1] for r in rows}
+
+def mark_job_run(job_id: str, run_at: str):
+    conn = get_connection()
+    conn.execute("INSERT OR REPLACE INTO job_runs (job_id, last_run_at) VALUES (?, ?)", (job_id, run_at))
+    conn.commit()
+    conn.close()
+
+def get_job_run(job_id: str) -> Optional[str]:
+    conn = get_connection()
+    row = conn.execute("SELECT last_run_at FROM job_runs WHERE job_id=?", (job_id,)).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def record_user_action(program_key: str, action: str, profile_id: int = 1):
+    conn = get_connection()
+    conn.execute("INSERT OR REPLACE INTO user_actions (profile_id, program_key, action, created_at) VALUES (?, ?, ?, ?)",
+                 (profile_id, program_key, action, datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+
+def get_notified(channel: str) -> Dict[str, str]:
+    """program_key -> content_hash last sent on `channel`."""
+    conn = get_connection()
+    rows = conn.execute("SELECT program_key, content_hash FROM notifications WHERE channel=?", (channel,)).fetchall()
+    conn.close()
+    return {r[0]: r[1] for r in rows}
+
+def record_notifications(channel: str, sent: Iterable[Tuple[str, str]], sent_at: Optional[str] = None):
+    """Record (program_key, content_hash) pairs as sent on `channel`."""
+    sent_at = sent_at or datetime.now().isoformat()
+    conn = get_connection()
+    conn.executemany("INSERT OR REPLACE INTO notifications (program_key, channel, content_hash, sent_at) VALUES (?, ?, ?, ?)",
+                     [(key, channel, h, sent_at) for key, h in sent])
+    conn.commit()
+    conn.close()
+
+def prune_notifications(before_iso: str):
+    conn = get_connection()
+    conn.execute("DELETE FROM notifications WHERE sent_at < ?", (before_iso,))
+    conn.commit()
+    conn.close()
+
+def get_preference_weights(profile_id: int = 1) -> Optional[array]:
+    """Learned preference weights, or None before the first save/dismiss."""
+    conn = get_connection()
+    row = conn.execute("SELECT weights FROM preference_model WHERE profile_id=?", (profile_id,)).fetchone()
+    conn.close()
+    if not row or not row[0]:
+        return None
+    weights = array("f")
+    weights.frombytes(row[0])
+    return weights
+
+def save_preference_weights(weights: array, profile_id: int = 1):
+    conn = get_connection()
+    conn.execute("""
+    INSERT INTO preference_model (profile_id, weights, updates, updated_at) VALUES (?, ?, 1, ?)
+    ON CONFLICT(profile_id) DO UPDATE SET
+        weights = excluded.weights, updates = updates + 1, updated_at = excluded.updated_at
+    """, (profile_id, weights.tobytes(), datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
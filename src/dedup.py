@@ -0,0 +1,122 @@
+"""
+Near-duplicate postings: MinHash signatures + an LSH index in SQLite.
+
+The same programme is often posted several times (regional re-posts, both
+feeds, new pblancId). At upsert every new or re-worded posting gets a
+MinHash signature over character 3-shingles of its normalized title and
+summary. The signature is split into BANDS bands; postings sharing any
+band bucket (`program_lsh`) are candidates, and the candidate with the
+highest estimated Jaccard similarity >= SIMILARITY lends its cluster_id.
+Lookup cost depends on the bucket sizes, not on the number of postings.
+
+Lists and digests then keep one representative (the best-ranked) per cluster.
+"""
+import hashlib
+import random
+import re
+from array import array
+from typing import Iterable, List, Optional, TypeVar
+
+from .models import Program
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # ~50% similarity to share a bucket with good odds
+SIMILARITY = 0.6
+# Boilerplate tails are long and shared by unrelated postings
+SUMMARY_CHARS = 300
+# Re-cluster when one of these changes
+TEXT_COLUMNS = ("title", "summary_raw")
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20240101)  # fixed: signatures are stored
+_PERMS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def shingles(program: Program) -> set:
+    text = f"{program.title or ''} {(program.summary_raw or '')[:SUMMARY_CHARS]}"
+    text = _NON_WORD_RE.sub("", text.lower())
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(program: Program) -> Optional[bytes]:
+    """NUM_PERM 32-bit minimums, packed; None when there is no text."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+              for s in shingles(program)]
+    if not hashes:
+        return None
+    sig = array("I", (min((a * h + b) % _MERSENNE for h in hashes) & _MAX_HASH for a, b in _PERMS))
+    return sig.tobytes()
+
+
+def similarity(sig_a: bytes, sig_b: bytes) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    a, b = array("I", sig_a), array("I", sig_b)
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def band_buckets(sig: bytes) -> List[int]:
+    """One signed 64-bit bucket id per band (fits an SQLite INTEGER)."""
+    width = ROWS * 4
+    return [int.from_bytes(hashlib.blake2b(sig[i * width:(i + 1) * width], digest_size=8).digest(),
+                           "little", signed=True)
+            for i in range(BANDS)]
+
+
+def assign_cluster(cursor, program_key: str, sig: Optional[bytes]) -> str:
+    """
+    Index `program_key` in program_lsh and set its minhash/cluster_id, inside
+    the caller's transaction. Returns the cluster_id.
+    """
+    cursor.execute("DELETE FROM program_lsh WHERE program_key=?", (program_key,))
+    if sig is None:
+        cursor.execute("UPDATE programs SET minhash=NULL, cluster_id=? WHERE program_key=?", (program_key, program_key))
+        return program_key
+
+    buckets = band_buckets(sig)
+    where = " OR ".join(["(l.band=? AND l.bucket=?)"] * BANDS)
+    params = [v for band, bucket in enumerate(buckets) for v in (band, bucket)]
+    candidates = cursor.execute(f"""
+    SELECT DISTINCT p.program_key, p.minhash, p.cluster_id
+    FROM program_lsh l JOIN programs p ON p.program_key = l.program_key
+    WHERE ({where}) AND l.program_key != ?
+    """, (*params, program_key)).fetchall()
+
+    cluster_id, best = program_key, SIMILARITY
+    for key, other_sig, other_cluster in candidates:
+        score = similarity(sig, other_sig)
+        if score >= best:
+            cluster_id, best = other_cluster or key, score
+
+    cursor.executemany("INSERT OR IGNORE INTO program_lsh (band, bucket, program_key) VALUES (?, ?, ?)",
+                       [(band, bucket, program_key) for band, bucket in enumerate(buckets)])
+    cursor.execute("UPDATE programs SET minhash=?, cluster_id=? WHERE program_key=?", (sig, cluster_id, program_key))
+    return cluster_id
+
+
+T = TypeVar("T")
+
+
+def collapse(items: Iterable[T], limit: Optional[int] = None) -> List[T]:
+    """
+    Keep the first item of each cluster, preserving order (so sort by rank
+    first). Items are Recommendations or Programs.
+    """
+    seen = set()
+    kept = []
+    for item in items:
+        program = getattr(item, "program", item)
+        cluster = program.cluster_id or program.program_key
+        if cluster in seen:
+            continue
+        seen.add(cluster)
+        kept.append(item)
+        if limit is not None and len(kept) >= limit:
+            break
+    return kept
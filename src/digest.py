@@ -0,0 +1,211 @@
+"""
+Daily digest: ranking, formatting and the materialized artifact.
+
+Ingestion finishes by building the next digest (ranked keys + rendered text)
+and storing it in `digest_artifacts`, so the scheduled send is just a read.
+The send falls back to a live computation only when the artifact is stale.
+
+What was sent is recorded in the `notifications` ledger: an item goes out
+again only if its title or deadline changed. Saved items get one extra
+reminder when they enter the profile's due window.
+
+Every profile (one per allowed chat) gets its own digest: candidates come
+from its `profile_matches` rows, and its ledger channels are suffixed with
+the profile id (profile 1 keeps the plain names).
+"""
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .db import (
+    get_profile, list_profiles, profile_fingerprint, list_matched_programs, get_dismissed_keys,
+    save_digest_artifact, get_digest_artifact, digest_inputs_changed_since,
+    get_programs, get_saved_keys, get_notified, record_notifications
+)
+from . import hot_set, tracing
+from .dedup import collapse
+from .filters import is_recommended, get_days_left
+from .models import Program, Recommendation, notify_hash
+
+logger = logging.getLogger(__name__)
+
+DIGEST_WINDOW = timedelta(hours=24)
+DIGEST_SIZE = 10
+
+# Ledger channels
+DIGEST_CHANNEL = "digest"
+DUE_CHANNEL = "due"
+DUE_REPING = os.getenv("DIGEST_DUE_REPING", "1") == "1"
+
+
+def channel(base: str, profile_id: int = 1) -> str:
+    """Ledger channel of a profile; the owner's (id 1) keeps the plain name."""
+    return base if profile_id == 1 else f"{base}:{profile_id}"
+
+
+# channel -> [(program_key, notify_hash)] of what a digest contains
+SentEntries = Dict[str, List[Tuple[str, str]]]
+
+
+class DigestText(NamedTuple):
+    text: str
+    from_artifact: bool
+    sent: SentEntries
+
+
+def kst_date(now: datetime) -> date:
+    """
+    The KST date at `now`, which D-days count from (as in the active set).
+    Timestamps stay host-local like the stored ones; a naive `now` is local time.
+    """
+    return now.astimezone(hot_set.KST).date()
+
+
+def compute_digest(profile: dict, now: Optional[datetime] = None) -> List[Recommendation]:
+    """
+    Top N recommended items ingested in the last 24h, excluding dismissed ones
+    and ones already sent with the same title and deadlines.
+    """
+    now = now or datetime.now()
+    today = kst_date(now)
+    profile_id = profile.get('id') or 1
+    items = list_matched_programs(profile_id, (now - DIGEST_WINDOW).isoformat())
+    dismissed = get_dismissed_keys(profile_id)
+    notified = get_notified(channel(DIGEST_CHANNEL, profile_id))
+    relevance = hot_set.get_relevance_stats(profile)
+    weights = hot_set.preference_weights(profile_id)
+
+    recommendations = []
+    with tracing.span("score.digest", candidates=len(items)) as span:
+        for item in items:
+            if item.program_key in dismissed:
+                continue
+            if notified.get(item.program_key) == notify_hash(item):
+                continue
+            recommended, score, reasons = is_recommended(item, profile, relevance=relevance, preferences=weights,
+                                                         today=today)
+            if recommended:
+                recommendations.append(Recommendation(item, score, reasons))
+        span.set(recommended=len(recommendations))
+
+    # Sort by score desc, one posting per near-duplicate cluster
+    recommendations.sort(key=lambda r: r.score, reverse=True)
+    return collapse(recommendations, DIGEST_SIZE)
+
+
+def compute_due_reminders(profile: dict, today: Optional[date] = None) -> List[Program]:
+    """Saved items inside the due window that haven't been reminded about (in this version)."""
+    if not DUE_REPING:
+        return []
+    today = today or kst_date(datetime.now())
+    threshold = profile.get('due_days_threshold') or 7
+    profile_id = profile.get('id') or 1
+    dismissed = get_dismissed_keys(profile_id)
+    notified = get_notified(channel(DUE_CHANNEL, profile_id))
+
+    due = []
+    for item in get_programs(get_saved_keys(profile_id) - dismissed):
+        days_left = get_days_left(item, today=today)
+        if days_left is None or not 0 <= days_left <= threshold:
+            continue
+        if notified.get(item.program_key) == notify_hash(item):
+            continue
+        due.append(item)
+    due.sort(key=lambda item: get_days_left(item, today=today))
+    return due
+
+
+def format_digest(recommendations: List[Recommendation], due: Sequence[Program] = (),
+                  today: Optional[date] = None) -> str:
+    today = today or kst_date(datetime.now())
+    message = ""
+    if recommendations:
+        message += f"📢 **일일 추천 ({len(recommendations)}건)**\n\n"
+    for item, score, reasons in recommendations:
+        message += f"[{score}] [{item.kind}] {item.title}\n"
+        message += f"사유: {', '.join(reasons)}\n"
+        # Telegram commands can't contain ':', so the key uses '_' in links.
+        message += f"/open_{item.program_key.replace(':','_')}\n\n"
+    if due:
+        message += f"⏰ **저장한 공고 마감 임박 ({len(due)}건)**\n\n"
+    for item in due:
+        message += f"[D-{get_days_left(item, today=today)}] [{item.kind}] {item.title}\n"
+        message += f"/open_{item.program_key.replace(':','_')}\n\n"
+    return message
+
+
+def _build(profile: dict, now: datetime) -> Tuple[str, SentEntries]:
+    today = kst_date(now)
+    recommendations = compute_digest(profile, now)
+    due = compute_due_reminders(profile, today)
+    profile_id = profile.get('id') or 1
+    sent = {
+        channel(DIGEST_CHANNEL, profile_id): [(r.program.program_key, notify_hash(r.program)) for r in recommendations],
+        channel(DUE_CHANNEL, profile_id): [(p.program_key, notify_hash(p)) for p in due],
+    }
+    return format_digest(recommendations, due, today), sent
+
+
+def materialize_digest(profile_id: int = 1):
+    """Build and store the next digest of one profile."""
+    profile = get_profile(profile_id)
+    if not profile:
+        return
+    now = datetime.now()
+    with tracing.span("digest.materialize", profile_id=profile_id):
+        text, sent = _build(profile, now)
+    save_digest_artifact(
+        profile_id,
+        built_at=now.isoformat(),
+        profile_version=profile_fingerprint(profile),
+        program_keys=json.dumps(sent),
+        text=text,
+    )
+    logger.info(f"Materialized digest for profile {profile_id}: "
+                f"{len(sent[channel(DIGEST_CHANNEL, profile_id)])} items, "
+                f"{len(sent[channel(DUE_CHANNEL, profile_id)])} due reminders")
+
+
+def materialize_digests():
+    """Build every profile's next digest. Called at the end of every ingestion."""
+    for profile in list_profiles():
+        materialize_digest(profile["id"])
+
+
+def _is_fresh(artifact: dict, profile: dict, now: datetime) -> bool:
+    if artifact["profile_version"] != profile_fingerprint(profile):
+        return False
+    # Artifacts from before the ledger stored a plain key list
+    if not isinstance(json.loads(artifact["program_keys"] or "null"), dict):
+        return False
+    built_at = datetime.fromisoformat(artifact["built_at"])
+    # D-day reasons and the 24h window are relative to the build time.
+    if kst_date(built_at) != kst_date(now) or now - built_at > DIGEST_WINDOW:
+        return False
+    # New rows, a dismissal or a send since the build would change the result.
+    return not digest_inputs_changed_since(artifact["built_at"])
+
+
+def get_digest_text(profile: dict) -> DigestText:
+    """
+    Returns (text, from_artifact, sent). Text is empty when there is nothing
+    to send; pass `sent` to mark_digest_sent once the message went out.
+    """
+    now = datetime.now()
+    profile_id = profile.get('id') or 1
+    artifact = get_digest_artifact(profile_id)
+    if artifact and _is_fresh(artifact, profile, now):
+        return DigestText(artifact["text"], True, json.loads(artifact["program_keys"]))
+
+    logger.info("Digest artifact missing or stale, computing live")
+    text, sent = _build(profile, now)
+    return DigestText(text, False, sent)
+
+
+def mark_digest_sent(sent: SentEntries):
+    """Record a delivered digest in the notifications ledger."""
+    for channel, entries in sent.items():
+        if entries:
+            record_notifications(channel, entries)
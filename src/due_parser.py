@@ -1,6 +1,113 @@
 import re
-from datetime import datetime
-from typing import Optional, Tuple
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+# One compiled pattern, scanned once per string.
+# Alternatives (in priority order):
+# - 상시/수시 (rolling intake, no dates)
+# - YYYY-MM-DD / YYYY.MM.DD / YYYY/MM/DD / YYYY년 M월 D일 (1-2 digit month/day)
+# - YYYYMMDD (compact, not part of a longer number)
+# Each date may be followed by an optional HH:MM time.
+_TOKEN_RE = re.compile(
+    r'(?P<rolling>상시|수시)'
+    r'|(?:'
+    r'(?<!\d)(?P<y>\d{4})\s*(?:[-./]|년)\s*(?P<m>\d{1,2})\s*(?:[-./]|월)\s*(?P<d>\d{1,2})(?!\d)\s*일?'
+    r'|(?<!\d)(?P<cy>\d{4})(?P<cm>\d{2})(?P<cd>\d{2})(?!\d)'
+    r')(?:\.?\s*(?:\([^)]{0,3}\))?\s*(?P<hh>\d{1,2}):(?P<mi>\d{2}))?'
+)
+
+# What may sit between the two dates of a range: a trailing dot, a weekday
+# like "(금)", and the separator itself ("~", "-", "부터", ...).
+_RANGE_SEP_RE = re.compile(r'\.?\s*(?:\([^)]{0,3}\))?\s*(?:[~∼～〜\-–—]|부터)?\s*')
+
+PERIOD_CACHE_SIZE = 4096
+
+
+class Period(NamedTuple):
+    """Typed result of parsing a period string.
+
+    Dates are proleptic Gregorian ordinals (``date.toordinal()``) and times
+    are minutes since midnight, so comparisons need no string handling.
+    """
+    start: Optional[int] = None
+    end: Optional[int] = None
+    start_minute: Optional[int] = None
+    end_minute: Optional[int] = None
+    rolling: bool = False  # 상시/수시 접수
+
+
+EMPTY_PERIOD = Period()
+
+
+def _to_ordinal(y: str, m: str, d: str) -> Optional[int]:
+    try:
+        return date(int(y), int(m), int(d)).toordinal()
+    except ValueError:
+        return None
+
+
+def _to_minute(hh: Optional[str], mi: Optional[str]) -> Optional[int]:
+    if hh is None:
+        return None
+    h, m = int(hh), int(mi)
+    if h > 24 or m > 59:
+        return None
+    return h * 60 + m
+
+
+@lru_cache(maxsize=PERIOD_CACHE_SIZE)
+def tokenize_period(period_str: Optional[str]) -> Period:
+    """
+    Single pass over `period_str`, returning a `Period`.
+    The first valid date is the start and the date right after the range
+    separator the end; later dates (announcement days, a second round) are
+    ignored. A single date yields start == end (usually a deadline, e.g.
+    "2023-12-31까지"). An invalid start date leaves the start unknown instead of
+    letting the end stand in for it ("2024-13-01 ~ 2024-03-15": no start).
+    Memoized because postings repeat the same period strings a lot.
+    """
+    if not period_str:
+        return EMPTY_PERIOD
+
+    rolling = False
+    first = last = None
+    pairing_from = None  # where the start token ended, while its end may still follow
+    invalid_from = None  # where an invalid date before the first valid one ended
+    for match in _TOKEN_RE.finditer(period_str):
+        if match.group('rolling'):
+            rolling = True
+            continue
+        if match.group('y'):
+            ordinal = _to_ordinal(match.group('y'), match.group('m'), match.group('d'))
+        else:
+            ordinal = _to_ordinal(match.group('cy'), match.group('cm'), match.group('cd'))
+        if ordinal is None:
+            if first is None:
+                invalid_from = match.end()
+            continue
+        token = (ordinal, _to_minute(match.group('hh'), match.group('mi')))
+        if first is None:
+            if invalid_from is not None and _RANGE_SEP_RE.fullmatch(period_str, invalid_from, match.start()):
+                # The end of a range whose start didn't parse
+                return Period(None, token[0], None, token[1], rolling)
+            first = last = token
+            pairing_from = match.end()
+            continue
+        if pairing_from is not None and _RANGE_SEP_RE.fullmatch(period_str, pairing_from, match.start()):
+            last = token
+        pairing_from = None
+
+    if first is None:
+        return Period(rolling=rolling) if rolling else EMPTY_PERIOD
+    return Period(first[0], last[0], first[1], last[1], rolling)
+
+
+def ordinal_to_iso(ordinal: Optional[int]) -> Optional[str]:
+    if ordinal is None:
+        return None
+    return date.fromordinal(ordinal).isoformat()
+
 
 def parse_period(period_str: str) -> Tuple[Optional[str], Optional[str]]:
     """
@@ -8,49 +115,16 @@ def parse_period(period_str: str) -> Tuple[Optional[str], Optional[str]]:
     Supports formats like:
     - YYYY-MM-DD ~ YYYY-MM-DD
     - YYYY.MM.DD ~ YYYY.MM.DD
-    - YYYY-MM-DD 18:00 ~ ...
+    - YYYY-MM-DD 18:00 ~ YYYY-MM-DD 18:00
+    - YYYYMMDD ~ YYYYMMDD
+    - YYYY년 M월 D일 ~ YYYY년 M월 D일
+    - 상시 접수 (no dates -> (None, None), see `tokenize_period` for the flag)
     If parsing fails, returns (None, None).
     """
-    if not period_str:
-        return None, None
-    
-    # Cleaning up
-    cleaned = period_str.replace('.', '-').strip()
-    
-    # Try to find a range pattern
-    range_match = re.search(r'(\d{4}-\d{2}-\d{2})(?:.*?)~(\s*)(\d{4}-\d{2}-\d{2})', cleaned)
-    if range_match:
-        start_date = range_match.group(1)
-        end_date = range_match.group(3)
-        return start_date, end_date
-    
-    # Single date (maybe end date or just one date)
-    # If it looks like a single date, we might treat it as start=end or just start?
-    # PRD says "parse apply/receipt periods... based on raw strings".
-    # Often single date means deadline.
-    single_match = re.search(r'(\d{4}-\d{2}-\d{2})', cleaned)
-    if single_match:
-        # If there's only one date, it's ambiguous. 
-        # But for 'due' logic, usually the end date matters most.
-        # Let's return it as end date if we can't find a start.
-        # Or maybe it's the start date?
-        # Let's assume if it's a deadline, it might be the end.
-        # But let's look at context. "2023-01-01" -> 
-        # For safety, let's just return it as BOTH start and end? or None/date?
-        # Let's return (date, date) for safety for filtering?
-        # Actually PRD says: "If parsing fails: store raw strings; do NOT crash; skip due-soon classification".
-        # So maybe better to be strict?
-        # Let's return (None, None) if not a clear range?
-        # But "2023-12-31까지" is common. 
-        return single_match.group(1), single_match.group(1)
-        
-    return None, None
+    period = tokenize_period(period_str)
+    return ordinal_to_iso(period.start), ordinal_to_iso(period.end)
+
 
 def parse_iso(date_str: str) -> Optional[str]:
     """Helper to ensure ISO format YYYY-MM-DD"""
-    if not date_str:
-        return None
-    match = re.search(r'(\d{4}-\d{2}-\d{2})', date_str.replace('.', '-'))
-    if match:
-        return match.group(1)
-    return None
+    return ordinal_to_iso(tokenize_period(date_str).start)
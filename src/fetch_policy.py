@@ -0,0 +1,165 @@
+"""
+Fetch policy for the Bizinfo endpoints (PRD 7.2).
+
+- Deadline: one fetch of a feed (JSON, then the XML fallback) gets its
+  endpoint's deadline in total (FETCH_DEADLINE_SECONDS_SUPPORT / _EVENT,
+  else FETCH_DEADLINE_SECONDS); every attempt's timeout is cut to what is
+  left, so a slow API can't hold a run for several full timeouts.
+- Retries: connection errors, timeouts, 5xx and 429 are retried up to
+  FETCH_RETRIES times with full-jitter exponential backoff (other 4xx are not).
+- Hedging (FETCH_HEDGE=1): when an attempt is still running after the p95 of
+  recent latencies, a second identical GET is sent and the first answer wins.
+  The loser keeps running on the pool; callers only count the winner's result.
+- Circuit breaker: after BREAKER_FAILURES failed runs in a row a feed is
+  not fetched for BREAKER_COOLDOWN, then one probe (no retries) decides.
+  The state is derived from the feed's rows in `ingestion_runs`, so it
+  survives restarts and, through the state snapshot, CI runs.
+
+Failures raise FetchError instead of looking like "no new items".
+"""
+import contextvars
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Callable, List, NamedTuple, Optional, Sequence, TypeVar
+
+FETCH_DEADLINE_SECONDS = float(os.getenv("FETCH_DEADLINE_SECONDS", "30"))
+# Per endpoint (feed kind), e.g. FETCH_DEADLINE_SECONDS_EVENT=15 for the smaller event feed
+FETCH_DEADLINES = {kind: float(os.getenv(f"FETCH_DEADLINE_SECONDS_{kind.upper()}") or FETCH_DEADLINE_SECONDS)
+                   for kind in ("support", "event")}
+ATTEMPT_TIMEOUT_SECONDS = 10.0
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 8.0
+FETCH_HEDGE = os.getenv("FETCH_HEDGE", "0") == "1"
+# Latencies needed before hedging kicks in, and how many are kept
+HEDGE_MIN_SAMPLES = 10
+LATENCY_WINDOW = 50
+
+BREAKER_FAILURES = 3
+BREAKER_COOLDOWN = timedelta(minutes=int(os.getenv("BREAKER_COOLDOWN_MINUTES", "30")))
+
+# Circuit states, as recorded in ingestion_runs.circuit
+CLOSED = "closed"
+OPEN = "open"            # run skipped without fetching
+HALF_OPEN = "half_open"  # single probe after the cooldown
+
+T = TypeVar("T")
+
+
+class FetchError(Exception):
+    """A feed could not be fetched (retries exhausted, deadline hit or circuit open)."""
+
+
+class Policy(NamedTuple):
+    deadline: float = FETCH_DEADLINE_SECONDS
+    attempt_timeout: float = ATTEMPT_TIMEOUT_SECONDS
+    retries: int = FETCH_RETRIES
+    hedge_after: Optional[float] = None  # seconds; None disables hedging
+
+
+_hedge_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fetch-hedge")
+
+
+def backoff(attempt: int, rng: random.Random = random) -> float:
+    """Full jitter: uniform in [0, min(max, base * 2^attempt)]."""
+    return rng.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def is_retryable(error: Exception) -> bool:
+    import requests  # only on the error path; the client imports it anyway
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return False
+
+
+def p95(samples: Sequence[float]) -> Optional[float]:
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+def _submit(request: Callable[[float], T], timeout: float):
+    # In the caller's context, so the request's spans and metrics land in its trace/scope
+    return _hedge_pool.submit(contextvars.copy_context().run, request, timeout)
+
+
+def _hedged(request: Callable[[float], T], timeout: float, hedge_after: float,
+            on_hedge: Optional[Callable[[], None]] = None) -> T:
+    first = _submit(request, timeout)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+    # Still running past p95: race a second copy for the time that is left
+    if on_hedge is not None:
+        on_hedge()
+    second = _submit(request, max(timeout - hedge_after, 0.1))
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+def call(request: Callable[[float], T], policy: Policy, deadline_at: float,
+         sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic,
+         on_hedge: Optional[Callable[[], None]] = None) -> T:
+    """
+    Run `request(timeout)` under the policy until it succeeds, fails for
+    good or `deadline_at` (a `clock()` value) passes. Raises FetchError
+    when it doesn't succeed. `on_hedge` is called for every hedged second request.
+    """
+    error = None
+    for attempt in range(policy.retries + 1):
+        timeout = min(policy.attempt_timeout, deadline_at - clock())
+        if timeout <= 0:
+            break
+        try:
+            if policy.hedge_after is not None and policy.hedge_after < timeout:
+                return _hedged(request, timeout, policy.hedge_after, on_hedge)
+            return request(timeout)
+        except Exception as e:
+            error = e
+            if not is_retryable(e):
+                raise FetchError(str(e)) from e
+        pause = backoff(attempt)
+        if attempt == policy.retries or clock() + pause >= deadline_at:
+            break
+        sleep(pause)
+    raise FetchError(f"gave up after {attempt + 1} attempt(s): {error or 'deadline exceeded'}") from error
+
+
+def circuit_state(recent_runs: List[dict], now: datetime) -> str:
+    """
+    State of a feed's circuit from its ingestion_runs rows, newest first
+    (run_at, error, circuit). Rows of skipped (open) runs don't count as
+    failures; the cooldown runs from the last real attempt.
+    """
+    attempts = [r for r in recent_runs if r.get("circuit") != OPEN]
+    failures = 0
+    for run in attempts:
+        if not run.get("error"):
+            break
+        failures += 1
+    if failures < BREAKER_FAILURES:
+        return CLOSED
+    last_attempt = datetime.fromisoformat(attempts[0]["run_at"])
+    return HALF_OPEN if now - last_attempt >= BREAKER_COOLDOWN else OPEN
+
+
+def cooldown_left(recent_runs: List[dict], now: datetime) -> timedelta:
+    attempts = [r for r in recent_runs if r.get("circuit") != OPEN]
+    if not attempts:
+        return timedelta(0)
+    return max(timedelta(0), datetime.fromisoformat(attempts[0]["run_at"]) + BREAKER_COOLDOWN - now)
@@ -1,8 +1,212 @@
 import json
-from datetime import datetime
-from typing import Dict, List, Any, Tuple
+import math
+import os
+import threading
+import zlib
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime, date
+from typing import Dict, Iterable, List, Any, NamedTuple, Optional, Sequence, Set, Tuple
+from . import regions
+from .models import ProgramLike, index_terms, match_text, tokenize
 
-def check_exclude(program: Dict[str, Any], profile: Dict[str, Any]) -> bool:
+# "bm25": rank interests by BM25 over the active set instead of a flat bonus
+RELEVANCE_SCORING = os.getenv("RELEVANCE_SCORING", "").lower()
+
+class MatchFeatures(NamedTuple):
+    """Per-program values the filters need, computed once (see hot_set.py)."""
+    match_text: str              # title + summary + category, lowercased
+    exclude_text: str            # title + summary + agency + url, lowercased
+    end_ordinal: Optional[int]   # apply_end_at as a date ordinal
+    terms: Dict[str, int]        # term counts of match_text (for BM25)
+    doc_len: int
+    preference_features: Dict[int, str]  # hashed feature index -> readable name
+    region_mask: int             # 시/도 bits (see regions.py)
+
+class RelevanceStats(NamedTuple):
+    """Corpus statistics for the profile's interest terms (see relevance_stats)."""
+    idf: Dict[str, float]        # query term -> idf
+    avgdl: float
+    expansions: Dict[str, Tuple[str, ...]]  # query term -> corpus terms it prefixes
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# BM25 sum at which the interest component reaches its full points
+BM25_FULL = 3.0
+INTEREST_POINTS = 25
+
+# Learned preferences (see preferences.py): hashed features of agency,
+# category, kind and title terms, weighted by save/dismiss history.
+PREFERENCE_DIM = 1 << 12
+PREFERENCE_POINTS = 15
+
+def preference_features(program: ProgramLike) -> Dict[int, str]:
+    names = []
+    if program.get('agency'):
+        names.append(f"기관 {program.get('agency')}")
+    if program.get('category_l1'):
+        names.append(f"분야 {program.get('category_l1')}")
+    if program.get('kind'):
+        names.append(f"유형 {program.get('kind')}")
+    names += [f"'{term}'" for term in dict.fromkeys(tokenize(program.get('title') or ''))]
+    return {zlib.crc32(name.encode("utf-8")) % PREFERENCE_DIM: name for name in names}
+
+def preference_margin(weights: Sequence[float], features: Dict[int, str]) -> float:
+    if not features:
+        return 0.0
+    return sum(weights[i] for i in features) / math.sqrt(len(features))
+
+def preference_score(weights: Sequence[float], features: Dict[int, str]) -> Tuple[int, Optional[str]]:
+    """Points in [-PREFERENCE_POINTS, PREFERENCE_POINTS] and the feature that weighs most."""
+    points = round(PREFERENCE_POINTS * math.tanh(preference_margin(weights, features)))
+    if not points:
+        return 0, None
+    top = max(features, key=lambda i: weights[i] if points > 0 else -weights[i])
+    return points, features[top]
+
+def _exclude_text(program: ProgramLike) -> str:
+    text_fields = [
+        program.get('title', ''),
+        program.get('summary_raw', ''),
+        program.get('agency', ''),
+        program.get('url', '')
+    ]
+    return " ".join([t for t in text_fields if t]).lower()
+
+def _end_ordinal(program: ProgramLike) -> Optional[int]:
+    end_at = program.get('apply_end_at')
+    if not end_at:
+        return None
+    try:
+        return datetime.strptime(end_at, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def _region_mask(program: ProgramLike, features: Optional[MatchFeatures] = None) -> int:
+    if features:
+        return features.region_mask
+    # Stored rows carry the mask resolved at upsert
+    mask = program.get('region_mask')
+    return regions.program_mask(program) if mask is None else mask
+
+def build_features(program: ProgramLike, terms: Optional[Dict[str, int]] = None,
+                   doc_len: Optional[int] = None) -> MatchFeatures:
+    """`terms`/`doc_len` come from the term index (db.get_program_terms) when at hand."""
+    text = match_text(program)
+    if terms is None:
+        terms = Counter(tokenize(text))
+    if doc_len is None:
+        doc_len = sum(terms.values())
+    return MatchFeatures(text, _exclude_text(program), _end_ordinal(program), terms, doc_len,
+                         preference_features(program), _region_mask(program))
+
+def bm25(terms: Dict[str, int], doc_len: int, stats: RelevanceStats) -> float:
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / stats.avgdl)
+    total = 0.0
+    for query, idf in stats.idf.items():
+        # Direct lookups of the corpus terms the query prefixes, not a scan of the document
+        tf = sum(terms.get(term, 0) for term in stats.expansions[query])
+        if tf:
+            total += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return total
+
+def idf(n_docs: int, df: int) -> float:
+    return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+class Corpus:
+    """
+    BM25 corpus statistics of the active set (see hot_set), kept up to date
+    by diff: update() drops and adds documents by program key, so an
+    ingestion or a day-boundary expiry only touches the postings that
+    changed. Terms are kept sorted, so a query prefix is one bisect range;
+    expansions and document frequencies are memoized until the next update.
+    """
+    def __init__(self, documents: Optional[Dict[str, MatchFeatures]] = None):
+        self._lock = threading.Lock()  # updated from ingestion threads, read while ranking
+        self._docs: Dict[str, Dict[str, int]] = {}
+        self._doc_lens: Dict[str, int] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._terms: List[str] = []
+        self._total = 0
+        self._memo: Dict[str, Tuple[Tuple[str, ...], int]] = {}
+        if documents:
+            self.update((), documents)
+
+    @property
+    def n_docs(self) -> int:
+        return len(self._docs)
+
+    @property
+    def avgdl(self) -> float:
+        return self._total / len(self._docs) if self._docs else 0.0
+
+    def update(self, removed: Iterable[str], added: Dict[str, MatchFeatures]):
+        """Drop the `removed` documents, then add (or replace) the `added` ones."""
+        with self._lock:
+            for key in removed:
+                self._remove(key)
+            for key, features in added.items():
+                self._remove(key)
+                self._docs[key] = features.terms
+                self._doc_lens[key] = features.doc_len
+                self._total += features.doc_len
+                for term in features.terms:
+                    docs = self._postings.get(term)
+                    if docs is None:
+                        docs = self._postings[term] = set()
+                        insort(self._terms, term)
+                    docs.add(key)
+            self._memo.clear()
+
+    def _remove(self, key: str):
+        terms = self._docs.pop(key, None)
+        if terms is None:
+            return
+        self._total -= self._doc_lens.pop(key)
+        for term in terms:
+            docs = self._postings[term]
+            docs.discard(key)
+            if not docs:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def _lookup(self, query: str) -> Tuple[Tuple[str, ...], int]:
+        memo = self._memo.get(query)
+        if memo is None:
+            start = bisect_left(self._terms, query)
+            end = bisect_left(self._terms, query + "\U0010ffff", start)
+            expansion = tuple(self._terms[start:end])
+            docs = set().union(*(self._postings[t] for t in expansion))
+            memo = self._memo[query] = (expansion, len(docs))
+        return memo
+
+    def df(self, query: str) -> int:
+        """Documents with a term starting with `query` (see tokenize)."""
+        with self._lock:
+            return self._lookup(query)[1]
+
+    def stats(self, queries: Iterable[str]) -> RelevanceStats:
+        """idf and prefix expansion of each query term, read in one consistent view."""
+        with self._lock:
+            n_docs, avgdl = self.n_docs, self.avgdl
+            lookups = {q: self._lookup(q) for q in queries}
+        return RelevanceStats({q: idf(n_docs, df) for q, (_, df) in lookups.items()}, avgdl,
+                              {q: expansion for q, (expansion, _) in lookups.items()})
+
+def relevance_stats(profile: Optional[Dict[str, Any]], corpus: Optional[Corpus]) -> Optional[RelevanceStats]:
+    """
+    idf of the profile's interest terms and the average document length,
+    or None when BM25 scoring is off. Computed once per ranking pass.
+    """
+    if RELEVANCE_SCORING != "bm25" or not profile or corpus is None or not corpus.avgdl:
+        return None
+    try:
+        interests = json.loads(profile.get('interests') or '[]')
+    except json.JSONDecodeError:
+        interests = []
+    return corpus.stats({t for interest in interests for t in tokenize(interest)})
+
+def check_exclude(program: ProgramLike, profile: Dict[str, Any], features: Optional[MatchFeatures] = None) -> bool:
     raw = profile.get('exclude_keywords', '[]')
     if not raw or not raw.strip():
         raw = '[]'
@@ -14,73 +218,23 @@ def check_exclude(program: Dict[str, Any], profile: Dict[str, Any]) -> bool:
     if not excludes:
         return False
         
-    text_fields = [
-        program.get('title', ''),
-        program.get('summary_raw', ''),
-        program.get('agency', ''),
-        program.get('url', '')
-    ]
-    combined = " ".join([t for t in text_fields if t]).lower()
+    combined = features.exclude_text if features else _exclude_text(program)
     
     for kw in excludes:
         if kw.lower() in combined:
             return True
     return False
 
-def check_region(program: Dict[str, Any], profile: Dict[str, Any]) -> bool:
-    raw = profile.get('region_allow', '[]')
-    if not raw or not raw.strip():
-        raw = '[]'
-    try:
-        allows = json.loads(raw)
-    except json.JSONDecodeError:
-        allows = ["전국"] # Default fallback
-    
-    # If "전국" in allowed, or empty, usually means allow all? 
+def check_region(program: ProgramLike, profile: Dict[str, Any], features: Optional[MatchFeatures] = None) -> bool:
     # PRD: "region_allow가 설정되어 있고... 명확히 배제 가능하면 제외"
-    # Defaults include "전국".
-    
-    if not allows:
-        return False # No restriction
-        
-    if "전국" in allows:
-        return False # Allow all
-        
-    region_raw = program.get('region_raw', '')
-    if not region_raw:
-        return False # Can't decide, so don't exclude
-        
-    # Check if region_raw contains any allowed region
-    # Simple substring check
-    hit = False
-    for region in allows:
-        if region in region_raw:
-            hit = True
-            break
-            
-    # If no hit, we might exclude. But "Ambiguous... do not exclude on region when ambiguous".
-    # So we only exclude if we are sure it's NOT in the list?
-    # Logic: If item says "Busan" and allowed is ["Seoul"], exclude.
-    # If item says "Nationwide" or null, don't exclude.
-    # For MVP, let's keep it simple: if region_raw is empty, keep.
-    # If region_raw implies a specific region not in allowed, exclude.
-    # Implementation: If region_raw contains any Korean region name that is NOT in allowed?
-    # Too complex. Let's just check: If region_raw is valid and DOES NOT contain any allowed, return True (Exclude)?
-    # Wait, region_raw might be "서울, 경기". Allowed "서울". Should be Keep.
-    # So: if region_raw has content, and NONE of allowed keywords are in it...
-    # BUT region_raw might be just "Technology Center".
-    # So we only exclude if region_raw contains a known region keyword that is NOT in allowed?
-    # Let's stick to safe defaults: Don't exclude unless sure.
-    # Let's try: if any allowed region matches region_raw, good.
-    # If region_raw contains "전국", good.
-    # If region_raw matches NO allowed region...
-    # We need a list of ALL regions to know if region_raw is actually a region.
-    # Ignored for MVP complexity. We will NOT exclude based on region unless we are sure.
-    # Let's just implement: if region_raw contains a region name that is in `allows`, we flag it as "region match".
-    # For exclusion: We won't implement strict region exclusion to avoid false negatives, per "otherwise do not exclude".
-    return False 
-
-def calculate_score(program: Dict[str, Any], profile: Dict[str, Any]) -> Tuple[int, List[str]]:
+    # Only postings that name a 시/도, none of them allowed, are excluded;
+    # 전국, an empty allow list or an unrecognized region never exclude.
+    return regions.is_excluded(_region_mask(program, features), regions.allow_mask(profile.get('region_allow')))
+
+def calculate_score(program: ProgramLike, profile: Dict[str, Any], features: Optional[MatchFeatures] = None,
+                    relevance: Optional[RelevanceStats] = None,
+                    preferences: Optional[Sequence[float]] = None,
+                    today: Optional[date] = None) -> Tuple[int, List[str]]:
     score = 5 # Base score
     reasons = []
     
@@ -98,21 +252,31 @@ def calculate_score(program: Dict[str, Any], profile: Dict[str, Any]) -> Tuple[i
     due_threshold = profile.get('due_days_threshold', 7)
     
     # Text for matching
-    title = program.get('title', '') or ''
-    summary = program.get('summary_raw', '') or ''
-    category = program.get('category_l1', '') or ''
-    text_content = (title + " " + summary + " " + category).lower()
+    text_content = features.match_text if features else match_text(program)
     
     # 1. Interests matching (+25)
-    # Check if any interest keyword is in text
-    interest_hit = False
-    for interest in interests:
-        if interest.lower() in text_content:
-            interest_hit = True
-            break
-    if interest_hit:
-        score += 25
-        reasons.append("관심분야 일치")
+    if relevance is not None:
+        # BM25 over the interest terms: a passing mention in a long posting
+        # earns a few points, a posting about the topic gets all 25.
+        if features:
+            terms, doc_len = features.terms, features.doc_len
+        else:
+            terms = index_terms(program)
+            doc_len = sum(terms.values())
+        points = round(INTEREST_POINTS * min(1.0, bm25(terms, doc_len, relevance) / BM25_FULL))
+        if points:
+            score += points
+            reasons.append(f"관심분야 일치(관련도 {points * 100 // INTEREST_POINTS}%)")
+    else:
+        # Check if any interest keyword is in text
+        interest_hit = False
+        for interest in interests:
+            if interest.lower() in text_content:
+                interest_hit = True
+                break
+        if interest_hit:
+            score += INTEREST_POINTS
+            reasons.append("관심분야 일치")
         
     # 2. Include keywords (+10 each, max +30)
     include_hits = 0
@@ -126,32 +290,42 @@ def calculate_score(program: Dict[str, Any], profile: Dict[str, Any]) -> Tuple[i
         reasons.append(f"키워드 매칭({include_hits}건)")
         
     # 3. Due soon (+15)
-    days_left = get_days_left(program)
+    days_left = get_days_left(program, features, today)
     if days_left is not None and days_left <= due_threshold and days_left >= 0:
         score += 15
         reasons.append(f"마감 임박: D-{days_left}")
     
     # 4. Region match (Bonus rationale, no score change in PRD? "only when confidently true")
     # PRD says "Region match" is a reason.
-    # Let's add it to reasons but not score? PRD says just "Reasons: ...".
-    # Let's check region match for reason.
-    allows = json.loads(profile.get('region_allow', '[]'))
-    region_raw = program.get('region_raw', '')
-    if region_raw and allows:
-        for region in allows:
-            if region in region_raw:
-                reasons.append(f"지역 조건 충족({region})")
-                break
+    matched = regions.names(_region_mask(program, features) & regions.allow_mask(profile.get('region_allow')))
+    if matched:
+        reasons.append(f"지역 조건 충족({matched[0]})")
+
+    # 5. Learned preferences (+/- up to 15)
+    if preferences is not None:
+        pref = features.preference_features if features else preference_features(program)
+        points, name = preference_score(preferences, pref)
+        if points:
+            score += points
+            reasons.append(f"{'저장' if points > 0 else '제외'} 이력 반영({name})")
 
     # Clamp
     final_score = max(0, min(100, score))
     return final_score, reasons
 
-def get_days_left(program: Dict[str, Any]) -> int:
+def get_days_left(program: ProgramLike, features: Optional[MatchFeatures] = None,
+                  today: Optional[date] = None) -> int:
     # return int or None
     # For support: apply_end_at
     # For event: apply_end_at (preferred) or event_end_at (if apply not avail? PRD says apply_end priority)
-    
+    # today: the date D-days count from (the active set passes its KST date); defaults to the local date.
+    today = today or date.today()
+
+    if features:
+        if features.end_ordinal is None:
+            return None
+        return features.end_ordinal - today.toordinal()
+        
     end_at = program.get('apply_end_at')
     if not end_at and program.get('kind') == 'event':
         # Fallback to event end? PRD says "Event: apply_period... based on receipt period. Event period separate."
@@ -162,35 +336,30 @@ def get_days_left(program: Dict[str, Any]) -> int:
         return None
         
     try:
-        dt_end = datetime.strptime(end_at, "%Y-%m-%d")
-        dt_now = datetime.now()
-        # D-day: end - now
-        delta = dt_end - dt_now
-        return delta.days + 1 # delta.days floors. If today is 1st, end is 1st, delta is 0?
-        # Typically D-0 means today.
-        # If now is 12:00, end is 00:00? No, date comparison.
-        # Let's use date objects.
-        d_end = dt_end.date()
-        d_now = dt_now.date()
-        return (d_end - d_now).days
+        # D-day: date comparison, D-0 means today.
+        d_end = datetime.strptime(end_at, "%Y-%m-%d").date()
+        return (d_end - today).days
     except:
         return None
 
-def is_recommended(program: Dict[str, Any], profile: Dict[str, Any]) -> Tuple[bool, int, List[str]]:
+def is_recommended(program: ProgramLike, profile: Dict[str, Any], features: Optional[MatchFeatures] = None,
+                   relevance: Optional[RelevanceStats] = None,
+                   preferences: Optional[Sequence[float]] = None,
+                   today: Optional[date] = None) -> Tuple[bool, int, List[str]]:
     # 1. Hard filters
-    if check_exclude(program, profile):
+    if check_exclude(program, profile, features):
         return False, 0, []
         
-    if check_region(program, profile): # Returns True if excluded
+    if check_region(program, profile, features): # Returns True if excluded
         return False, 0, []
         
     # Check if end date passed
-    days_left = get_days_left(program)
+    days_left = get_days_left(program, features, today)
     if days_left is not None and days_left < 0:
         return False, 0, []
         
     # 2. Score
-    score, reasons = calculate_score(program, profile)
+    score, reasons = calculate_score(program, profile, features, relevance, preferences, today)
     min_score = profile.get('min_score', 60)
     
     if score >= min_score:
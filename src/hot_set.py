@@ -0,0 +1,178 @@
+"""
+In-process, read-mostly cache of active programs (not past apply_end_at).
+
+The active set is small and only changes at ingestion, on save/dismiss and
+at the KST day boundary, so list and due commands are answered from here
+without touching SQLite. Readers grab the current `ActiveSnapshot`; writers
+build a new one and swap the module-level reference, which is atomic.
+
+The BM25 corpus statistics (filters.Corpus) ride along with the snapshot
+and are updated in place by diff on each swap: a reload re-reads only the
+programs that changed, with their term counts and norms from the
+program_terms index written at upsert, so ranking needs no DB reads and
+nothing is re-tokenized for postings that didn't change.
+
+Learned preference weights (preferences.py) are kept here too, per
+profile: read from `preference_model` once, then swapped by each
+save/dismiss under a lock.
+"""
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from array import array
+from typing import Callable, Dict, FrozenSet, Iterator, NamedTuple, Optional, Tuple
+
+from . import filters, metrics
+from .db import list_open_programs, get_dismissed_pairs, get_preference_weights, get_program_terms
+from .filters import Corpus, MatchFeatures, RelevanceStats, build_features, relevance_stats
+from .models import Program
+
+logger = logging.getLogger(__name__)
+
+KST = timezone(timedelta(hours=9))
+
+
+class ActiveProgram(NamedTuple):
+    program: Program
+    features: MatchFeatures
+
+
+class ActiveSnapshot(NamedTuple):
+    kst_date: str  # YYYY-MM-DD the snapshot was filtered for
+    programs: Tuple[ActiveProgram, ...]
+    dismissed: FrozenSet[Tuple[int, str]]  # (profile_id, program_key)
+    version: int
+    corpus: Corpus  # BM25 statistics of `programs` (shared, updated on each swap)
+
+    @property
+    def today(self) -> date:
+        """The KST date as a date, for D-day counts that agree with the expiry."""
+        return date.fromisoformat(self.kst_date)
+
+
+_snapshot: Optional[ActiveSnapshot] = None
+_version = 0
+_swap_lock = threading.Lock()  # ingestion may reload from a worker thread
+
+# profile id -> weights (None before the first save/dismiss)
+_preferences: Dict[int, Optional[array]] = {}
+_preferences_lock = threading.RLock()  # actions are learned from worker threads
+
+
+def kst_today() -> str:
+    return datetime.now(KST).strftime("%Y-%m-%d")
+
+
+def _swap(kst_date: str, programs, dismissed) -> ActiveSnapshot:
+    global _snapshot, _version
+    programs = tuple(programs)
+    with _swap_lock:
+        if _snapshot is None:
+            corpus = Corpus({ap.program.program_key: ap.features for ap in programs})
+        else:
+            # Dismissals are never undone, so keep any applied while a reload
+            # was reading the DB.
+            dismissed = frozenset(dismissed) | _snapshot.dismissed
+            corpus = _snapshot.corpus
+            if programs is not _snapshot.programs:
+                _update_corpus(corpus, _snapshot.programs, programs)
+        _version += 1
+        snapshot = ActiveSnapshot(kst_date, programs, frozenset(dismissed), _version, corpus)
+        _snapshot = snapshot
+    return snapshot
+
+
+def _update_corpus(corpus: Corpus, old, new):
+    # Entries are reused across snapshots while the program is unchanged,
+    # so identity tells what to drop and what to add.
+    current = {ap.program.program_key: ap for ap in old}
+    incoming = {ap.program.program_key: ap for ap in new}
+    removed = [key for key, ap in current.items() if incoming.get(key) is not ap]
+    added = {key: ap.features for key, ap in incoming.items() if current.get(key) is not ap}
+    if removed or added:
+        corpus.update(removed, added)
+
+
+def load() -> ActiveSnapshot:
+    """(Re)load the active set from the DB. Call at startup and after each ingestion commit."""
+    today = kst_today()
+    previous = {ap.program.program_key: ap for ap in _snapshot.programs} if _snapshot is not None else {}
+    rows = list_open_programs(today=today)
+    changed = [p for p in rows if p.program_key not in previous or previous[p.program_key].program != p]
+    indexed = get_program_terms(p.program_key for p in changed)
+    programs = []
+    for p in rows:
+        ap = previous.get(p.program_key)
+        if ap is None or ap.program != p:
+            ap = ActiveProgram(p, build_features(p, *indexed.get(p.program_key, (None, None))))
+        programs.append(ap)
+    snapshot = _swap(today, programs, get_dismissed_pairs())
+    logger.info(f"Active set loaded: {len(snapshot.programs)} programs")
+    return snapshot
+
+
+def _expire(snapshot: ActiveSnapshot, today: str) -> ActiveSnapshot:
+    # Day boundary: drop items whose deadline has passed, in memory.
+    cutoff = datetime.strptime(today, "%Y-%m-%d").toordinal()
+    programs = [
+        ap for ap in snapshot.programs
+        if ap.features.end_ordinal is None or ap.features.end_ordinal >= cutoff
+    ]
+    return _swap(today, programs, snapshot.dismissed)
+
+
+def get() -> ActiveSnapshot:
+    snapshot = _snapshot
+    if snapshot is None:
+        return load()
+    today = kst_today()
+    if snapshot.kst_date != today:
+        return _expire(snapshot, today)
+    return snapshot
+
+
+def iter_active(kind: Optional[str] = None, profile_id: int = 1) -> Iterator[ActiveProgram]:
+    """Active programs not dismissed by the profile (optionally of one kind)."""
+    snapshot = get()
+    metrics.add_rows(len(snapshot.programs))
+    dismissed = snapshot.dismissed
+    for ap in snapshot.programs:
+        if kind and ap.program.kind != kind:
+            continue
+        if (profile_id, ap.program.program_key) in dismissed:
+            continue
+        yield ap
+
+
+def apply_action(program_key: str, action: str, profile_id: int = 1):
+    """Reflect a save/dismiss that was just committed to user_actions.
+
+    Always swaps, so the snapshot version (the response cache's data
+    version) moves on every action.
+    """
+    snapshot = get()
+    dismissed = snapshot.dismissed | {(profile_id, program_key)} if action == "dismissed" else snapshot.dismissed
+    _swap(snapshot.kst_date, snapshot.programs, dismissed)
+
+
+def get_relevance_stats(profile: Optional[dict]) -> Optional[RelevanceStats]:
+    """BM25 statistics for the profile's interests over the current active set."""
+    if filters.RELEVANCE_SCORING != "bm25":
+        return None  # don't load the active set just to find that out
+    return relevance_stats(profile, get().corpus)
+
+
+def preference_weights(profile_id: int = 1) -> Optional[array]:
+    """The profile's learned weights; never modified in place, so safe to read while ranking."""
+    with _preferences_lock:
+        if profile_id not in _preferences:
+            _preferences[profile_id] = get_preference_weights(profile_id)
+        return _preferences[profile_id]
+
+
+def update_preference_weights(profile_id: int, update: Callable[[Optional[array]], array]) -> array:
+    """Swap in update(current weights); concurrent updates apply one after the other."""
+    with _preferences_lock:
+        weights = update(preference_weights(profile_id))
+        _preferences[profile_id] = weights
+        return weights
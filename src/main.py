@@ -6,8 +6,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from src.db import init_db
+from src import hot_set, metrics, tracing
 from src.telegram_bot import create_app
-from src.scheduler import start_scheduler
 
 # Configure logging
 logging.basicConfig(
@@ -16,11 +16,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def start_scheduler(application):
+    # APScheduler, pytz and the Bizinfo client (requests) load here, once the
+    # bot is up, instead of on import
+    from src.scheduler import start_scheduler as start
+    start(application)
+
 def main():
     # 1. Initialize Database
     logger.info("Initializing database...")
     init_db()
     
+    # Active programs are served from memory; load them before polling starts.
+    hot_set.load()
+    
     # 2. Key Check
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     if not token:
@@ -38,7 +47,14 @@ def main():
         logger.info("Starting scheduler...")
         start_scheduler(application)
         
+    async def post_shutdown(application):
+        tracing.flush()  # spans buffered since the last flush job
+        
     app.post_init = post_init
+    app.post_shutdown = post_shutdown
+    
+    # Optional local Prometheus endpoint (METRICS_PORT)
+    metrics.start_exporter()
     
     # 5. Run Polling
     logger.info("Starting polling...")
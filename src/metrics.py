@@ -0,0 +1,240 @@
+"""
+Command and job metrics: in-process histograms, a Prometheus text
+exporter and a /health summary.
+
+Every PTB handler (wrapped in create_app by instrument_handlers) and
+scheduler job (@instrument) records, per call:
+- bot_latency_seconds: wall time of the call;
+- bot_db_seconds: time SQLite connections were open during the call
+  (db.get_connection hands out MeteredConnection);
+- bot_rows: rows read (programs loaded from SQLite or scanned in the
+  active set, see add_rows);
+- bot_message_bytes: UTF-8 bytes of the messages sent (see add_message_bytes).
+
+The per-call tallies live in a ContextVar, which asyncio.to_thread copies
+into worker threads, so blocking DB work done off the loop is counted
+too. Recording is a few perf_counter calls and bisects under a lock.
+
+The same wrapper runs armed calls under the profiler (see profiling.py).
+
+With METRICS_PORT set, /metrics is served on METRICS_ADDR (127.0.0.1 by
+default) in the Prometheus text format.
+"""
+import bisect
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = os.getenv("METRICS_PORT", "").strip()
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROWS_BUCKETS = (0, 10, 50, 100, 500, 1000, 5000, 10000)
+BYTES_BUCKETS = (0, 256, 1024, 4096, 16384, 65536)
+
+# metric -> (help, buckets)
+METRICS = {
+    "bot_latency_seconds": ("Handler/job wall time", SECONDS_BUCKETS),
+    "bot_db_seconds": ("Time SQLite connections were open", SECONDS_BUCKETS),
+    "bot_rows": ("Rows read from SQLite or the active set", ROWS_BUCKETS),
+    "bot_message_bytes": ("UTF-8 bytes of messages sent", BYTES_BUCKETS),
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None past the last bucket)."""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+
+# (metric, kind, name) -> Histogram; kind is "handler" or "job"
+_histograms: Dict[Tuple[str, str, str], Histogram] = {}
+_lock = threading.Lock()
+
+# Tallies of the call in progress: [db_seconds, rows, message_bytes]
+_scope: ContextVar[Optional[List[float]]] = ContextVar("metrics_scope", default=None)
+
+
+def _observe(metric: str, kind: str, name: str, value: float):
+    key = (metric, kind, name)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(METRICS[metric][1])
+        histogram.observe(value)
+
+
+def add_rows(n: int):
+    scope = _scope.get()
+    if scope is not None:
+        scope[1] += n
+
+
+def add_message_bytes(text: Optional[str]):
+    scope = _scope.get()
+    if scope is not None and text:
+        scope[2] += len(text.encode("utf-8"))
+
+
+class MeteredConnection(sqlite3.Connection):
+    """sqlite3 connection that adds its open-to-close time to the current call."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._opened = time.perf_counter()
+
+    def close(self):
+        super().close()
+        scope = _scope.get()
+        if scope is not None:
+            scope[0] += time.perf_counter() - self._opened
+
+
+def instrument(name: Optional[str] = None, kind: str = "job"):
+    """Decorator for async handlers/jobs."""
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapped(*args, **kwargs):
+            scope = [0.0, 0, 0]
+            token = _scope.set(scope)
+            started = time.perf_counter()
+            try:
+                profile, report = profiling.take(kind)
+                if profile:
+                    return await profiling.run(f"{kind}:{label}", func(*args, **kwargs), report)
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                _scope.reset(token)
+                _observe("bot_latency_seconds", kind, label, elapsed)
+                _observe("bot_db_seconds", kind, label, scope[0])
+                _observe("bot_rows", kind, label, scope[1])
+                _observe("bot_message_bytes", kind, label, scope[2])
+        wrapped._metered = True
+        return wrapped
+    return decorate
+
+
+def _wrap_handler(handler):
+    # ConversationHandler: wrap the handlers it dispatches to
+    nested = getattr(handler, "entry_points", None)
+    if nested is not None:
+        for inner in [*handler.entry_points, *handler.fallbacks,
+                      *(h for hs in handler.states.values() for h in hs)]:
+            _wrap_handler(inner)
+        return
+    callback = handler.callback
+    if not getattr(callback, "_metered", False):
+        handler.callback = instrument(callback.__name__, kind="handler")(callback)
+
+
+def instrument_handlers(app):
+    """Middleware-style: instrument every handler registered on the PTB Application."""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _wrap_handler(handler)
+
+
+def snapshot() -> Dict[Tuple[str, str, str], Histogram]:
+    with _lock:
+        copies = {}
+        for key, h in _histograms.items():
+            copy = Histogram(h.buckets)
+            copy.counts, copy.sum, copy.count = list(h.counts), h.sum, h.count
+            copies[key] = copy
+        return copies
+
+
+def _bound(value) -> str:
+    return f"{value:g}"
+
+
+def render() -> str:
+    """Prometheus text exposition format."""
+    histograms = snapshot()
+    lines = []
+    for metric, (help_text, _) in METRICS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (m, kind, name), h in sorted(histograms.items()):
+            if m != metric:
+                continue
+            labels = f'{kind}="{name}"'
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{labels},le="{_bound(bound)}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"{metric}_sum{{{labels}}} {h.sum:g}")
+            lines.append(f"{metric}_count{{{labels}}} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+def summary(limit: int = 8) -> str:
+    """/health lines: busiest handlers/jobs with mean and p95 latency."""
+    latencies = [(name, h) for (m, _, name), h in snapshot().items() if m == "bot_latency_seconds" and h.count]
+    latencies.sort(key=lambda item: item[1].count, reverse=True)
+    lines = []
+    for name, h in latencies[:limit]:
+        p95 = h.quantile(0.95)
+        p95_text = f"≤{p95 * 1000:g}ms" if p95 is not None else f">{SECONDS_BUCKETS[-1]:g}s"
+        lines.append(f"{name}: {h.count}회, 평균 {h.sum / h.count * 1000:.0f}ms, p95 {p95_text}")
+    return "\n".join(lines)
+
+
+def start_exporter(port: Optional[int] = None, addr: str = METRICS_ADDR):
+    """Serve /metrics in a daemon thread; no-op unless a port is given or METRICS_PORT is set."""
+    port = port if port is not None else (int(METRICS_PORT) if METRICS_PORT else None)
+    if port is None:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes would flood the bot log
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    logger.info(f"Metrics exporter on http://{addr}:{server.server_address[1]}/metrics")
+    return server
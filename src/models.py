@@ -0,0 +1,131 @@
+import hashlib
+import re
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+
+class Program(NamedTuple):
+    """
+    One row of the `programs` table, in column order.
+
+    Tuple-backed (no per-instance __dict__), so rows are built straight from
+    sqlite3 tuples with `Program._make(row)` and bound back as statement
+    parameters without conversion. Key access (`p['title']`, `p.get(...)`)
+    is kept so filters and formatters work on Programs and plain dicts alike.
+    """
+    program_key: str
+    kind: str
+    source: str = "bizinfo"
+    seq: Optional[str] = None
+    title: Optional[str] = None
+    summary_raw: Optional[str] = None
+    agency: Optional[str] = None
+    category_l1: Optional[str] = None
+    region_raw: Optional[str] = None
+    apply_period_raw: Optional[str] = None
+    apply_start_at: Optional[str] = None
+    apply_end_at: Optional[str] = None
+    event_period_raw: Optional[str] = None
+    event_start_at: Optional[str] = None
+    event_end_at: Optional[str] = None
+    url: Optional[str] = None
+    created_at_source: Optional[str] = None
+    updated_at_source: Optional[str] = None
+    ingested_at: Optional[str] = None
+    raw_item: Optional[bytes] = None
+    cluster_id: Optional[str] = None  # near-duplicate cluster, set by dedup at upsert
+    region_mask: Optional[int] = None  # 시/도 bits, set by regions at upsert
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in _FIELD_SET:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Program":
+        return cls(**{k: v for k, v in data.items() if k in _FIELD_SET})
+
+
+PROGRAM_COLUMNS = Program._fields
+_FIELD_SET = frozenset(PROGRAM_COLUMNS)
+# Columns that reflect the source item (ingested_at is just our clock,
+# raw_item is covered by what is derived from it, cluster_id and
+# region_mask are ours)
+CONTENT_COLUMNS = tuple(c for c in PROGRAM_COLUMNS
+                        if c not in ("program_key", "ingested_at", "raw_item", "cluster_id", "region_mask"))
+# Changes worth telling the user about again (e.g. not a summary typo fix)
+NOTIFY_COLUMNS = ("title", "apply_end_at", "event_end_at")
+# Columns whose text feeds keyword matching and BM25 (see match_text)
+MATCH_COLUMNS = ("title", "summary_raw", "category_l1")
+
+
+def _hash_columns(program: "Program", columns) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    for column in columns:
+        h.update(repr(getattr(program, column)).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def content_hash(program: "Program") -> str:
+    """Short digest of a program's derived content, to tell new/changed from seen."""
+    return _hash_columns(program, CONTENT_COLUMNS)
+
+
+def notify_hash(program: "Program") -> str:
+    """Digest of the fields whose change warrants a new notification (title, deadlines)."""
+    return _hash_columns(program, NOTIFY_COLUMNS)
+
+
+FIELD_HASH_SIZE = 8
+
+
+def field_hashes(program: "Program") -> bytes:
+    """One FIELD_HASH_SIZE-byte digest per CONTENT_COLUMNS entry, concatenated in order."""
+    return b"".join(
+        hashlib.blake2b(repr(getattr(program, c)).encode("utf-8"), digest_size=FIELD_HASH_SIZE).digest()
+        for c in CONTENT_COLUMNS
+    )
+
+
+# Anything filters/formatters accept: a Program or a legacy dict.
+ProgramLike = Union[Program, Dict[str, Any]]
+
+
+def match_text(program: ProgramLike) -> str:
+    title = program.get('title', '') or ''
+    summary = program.get('summary_raw', '') or ''
+    category = program.get('category_l1', '') or ''
+    return (title + " " + summary + " " + category).lower()
+
+
+# Latin/digit runs and Hangul runs are separate terms ("AI바우처를" -> "ai", "바우처를");
+# query terms match as prefixes so Korean particles don't get in the way.
+_TERM_RE = re.compile(r"[0-9a-z]+|[가-힣]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TERM_RE.findall(text.lower())
+
+
+def index_terms(program: ProgramLike) -> Dict[str, int]:
+    """Term counts of the program's match text (program_terms rows, see db.py)."""
+    return Counter(tokenize(match_text(program)))
+
+
+def program_row_factory(cursor, row) -> Program:
+    """sqlite3 row_factory for queries selecting PROGRAM_COLUMNS in order."""
+    return Program._make(row)
+
+
+class Recommendation(NamedTuple):
+    program: Program
+    score: int
+    reasons: List[str]
@@ -1,9 +1,36 @@
 from datetime import datetime
+import html
 import json
+import re
+import zlib
 from .due_parser import parse_period
+from .models import Program
 from typing import Dict, Any
 
-def normalize_support(item: Dict[str, Any]) -> Dict[str, Any]:
+def pack_raw_item(item: Dict[str, Any]) -> bytes:
+    # Raw API item as compact, zlib-compressed JSON so derived columns
+    # can be recomputed later without re-fetching (see rederive.py).
+    payload = json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'), 6)
+
+def unpack_raw_item(blob: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]*>')
+_WS_RE = re.compile(r'\s+')
+
+def strip_html(text):
+    # Plain, whitespace-collapsed text for matching and display.
+    # The original markup stays in the compressed raw_item.
+    if not text:
+        return text
+    text = _SCRIPT_STYLE_RE.sub(' ', text)
+    text = _TAG_RE.sub(' ', text)
+    text = html.unescape(text)
+    return _WS_RE.sub(' ', text).strip()
+
+def normalize_support(item: Dict[str, Any]) -> Program:
     # Item keys based on Bizinfo JSON response (may vary, need to be robust)
     # Common keys: pblancId, pblancNm, reqstBeginEndDe, reqstDt, creatPnttm, etc.
     # We map them to our schema.
@@ -16,26 +43,27 @@ def normalize_support(item: Dict[str, Any]) -> Dict[str, Any]:
     apply_period_raw = item.get('reqstBeginEndDe') or item.get('reqstDt')
     start_at, end_at = parse_period(apply_period_raw)
     
-    return {
-        "program_key": f"support:{seq}",
-        "kind": "support",
-        "source": "bizinfo",
-        "seq": seq,
-        "title": title,
-        "summary_raw": item.get('pblancSumry') or item.get('pblancCn') or item.get('bsnsSumryCn'), # Added bsnsSumryCn
-        "agency": item.get('jrsdinstNm') or item.get('excInsttNm'),
-        "category_l1": item.get('pblancClCd'),
-        "region_raw": item.get('jrsdinstNm'),
-        "apply_period_raw": apply_period_raw,
-        "apply_start_at": start_at,
-        "apply_end_at": end_at,
-        "url": item.get('pblancUrl') or item.get('inqireUrl') or f"https://www.bizinfo.go.kr/web/ext/retrieveDtlNews.do?pblancId={seq}", # Added pblancUrl
-        "created_at_source": item.get('creatPnttm'),
-        "updated_at_source": None,
-        "ingested_at": datetime.now().isoformat()
-    }
+    return Program(
+        program_key=f"support:{seq}",
+        kind="support",
+        source="bizinfo",
+        seq=seq,
+        title=title,
+        summary_raw=strip_html(item.get('pblancSumry') or item.get('pblancCn') or item.get('bsnsSumryCn')), # Added bsnsSumryCn
+        agency=item.get('jrsdinstNm') or item.get('excInsttNm'),
+        category_l1=item.get('pblancClCd'),
+        region_raw=item.get('jrsdinstNm'),
+        apply_period_raw=apply_period_raw,
+        apply_start_at=start_at,
+        apply_end_at=end_at,
+        url=item.get('pblancUrl') or item.get('inqireUrl') or f"https://www.bizinfo.go.kr/web/ext/retrieveDtlNews.do?pblancId={seq}", # Added pblancUrl
+        created_at_source=item.get('creatPnttm'),
+        updated_at_source=None,
+        ingested_at=datetime.now().isoformat(),
+        raw_item=pack_raw_item(item)
+    )
 
-def normalize_event(item: Dict[str, Any]) -> Dict[str, Any]:
+def normalize_event(item: Dict[str, Any]) -> Program:
     # Try multiple keys for ID and Title
     # Log says: nttNm (Title), nttCn (Content), registDe (Date), eventBeginEndDe (Period), orginlUrlAdres (URL)
     # Also eventInfoId might be ID? But log shows 'eventInfoId': '...' isn't in top content?
@@ -50,25 +78,26 @@ def normalize_event(item: Dict[str, Any]) -> Dict[str, Any]:
     event_period_raw = item.get('eventBeginEndDe') or item.get('eventPeriod')
     event_start, event_end = parse_period(event_period_raw)
     
-    return {
-        "program_key": f"event:{seq}",
-        "kind": "event",
-        "source": "bizinfo",
-        "seq": seq,
-        "title": title,
-        "summary_raw": item.get('nttCn') or item.get('eventCn') or item.get('pblancCn'),
-        "agency": item.get('insttNm') or item.get('jrsdinstNm'),
-        "category_l1": "행사",
-        "region_raw": item.get('areaNm') or item.get('jrsdinstNm'),
-        "apply_period_raw": apply_period_raw,
-        "apply_start_at": apply_start,
-        "apply_end_at": apply_end,
-        "event_period_raw": event_period_raw,
-        "event_start_at": event_start,
-        "event_end_at": event_end,
-        "url": item.get('orginlUrlAdres') or item.get('inqireUrl') or item.get('url') or f"https://www.bizinfo.go.kr/web/ext/retrieveDtlNews.do?pblancId={seq}",
-        "created_at_source": item.get('regDate') or item.get('creatPnttm'),
-        "updated_at_source": None,
-        "ingested_at": datetime.now().isoformat()
-    }
+    return Program(
+        program_key=f"event:{seq}",
+        kind="event",
+        source="bizinfo",
+        seq=seq,
+        title=title,
+        summary_raw=strip_html(item.get('nttCn') or item.get('eventCn') or item.get('pblancCn')),
+        agency=item.get('insttNm') or item.get('jrsdinstNm'),
+        category_l1="행사",
+        region_raw=item.get('areaNm') or item.get('jrsdinstNm'),
+        apply_period_raw=apply_period_raw,
+        apply_start_at=apply_start,
+        apply_end_at=apply_end,
+        event_period_raw=event_period_raw,
+        event_start_at=event_start,
+        event_end_at=event_end,
+        url=item.get('orginlUrlAdres') or item.get('inqireUrl') or item.get('url') or f"https://www.bizinfo.go.kr/web/ext/retrieveDtlNews.do?pblancId={seq}",
+        created_at_source=item.get('regDate') or item.get('creatPnttm'),
+        updated_at_source=None,
+        ingested_at=datetime.now().isoformat(),
+        raw_item=pack_raw_item(item)
+    )
 
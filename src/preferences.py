@@ -0,0 +1,66 @@
+"""
+Online preference model learned from save/dismiss actions.
+
+A logistic model over hashed program features (agency, category, kind,
+title terms; see filters.preference_features). Each action is one SGD
+step touching only that program's features, so rankings move right after
+the action without any batch retraining. The weights are a float32 vector
+(PREFERENCE_DIM entries) stored as one BLOB in `preference_model`; rankers
+read the in-memory copy in hot_set, which learn() updates first.
+
+learn() does blocking DB I/O; the bot calls it from a worker thread.
+"""
+import logging
+import math
+import threading
+from array import array
+from typing import Optional
+
+from . import hot_set
+from .db import get_programs, save_preference_weights
+from .filters import PREFERENCE_DIM, preference_features, preference_margin
+
+logger = logging.getLogger(__name__)
+
+LEARNING_RATE = 0.5
+LABELS = {"saved": 1.0, "dismissed": 0.0}
+
+# Writes the newest in-memory weights, so concurrent learns can't persist out of order
+_persist_lock = threading.Lock()
+
+
+def empty_weights() -> array:
+    return array("f", bytes(4 * PREFERENCE_DIM))
+
+
+def update(weights: array, features: dict, label: float, learning_rate: float = LEARNING_RATE):
+    """One logistic-regression SGD step, in place."""
+    if not features:
+        return
+    x = 1 / math.sqrt(len(features))
+    predicted = 1 / (1 + math.exp(-preference_margin(weights, features)))
+    step = learning_rate * (label - predicted) * x
+    for i in features:
+        weights[i] += step
+
+
+def learn(program_key: str, action: str, profile_id: int = 1) -> Optional[array]:
+    """Fold one save/dismiss into the model and persist it. Returns the new weights."""
+    label = LABELS.get(action)
+    if label is None:
+        return None
+    programs = get_programs([program_key])
+    if not programs:
+        logger.info(f"No program {program_key} to learn from")
+        return None
+    features = preference_features(programs[0])
+
+    def step(current: Optional[array]) -> array:
+        weights = array("f", current) if current else empty_weights()
+        update(weights, features, label)
+        return weights
+
+    weights = hot_set.update_preference_weights(profile_id, step)
+    with _persist_lock:
+        save_preference_weights(hot_set.preference_weights(profile_id), profile_id)
+    return weights
@@ -0,0 +1,79 @@
+"""
+Reverse (query-side) index from profile terms to profiles.
+
+Instead of scoring every (profile, program) pair, each new or re-worded
+program is tokenized once and every substring of its tokens (up to the
+longest indexed term) is looked up here. The profiles found are the only
+ones that can get interest/keyword points, so only they get a
+`profile_matches` row and are scored for their digest; profiles whose
+min_score is reachable without any term hit are candidates for everything. Cost grows with the text length
+and the number of matching profiles, not with the number of profiles.
+
+Profiles restricted to some regions are dropped with one AND against the
+posting's region mask (see regions.py).
+"""
+import json
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Set
+
+from . import regions
+from .filters import PREFERENCE_POINTS, tokenize
+
+# Most a program can score without any interest/keyword hit:
+# base 5 + due soon 15 + learned preferences
+MAX_POINTS_WITHOUT_TERMS = 5 + 15 + PREFERENCE_POINTS
+
+
+class ProfileIndex(NamedTuple):
+    terms: Dict[str, FrozenSet[int]]  # term token -> profile ids
+    always: FrozenSet[int]            # profiles that are candidates for every program
+    max_len: int
+    allowed: Dict[int, int]           # profile id -> region allow mask, for restricted profiles only
+
+
+def _load(raw) -> list:
+    try:
+        return json.loads(raw or '[]')
+    except json.JSONDecodeError:
+        return []
+
+
+def build(profiles: Iterable[dict]) -> ProfileIndex:
+    terms: Dict[str, Set[int]] = {}
+    always = set()
+    allowed = {}
+    for profile in profiles:
+        mask = regions.allow_mask(profile.get('region_allow'))
+        if mask:
+            allowed[profile['id']] = mask
+        words = _load(profile.get('interests')) + _load(profile.get('include_keywords'))
+        tokens = {t for word in words for t in tokenize(word)}
+        if not tokens or (profile.get('min_score') or 0) <= MAX_POINTS_WITHOUT_TERMS:
+            always.add(profile['id'])
+            continue
+        for token in tokens:
+            terms.setdefault(token, set()).add(profile['id'])
+    return ProfileIndex(
+        {t: frozenset(ids) for t, ids in terms.items()},
+        frozenset(always),
+        max((len(t) for t in terms), default=0),
+        allowed,
+    )
+
+
+def candidates(index: ProfileIndex, text: str, region_mask: Optional[int] = None) -> Set[int]:
+    """
+    Profiles that may recommend a program with this (match) text and region
+    mask. A superset: scoring matches interests as substrings, so every
+    substring of every token is looked up.
+    """
+    found = set(index.always)
+    if index.terms:
+        for token in set(tokenize(text)):
+            for i in range(len(token)):
+                for j in range(i + 1, min(len(token), i + index.max_len) + 1):
+                    ids = index.terms.get(token[i:j])
+                    if ids:
+                        found |= ids
+    if region_mask and index.allowed:
+        found = {pid for pid in found if not regions.is_excluded(region_mask, index.allowed.get(pid, 0))}
+    return found
@@ -0,0 +1,164 @@
+"""
+On-demand profiling of live handlers and scheduler jobs.
+
+The owner arms it with `/profile_next [N]` (next N handler calls) or
+`/profile_next job [N]` (next N scheduler jobs), or at startup with
+PROFILE_NEXT_HANDLERS / PROFILE_NEXT_JOBS. The next matching calls through
+metrics.instrument run under a sampling profiler.
+
+The profiler samples every thread's stack every PROFILE_INTERVAL seconds
+(sys._current_frames), keeping stacks that run this package's code. That
+way work moved off the loop with asyncio.to_thread (ingestion, digest
+building, SQLite) is seen too. Other handlers running at the same time can
+show up in the samples.
+
+Each profile is stored under <DB dir>/profiles/ (data/profiles/ by default)
+as collapsed stacks ("a;b;c count" lines, flamegraph.pl / speedscope
+input). The top functions by cumulative time are logged and, when armed
+from the bot, sent back to the chat.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_INTERVAL = 0.005
+TOP_N = 15
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+Report = Callable[[str], Awaitable[None]]
+
+# kind ("handler" / "job") -> [calls left, report callback]
+_armed: Dict[str, list] = {
+    "handler": [int(os.getenv("PROFILE_NEXT_HANDLERS", "0")), None],
+    "job": [int(os.getenv("PROFILE_NEXT_JOBS", "0")), None],
+}
+_lock = threading.Lock()
+
+
+def arm(kind: str, calls: int, report: Optional[Report] = None):
+    with _lock:
+        _armed[kind] = [calls, report]
+
+
+def take(kind: str) -> Tuple[bool, Optional[Report]]:
+    """Claim one armed call of `kind`: (profile it?, report callback)."""
+    slot = _armed[kind]
+    if slot[0] <= 0:  # unlocked fast path, the common case
+        return False, None
+    with _lock:
+        if slot[0] <= 0:
+            return False, None
+        slot[0] -= 1
+        return True, slot[1]
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    if path.startswith(_PACKAGE_DIR):
+        path = "src/" + os.path.relpath(path, _PACKAGE_DIR)
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Background thread collecting collapsed stacks of every thread running package code."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                ours = False
+                while frame is not None:
+                    code = frame.f_code
+                    # Ignore the instrumentation's own frames
+                    if code.co_filename.startswith(_PACKAGE_DIR) and not code.co_filename.endswith(("metrics.py", "profiling.py", "main.py")):
+                        ours = True
+                    stack.append(_frame_label(code))
+                    frame = frame.f_back
+                if ours:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def top_functions(stacks: Counter, limit: int = TOP_N) -> List[Tuple[str, int, int]]:
+    """(function, cumulative samples, self samples), by cumulative samples."""
+    cumulative: Counter = Counter()
+    own: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        for name in set(frames):
+            cumulative[name] += count
+        own[frames[-1]] += count
+    return [(name, n, own[name]) for name, n in cumulative.most_common(limit)]
+
+
+def profile_dir() -> str:
+    from .db import DB_PATH
+    return os.path.join(os.path.dirname(DB_PATH) or ".", "profiles")
+
+
+def save(label: str, stacks: Counter) -> str:
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", label)
+    path = os.path.join(directory, f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{safe}.folded")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def format_report(label: str, elapsed: float, sampler: Sampler, path: str) -> str:
+    lines = [f"🔬 {label}: {elapsed * 1000:.0f}ms, 샘플 {sampler.samples}개 ({sampler.interval * 1000:g}ms 간격)",
+             f"저장: {path}", "누적 시간 상위 함수 (누적/자체 ms):"]
+    ms = sampler.interval * 1000
+    for name, cumulative, own in top_functions(sampler.stacks):
+        lines.append(f"{cumulative * ms:.0f}/{own * ms:.0f} {name}")
+    if not sampler.stacks:
+        lines.append("(샘플 없음: 호출이 샘플 간격보다 짧았습니다)")
+    return "\n".join(lines)
+
+
+async def run(label: str, call: Awaitable, report: Optional[Report] = None):
+    """Await `call` under the sampler, then store the profile and report it."""
+    sampler = Sampler()
+    started = time.perf_counter()
+    try:
+        with sampler:
+            return await call
+    finally:
+        elapsed = time.perf_counter() - started
+        text = format_report(label, elapsed, sampler, save(label, sampler.stacks))
+        logger.info(text)
+        if report:
+            try:
+                await report(text)
+            except Exception as e:
+                logger.warning(f"Could not send profile report: {e}")
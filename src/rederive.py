@@ -0,0 +1,142 @@
+"""
+Re-derive parsed/normalized columns of stored programs from their raw items.
+
+When due_parser or normalizer logic improves, existing rows keep their old
+derived values until the posting is fetched again. This job streams the
+`programs` table in chunks, re-runs normalization over the stored `raw_item`
+blobs across worker processes and writes back only rows whose derived
+values changed, through the same update path as ingestion (db.apply_rederived):
+field hashes, region mask, dedup cluster, term index, profile matches and
+the program_changes log (/changes) follow the new values.
+
+Usage:
+    python -m src.rederive [--chunk-size N] [--workers N] [--vacuum]
+"""
+import argparse
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load env if present (DB_PATH is read when .db is imported)
+load_dotenv()
+
+from .db import apply_rederived, get_connection, init_db
+from .models import CONTENT_COLUMNS, Program
+from .normalizer import normalize_support, normalize_event, unpack_raw_item
+
+logger = logging.getLogger(__name__)
+
+# Everything the normalizer derives, except the key itself, the ingestion
+# timestamp (not derived from the item), the raw blob and our cluster id.
+DERIVED_FIELDS = list(CONTENT_COLUMNS)
+
+NORMALIZERS = {
+    "support": normalize_support,
+    "event": normalize_event,
+}
+
+
+def _iter_chunks(conn, chunk_size: int) -> Iterator[List[Tuple]]:
+    # Keyset pagination: every chunk is a complete statement, so the same
+    # connection can write between reads without holding a read cursor open.
+    columns = ", ".join(DERIVED_FIELDS)
+    last_key = ""
+    while True:
+        rows = conn.execute(
+            f"SELECT program_key, raw_item, {columns} FROM programs "
+            "WHERE program_key > ? AND raw_item IS NOT NULL "
+            "ORDER BY program_key LIMIT ?",
+            (last_key, chunk_size),
+        ).fetchall()
+        if not rows:
+            return
+        last_key = rows[-1][0]
+        yield [tuple(r) for r in rows]
+
+
+def rederive_chunk(rows: List[Tuple]) -> List[Program]:
+    """
+    Worker: returns the re-derived Programs (without raw_item) of rows whose
+    derived values differ from what is stored.
+    """
+    changed = []
+    for program_key, blob, *old in rows:
+        kind = old[0]
+        normalize = NORMALIZERS.get(kind)
+        if normalize is None:
+            continue
+        try:
+            norm = normalize(unpack_raw_item(blob))
+        except Exception as e:
+            logger.error(f"Error re-deriving {program_key}: {e}")
+            continue
+        if norm["program_key"] != program_key:
+            # Key derivation changed; that needs a real re-ingest, not an update.
+            logger.warning(f"Skipping {program_key}: re-derived key is {norm['program_key']}")
+            continue
+        new = [norm.get(f) for f in DERIVED_FIELDS]
+        if new != old:
+            changed.append(norm._replace(raw_item=None))
+    return changed
+
+
+def _write(conn, changed: List[Program]) -> int:
+    if not changed:
+        return 0
+    # Same hooks as an ingest update, so the change-detection hashes,
+    # clusters, matches and /changes stay in step with the new values.
+    written = sum(apply_rederived(conn, program) for program in changed)
+    conn.commit()
+    return written
+
+
+def rederive(chunk_size: int = 2000, workers: Optional[int] = None) -> Dict[str, int]:
+    workers = workers or os.cpu_count() or 1
+    stats = {"scanned": 0, "changed": 0}
+    conn = get_connection()
+    try:
+        if workers == 1:
+            for chunk in _iter_chunks(conn, chunk_size):
+                stats["scanned"] += len(chunk)
+                stats["changed"] += _write(conn, rederive_chunk(chunk))
+            return stats
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Bounded number of chunks in flight keeps memory flat on big archives.
+            pending = deque()
+            for chunk in _iter_chunks(conn, chunk_size):
+                stats["scanned"] += len(chunk)
+                pending.append(pool.submit(rederive_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    stats["changed"] += _write(conn, pending.popleft().result())
+            while pending:
+                stats["changed"] += _write(conn, pending.popleft().result())
+        return stats
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-derive program columns from stored raw items")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to reclaim space (e.g. after summaries shrink)")
+    args = parser.parse_args()
+
+    # Brings a database from before raw items/field hashes/region masks up to date
+    init_db()
+    stats = rederive(chunk_size=args.chunk_size, workers=args.workers)
+    logger.info(f"Re-derive finished: scanned {stats['scanned']}, changed {stats['changed']}")
+
+    if args.vacuum and stats["changed"]:
+        conn = get_connection()
+        conn.execute("VACUUM")
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,125 @@
+"""
+Region gazetteer: Korean 시/도 resolved once at ingest into a bitmask.
+
+Every posting gets a `region_mask` at upsert (one bit per 시/도 it names,
+plus NATIONWIDE for 전국), resolved from the "[서울]" tag that prefixes many
+titles, else `region_raw`, else the agency name. A profile's `region_allow`
+resolves to a mask the same way, so the PRD 8.1 hard filter is a single AND
+and can be pushed into SQL (see sql_filter).
+
+A mask of 0 means "no region recognized": such postings are never excluded,
+and neither is anything for a profile that allows 전국 or no region at all.
+
+Korean aliases match anywhere (there are no spaces in "서울특별시강남구").
+Latin agency hints only match as whole tokens, never inside a word or a URL.
+A 시/군 sharing its name with a 시/도 (경기 광주시 vs 광주광역시) counts
+for its 도 when the 도 is named right before it. On its own, it still
+means the 시/도.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from .models import ProgramLike
+
+# (name, aliases), in bit order. Stored in programs.region_mask: append only.
+REGIONS = (
+    ("서울", ("서울", "서울특별시", "서울시")),
+    ("부산", ("부산", "부산광역시")),
+    ("대구", ("대구", "대구광역시")),
+    ("인천", ("인천", "인천광역시")),
+    ("광주", ("광주", "광주광역시")),
+    ("대전", ("대전", "대전광역시")),
+    ("울산", ("울산", "울산광역시")),
+    ("세종", ("세종", "세종특별자치시")),
+    ("경기", ("경기", "경기도")),
+    ("강원", ("강원", "강원도", "강원특별자치도")),
+    ("충북", ("충북", "충청북도")),
+    ("충남", ("충남", "충청남도")),
+    ("전북", ("전북", "전라북도", "전북특별자치도")),
+    ("전남", ("전남", "전라남도")),
+    ("경북", ("경북", "경상북도")),
+    ("경남", ("경남", "경상남도")),
+    ("제주", ("제주", "제주특별자치도")),
+)
+NATIONWIDE = 1 << len(REGIONS)
+_NATIONWIDE_ALIASES = ("전국",)
+
+# Agencies whose (usual) names don't contain their region
+AGENCY_HINTS = {
+    "sba": "서울",       # 서울경제진흥원
+    "gbsa": "경기",      # 경기도경제과학진흥원
+}
+
+# 시/군 named like a 시/도, and the 도 they belong to
+SAME_NAME_CITIES = {
+    "광주": "경기",      # 경기도 광주시
+}
+
+# Columns the mask is resolved from (re-resolve when one changes)
+SOURCE_COLUMNS = ("title", "region_raw", "agency")
+
+_BITS = {alias: 1 << i for i, (_, aliases) in enumerate(REGIONS) for alias in aliases}
+_BITS.update({alias: NATIONWIDE for alias in _NATIONWIDE_ALIASES})
+_BITS.update({hint: _BITS[name] for hint, name in AGENCY_HINTS.items()})
+_ALIASES_OF = {name: aliases for name, aliases in REGIONS}
+# "경기도 광주시", "경기 광주": the 도 and its 시/군 as one match
+_SAME_NAME_PATTERNS = [
+    rf"(?:{'|'.join(sorted(_ALIASES_OF[province], key=len, reverse=True))})\s*{city}(?!광역)(?:시|군)?"
+    for city, province in SAME_NAME_CITIES.items()
+]
+# A Latin hint must not touch another letter/digit or URL punctuation ("usba", "www.sba.kr")
+_LATIN_PATTERNS = [rf"(?<![a-z0-9./@_-]){re.escape(hint)}(?![a-z0-9./@_-])" for hint in AGENCY_HINTS]
+# Longest alias first so "서울특별시" isn't read as "서울" + leftovers
+_ALIAS_RE = re.compile("|".join(
+    [f"({pattern})" for pattern in _SAME_NAME_PATTERNS] + _LATIN_PATTERNS
+    + sorted((re.escape(alias) for alias in _BITS if alias not in AGENCY_HINTS), key=len, reverse=True)))
+# Group i of _ALIAS_RE is the i-th same-name pattern
+_SAME_NAME_BITS = [_BITS[province] for province in SAME_NAME_CITIES.values()]
+_TITLE_TAG_RE = re.compile(r"^\s*\[([^\]]+)\]")
+
+
+def resolve(text: Optional[str]) -> int:
+    """Bits of every region named in `text` (0 if none)."""
+    mask = 0
+    for match in _ALIAS_RE.finditer((text or "").lower()):
+        group = match.lastindex
+        mask |= _SAME_NAME_BITS[group - 1] if group else _BITS[match.group()]
+    return mask
+
+
+def program_mask(program: ProgramLike) -> int:
+    tag = _TITLE_TAG_RE.match(program.get('title') or '')
+    return ((resolve(tag.group(1)) if tag else 0)
+            or resolve(program.get('region_raw'))
+            or resolve(program.get('agency')))
+
+
+@lru_cache(maxsize=64)
+def allow_mask(region_allow: Optional[str]) -> int:
+    """Mask of a profile's region_allow JSON; 0 means no restriction."""
+    try:
+        allows = json.loads(region_allow or '[]')
+    except json.JSONDecodeError:
+        return 0
+    mask = 0
+    for region in allows if isinstance(allows, list) else []:
+        mask |= resolve(str(region))
+    return 0 if mask & NATIONWIDE else mask
+
+
+def is_excluded(mask: Optional[int], allowed: int) -> bool:
+    """Region hard filter: the posting names regions, none of them allowed."""
+    return bool(allowed and mask and not mask & (allowed | NATIONWIDE))
+
+
+def names(mask: int) -> List[str]:
+    return [name for i, (name, _) in enumerate(REGIONS) if mask & (1 << i)]
+
+
+def sql_filter(allowed: int, column: str = "region_mask") -> Tuple[str, tuple]:
+    """WHERE fragment keeping rows that is_excluded would keep."""
+    if not allowed:
+        return "1", ()
+    return f"({column} IS NULL OR {column} = 0 OR {column} & ? != 0)", (allowed | NATIONWIDE,)
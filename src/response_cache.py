@@ -0,0 +1,104 @@
+"""
+Rendered-response cache for the list commands (/digest, /support, /events, /due...).
+
+Entries are keyed by (command, args, profile version, data version, KST date):
+- profile version: fingerprint of the profile row, so any /set_profile or
+  /mute change misses exactly;
+- data version: the active set version (hot_set), bumped on every ingestion
+  commit, save/dismiss and day-boundary expiry.
+Stale entries are never served, they just age out of the LRU.
+
+render_once() also coalesces: while a key is being rendered, identical
+requests (e.g. a second /digest from the same chat) await that render
+instead of starting their own.
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from . import hot_set
+from .db import profile_fingerprint
+
+MAX_ENTRIES = 256
+MAX_CHARS = 2_000_000
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_chars: int = MAX_CHARS):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def get(self, key: Hashable) -> Optional[str]:
+        text = self._entries.get(key)
+        if text is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return text
+
+    def put(self, key: Hashable, text: str):
+        if len(text) > self.max_chars:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._chars -= len(old)
+        self._entries[key] = text
+        self._chars += len(text)
+        while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+            _, evicted = self._entries.popitem(last=False)
+            self._chars -= len(evicted)
+            self.evictions += 1
+
+    async def render_once(self, key: Hashable, render: Callable[[], Awaitable[str]]) -> str:
+        """Render and cache a missed `key`; callers asking for it meanwhile share the render."""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            text = await render()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: no "never retrieved" warning when nobody waited
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(text)
+        self.put(key, text)
+        return text
+
+    def clear(self):
+        self._entries.clear()
+        self._chars = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "chars": self._chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+        }
+
+
+cache = ResponseCache()
+
+
+def make_key(command: str, args: Tuple, profile: dict) -> Tuple:
+    snapshot = hot_set.get()
+    # D-day reasons are computed against the snapshot's KST date
+    return (command, tuple(args), profile_fingerprint(profile), snapshot.version, snapshot.kst_date)
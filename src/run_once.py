@@ -2,168 +2,289 @@ import asyncio
 import os
 import logging
 import json
-from datetime import datetime, timedelta
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 
 # Load env if present (local dev)
 load_dotenv()
 
-from src.db import init_db, upsert_program, get_profile, log_ingestion_run
-from src.bizinfo_client import BizinfoClient
+from src.db import (
+    init_db, upsert_program, get_profile, update_profile, env_profile_overrides,
+    get_dismissed_keys, record_user_action, get_feed_state, save_feed_state, get_poll_rates,
+    get_notified, record_notifications, prune_notifications, get_programs,
+    log_ingestion_run, get_recent_runs, get_fetch_latencies, prune_ingestion_runs
+)
+from src import fetch_policy, hot_set, telemetry, tracing
+from src.fetch_policy import FetchError
 from src.normalizer import normalize_support, normalize_event
-from src.filters import is_recommended
-from telegram import Bot
+from src.filters import is_recommended, get_days_left
+from src.models import Program, Recommendation, content_hash, notify_hash
+from src.actions import parse_action_command
+from src.adaptive_poll import KST, next_interval, record_and_plan
+from src.digest import DUE_CHANNEL, compute_due_reminders
+from src.dedup import collapse
+from src import preferences
+from src.state_snapshot import (
+    PROGRAM_RETENTION, RUN_HISTORY, PUSH_CHANNEL, load_snapshot, save_snapshot, dump_tables, restore_tables
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Save/dismiss actions kept for learning until their posting shows up
+MAX_PENDING_LEARNING = 200
+# Telegram allows 4096 characters per message
+MAX_MESSAGE_CHARS = 4000
+
+def _feed_due(kind: str, now: datetime) -> bool:
+    # The workflow runs hourly; each feed is only polled when its adaptive plan says so.
+    if os.getenv("RUN_ONCE_FORCE", "").lower() == "true":
+        return True
+    last = get_feed_state(kind).get("last_polled_at")
+    if not last:
+        return True
+    last_dt = datetime.fromisoformat(last)
+    return now >= last_dt + next_interval(get_poll_rates(kind), last_dt)
+
+def chunk_blocks(blocks: List[Tuple[str, Optional[str], Optional[Program]]],
+                 limit: int = MAX_MESSAGE_CHARS) -> List[Tuple[str, List[Tuple[str, Program]]]]:
+    """
+    Pack (text, ledger channel, program) blocks into messages of at most
+    `limit` characters, never splitting a block: (text, [(channel, program)]).
+    """
+    chunks = []
+    for text, channel, program in blocks:
+        text = text[:limit]
+        if not chunks or len(chunks[-1][0]) + len(text) > limit:
+            chunks.append(("", []))
+        chunks[-1] = (chunks[-1][0] + text, chunks[-1][1])
+        if channel:
+            chunks[-1][1].append((channel, program))
+    return chunks
+
+async def apply_pending_actions(bot, chat_id: str, offset: Optional[int]) -> Tuple[Optional[int], List[list]]:
+    """
+    Records /save and /dismiss commands sent to the bot since the last run
+    (nothing is polling Telegram in between). Returns the next update offset
+    and the [program_key, action] pairs recorded.
+    """
+    actions = []
+    try:
+        updates = await bot.get_updates(offset=offset, timeout=0, allowed_updates=["message"])
+    except Exception as e:
+        logger.error(f"Could not fetch pending Telegram updates: {e}")
+        return offset, actions
+    for update in updates:
+        offset = update.update_id + 1
+        message = update.message
+        if not message or str(message.chat_id) != chat_id:
+            continue
+        parsed = parse_action_command(message.text)
+        if parsed:
+            action, key = parsed
+            record_user_action(key, action)
+            actions.append([key, action])
+            logger.info(f"Applied pending action {action}: {key}")
+    return offset, actions
+
+def bot_options() -> dict:
+    # TELEGRAM_API_BASE_URL: local Bot API server or benchmarks/fake_telegram.py
+    base_url = os.getenv("TELEGRAM_API_BASE_URL", "").strip()
+    return {"base_url": base_url} if base_url else {}
+
+def learn_pending(pending: List[list]) -> List[list]:
+    """
+    Feed actions into the preference model. The runner's DB only holds what
+    this run fetched (plus saved postings from the snapshot), so actions on
+    postings not in it wait for a later run.
+    """
+    waiting = []
+    for key, action in pending:
+        if preferences.learn(key, action) is None and get_programs([key]) == []:
+            waiting.append([key, action])
+    return waiting[-MAX_PENDING_LEARNING:]
+
 async def run_once():
-    # 1. Initialize DB (In-memory or fresh file in GitHub Runner)
+    # One trace per run; the runner's DB is thrown away, so set TRACE_FILE to keep it
+    with tracing.trace("run_once"):
+        await _run_once()
+    tracing.flush()
+
+async def _run_once():
+    # 1. Initialize DB (fresh file in GitHub Runner) and restore the state of the last run
     init_db()
-    
-    # 2. Fetch Data
+    snapshot = load_snapshot()
+    restore_tables(snapshot)
+    overrides = env_profile_overrides()
+    if overrides:
+        update_profile(overrides) # Secrets win over the snapshot's copy
+
+    token = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
+    chat_id = os.getenv("TELEGRAM_ALLOWED_CHAT_ID", "").strip()
+
+    # 2. Save/dismiss commands sent since the last run
+    pending = snapshot.get("pending_learning", [])
+    if token and chat_id:
+        from telegram import Bot  # only runs with a token need python-telegram-bot
+        async with Bot(token=token, **bot_options()) as bot:
+            snapshot["telegram_offset"], actions = await apply_pending_actions(bot, chat_id, snapshot.get("telegram_offset"))
+        pending += actions
+
+    # 3. Fetch Data; everything goes into the DB (clustering, term stats and
+    # learning need the corpus), only new or changed postings go further
+    from src.bizinfo_client import BizinfoClient, SUPPORT_API_URL, EVENT_API_URL  # requests
     client = BizinfoClient()
-    
-    # Support
-    logger.info("Fetching support...")
-    supports = client.fetch_support_programs()
-    new_items = []
-    
-    # DEBUG: Log first item to check keys
-    if supports:
-        logger.info(f"DEBUG: First Support Item Keys: {supports[0].keys()}")
-        logger.info(f"DEBUG: First Support Item Raw: {json.dumps(supports[0], ensure_ascii=False)[:500]}...")
-
-    for item in supports:
-        try:
-            norm = normalize_support(item)
-            upsert_program(norm)
-            new_items.append(norm)
-        except Exception as e:
-            logger.error(f"Error processing support item: {e}")
-            
-    # Events
-    logger.info("Fetching events...")
-    events = client.fetch_events()
-    
-    if events:
-        logger.info(f"DEBUG: First Event Item Keys: {events[0].keys()}")
-        logger.info(f"DEBUG: First Event Item Raw: {json.dumps(events[0], ensure_ascii=False)[:500]}...")
-
-    for item in events:
+    now = datetime.now(KST)
+    today = now.date()  # KST, like the active set's day boundary
+    changed_keys = []
+    run_logs = {}  # kind -> ingestion_runs row, logged once scoring is timed
+
+    feeds = (
+        ("support", SUPPORT_API_URL, client.fetch_support_programs, normalize_support),
+        ("event", EVENT_API_URL, client.fetch_events, normalize_event),
+    )
+    for kind, url, fetch, normalize in feeds:
+        if not _feed_due(kind, now):
+            logger.info(f"Skipping {kind}: not due yet")
+            continue
+
+        # Circuit breaker state comes from the snapshot's ingestion_runs
+        recent = get_recent_runs(kind)
+        circuit = fetch_policy.circuit_state(recent, datetime.now())
+        run_log = telemetry.new_run(kind, circuit)
+        if circuit == fetch_policy.OPEN:
+            logger.warning(f"Skipping {kind}: circuit open")
+            run_log["error"] = "circuit open"
+            log_ingestion_run(run_log)
+            continue
+
+        state = get_feed_state(kind)
+        if state.get("body_hash"):
+            client.validators[url] = {k: state.get(k) for k in ("etag", "last_modified", "body_hash")}
+        client.latencies[url] = deque(get_fetch_latencies(kind), maxlen=fetch_policy.LATENCY_WINDOW)
+
+        logger.info(f"Fetching {kind}...")
+        started = time.monotonic()
         try:
-            norm = normalize_event(item)
-            upsert_program(norm)
-            new_items.append(norm)
-        except Exception as e:
-            logger.error(f"Error processing event item: {e}")
-
-    # 3. Filter for Notification
-    # in stateless run, "new" is everything we just fetched?
-    # Or just items created/updated recently?
-    # Bizinfo API returns recent items.
-    # To avoid duplicate alerts every 6 hours, we should check `ingested_at`?
-    # PROBLEM: In stateless, DB is empty every time. So ALL items are "newly ingested".
-    # SOLUTION: We must filter by `created_at_source` or strict time window if available.
-    # BUT Bizinfo `created_at` format varies.
-    # Alternative: The user accepts some repetition? Or we filter by "today"?
-    # User said: "Digest style".
-    # Let's filter items that are "created" or "posted" within last 7 hours?
-    # Bizinfo `creatPnttm` (created_at_source) is usually available.
-    # If not available, we might fallback to just showing all recommended (Digest mode).
-    # "Digest" usually implies "Here is what is active/new".
-    # If we run every 6 hours, we can show items from last ~7 hours?
-    # Let's try to parse `created_at_source`.
-    
+            items = fetch(probe=circuit == fetch_policy.HALF_OPEN)
+        except FetchError as e:
+            # Not polled: feed_state stays as is, so the next run tries again
+            logger.error(f"{kind} fetch failed: {e}")
+            run_log["error"] = str(e)
+            telemetry.record_fetch(run_log, client.stats[url], round((time.monotonic() - started) * 1000))
+            log_ingestion_run(run_log)
+            continue
+        telemetry.record_fetch(run_log, client.stats[url], round((time.monotonic() - started) * 1000))
+        run_log["fetched_count"] = len(items)
+        if items:
+            logger.info(f"DEBUG: First {kind} Item Raw: {json.dumps(items[0], ensure_ascii=False)[:500]}...")
+
+        programs = []
+        with telemetry.stage(run_log, "normalize"):
+            for item in items:
+                try:
+                    programs.append(normalize(item))
+                except Exception as e:
+                    logger.error(f"Error normalizing {kind} item: {e}")
+
+        # New/updated/unchanged are relative to the snapshot (the DB is fresh every run)
+        failed = 0
+        with telemetry.stage(run_log, "upsert"):
+            for norm in programs:
+                try:
+                    upsert_program(norm)
+                    digest = content_hash(norm)
+                    known = snapshot["programs"].get(norm.program_key)
+                    snapshot["programs"][norm.program_key] = [digest, today.isoformat()]
+                    if known and known[0] == digest:
+                        run_log["unchanged_count"] += 1
+                        continue
+                    changed_keys.append(norm.program_key)
+                    run_log["updated_count" if known else "new_count"] += 1
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Error processing {kind} item: {e}")
+
+        changes = run_log["new_count"] + run_log["updated_count"]
+        run_logs[kind] = run_log
+        record_and_plan(kind, changes, now)
+        # The body counts as seen only once all of it is stored
+        validators = client.validators.get(url, {}) if failed else client.commit_validators(url)
+        save_feed_state(kind, validators.get("etag"), validators.get("last_modified"),
+                        validators.get("body_hash"), now.isoformat())
+        logger.info(f"{kind}: {len(items)} fetched, {changes} new or changed")
+
+    snapshot["pending_learning"] = learn_pending(pending)
+
+    # 4. Score only what is new/changed and whose title/deadline wasn't sent already
+    # (read back from the DB for the cluster ids assigned at upsert)
+    changed_items = get_programs(changed_keys)
     profile = get_profile()
+    dismissed = get_dismissed_keys()
+    notified = get_notified(PUSH_CHANNEL)
+    relevance = hot_set.get_relevance_stats(profile)
+    weights = hot_set.preference_weights()
     recommendations = []
-    
-    # Time window: 7 hours ago (to cover 6h gap + buffer)
-    # If created_at_source is missing, we might show it if it *looks* new?
-    # Or just show top recommended?
-    # Let's show all recommended items that are NOT closed.
-    # Users can /dismiss (but dismissal won't persist in stateless!).
-    # Stateless limitation: Dismissal doesn't work across runs.
-    # We should mention this to user? User asked for 24h server or GitHub Actions.
-    # Action -> Stateless.
-    # We will try to prioritize "Truly New" if possible, but fallback to "Valid & Recommended".
-    
-    # Optimization: Filter by `created_at_source` if possible.
-    cutoff = datetime.now() - timedelta(hours=24) # Show last 24h items to be safe? Or 7h?
-    # If we run 4 times a day, 24h list will repeat items.
-    # Let's try 12h or 8h.
-    # Let's stick to valid items that match profile.
-    
-    for item in new_items:
-        # Check date if available
-        created_str = item.get('created_at_source')
-        if created_str:
-            try:
-                # Format: YYYY-MM-DD HH:MM:SS or YYYY-MM-DD
-                # If len is 10, add time.
-                if len(created_str) == 10:
-                    created_dt = datetime.strptime(created_str, "%Y-01-01") # Wait, format? usually YYYY-MM-DD
-                    created_dt = datetime.strptime(created_str, "%Y-%m-%d")
-                else:
-                    created_dt = datetime.strptime(created_str, "%Y-%m-%d %H:%M:%S")
-                
-                # If older than 7 days, skip? (Bizinfo sometimes gives old items in RSS?)
-                # API usually gives recent 100.
-                pass
-            except:
-                pass
-
-        rec, score, reasons = is_recommended(item, profile)
+    for item in changed_items:
+        if item.program_key in dismissed:
+            continue
+        if notified.get(item.program_key) == notify_hash(item):
+            continue
+        with telemetry.stage(run_logs[item.kind], "score"):
+            rec, score, reasons = is_recommended(item, profile, relevance=relevance, preferences=weights,
+                                                 today=today)
         if rec:
-            recommendations.append({
-                "item": item,
-                "score": score,
-                "reasons": reasons
-            })
-    
+            recommendations.append(Recommendation(item, score, reasons))
+    for run_log in run_logs.values():
+        log_ingestion_run(run_log)
+
     # Sort
-    recommendations.sort(key=lambda x: x["score"], reverse=True)
-    top_items = recommendations[:15] # Limit total
-    
-    today_date = datetime.now().strftime('%Y-%m-%d %H:%M')
-    
-    if not top_items:
-        logger.info("No recommendations found.")
-        # Send a "No items" message so user knows bot ran.
-        if token and chat_id:
-            bot = Bot(token=token)
-            msg = f"📉 **[{today_date}] 업데이트 없음**\n\n조건에 맞는 새로운 지원사업/행사가 없습니다.\n(수집: 지원 {len(supports)}건, 행사 {len(events)}건)"
-            await bot.send_message(chat_id=chat_id, text=msg)
-        return
-
-    # 4. Send Telegram
-    token = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
-    chat_id = os.getenv("TELEGRAM_ALLOWED_CHAT_ID", "").strip()
-    
-    if token and chat_id:
-        bot = Bot(token=token)
-        
-        # Format message
-        msg = f"📢 **[{today_date}] 업데이트 ({len(top_items)}건)**\n\n"
-        for r in top_items:
-            item = r['item']
-            title = item.get('title', '제목 없음').strip()
+    recommendations.sort(key=lambda r: r.score, reverse=True)
+    top_items = collapse(recommendations, 15) # Limit total, one per near-duplicate cluster
+    due_items = compute_due_reminders(profile, today)
+
+    # 5. Send Telegram
+    if not top_items and not due_items:
+        logger.info("No new recommendations.")
+    elif token and chat_id:
+        today_date = datetime.now(KST).strftime('%Y-%m-%d %H:%M')
+
+        # Format message, one block per item
+        blocks = [(f"📢 **[{today_date}] 업데이트 ({len(top_items)}건)**\n\n", None, None)] if top_items else []
+        for item, score, item_reasons in top_items:
+            title = (item.title or '').strip()
             if not title: title = "제목 없음"
-            
-            reasons = ", ".join(r['reasons'])
-            url = item.get('url', '#')
-            
-            msg += f"[{r['score']}] {title}\n"
-            msg += f"💡 {reasons}\n"
-            msg += f"🔗 {url}\n\n"
-            
-        # Chunking if needed
-        if len(msg) > 4000:
-             msg = msg[:4000] + "\n...(생략)..."
-             
-        await bot.send_message(chat_id=chat_id, text=msg)
+
+            reasons = ", ".join(item_reasons)
+            url = item.url or '#'
+
+            blocks.append((f"[{score}] {title}\n💡 {reasons}\n🔗 {url}\n\n", PUSH_CHANNEL, item))
+
+        if due_items:
+            blocks.append((f"⏰ **저장한 공고 마감 임박 ({len(due_items)}건)**\n\n", None, None))
+        for item in due_items:
+            blocks.append((f"[D-{get_days_left(item, today=today)}] {item.title}\n🔗 {item.url or '#'}\n\n", DUE_CHANNEL, item))
+
+        # Sent in chunks; each chunk's items are recorded once it went out,
+        # so a failed send leaves the rest for the next run
+        from telegram import Bot
+        async with Bot(token=token, **bot_options()) as bot:
+            for msg, sent in chunk_blocks(blocks):
+                with tracing.span("telegram.send", bytes=len(msg.encode("utf-8"))):
+                    await bot.send_message(chat_id=chat_id, text=msg)
+                for channel in (PUSH_CHANNEL, DUE_CHANNEL):
+                    record_notifications(channel, [(p.program_key, notify_hash(p)) for c, p in sent if c == channel])
     else:
         logger.warning("Token or Chat ID missing.")
 
+    # 6. Persist state for the next run
+    prune_notifications((datetime.now() - PROGRAM_RETENTION).isoformat())
+    prune_ingestion_runs((datetime.now() - RUN_HISTORY).isoformat())
+    dump_tables(snapshot)
+    save_snapshot(snapshot)
+
 if __name__ == "__main__":
     asyncio.run(run_once())
@@ -1,197 +1,291 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from pytz import timezone
 import logging
-from .bizinfo_client import BizinfoClient
+import os
+from .bizinfo_client import BizinfoClient, SUPPORT_API_URL, EVENT_API_URL, empty_stats
 from .normalizer import normalize_support, normalize_event
-from .db import upsert_program, log_ingestion_run, get_profile
+from .db import (
+    upsert_program, log_ingestion_run, get_profile, list_profiles,
+    get_feed_state, save_feed_state, get_poll_rates, mark_job_run, get_job_run,
+    get_recent_runs, get_fetch_latencies
+)
+from . import fetch_policy, metrics, telemetry, tracing
+from .adaptive_poll import record_and_plan, next_interval, MIN_INTERVAL
+from .digest import materialize_digests, get_digest_text, mark_digest_sent
+from . import hot_set
+from collections import deque
 from datetime import datetime, timedelta
 import asyncio
+import time
 
 logger = logging.getLogger(__name__)
 kst = timezone('Asia/Seoul')
 
-scheduler = AsyncIOScheduler(timezone=kst)
+# A job that was due while the loop was busy runs late (within the grace time)
+# instead of being dropped, and piled-up fire times collapse into one run.
+MISFIRE_GRACE_SECONDS = 3600
+# Catch-up digest after a restart waits a little so the catch-up ingestion can land first
+CATCH_UP_DELAY = timedelta(minutes=2)
+DIGEST_JOB_ID = "digest"
+
+def digest_job_id(profile_id: int = 1) -> str:
+    """One digest job per profile; the owner's (id 1) keeps the original id."""
+    return DIGEST_JOB_ID if profile_id == 1 else f"{DIGEST_JOB_ID}:{profile_id}"
+
+scheduler = AsyncIOScheduler(
+    timezone=kst,
+    job_defaults={"coalesce": True, "misfire_grace_time": MISFIRE_GRACE_SECONDS, "max_instances": 1},
+)
 client = BizinfoClient()
+_bot_app = None
+
+# Per feed: API URL (conditional-fetch state key), fetcher and normalizer
+FEEDS = {
+    "support": (SUPPORT_API_URL, lambda probe: client.fetch_support_programs(probe=probe), normalize_support),
+    "event": (EVENT_API_URL, lambda probe: client.fetch_events(probe=probe), normalize_event),
+}
 
-async def ingest_support():
-    logger.info("Starting Support Ingestion")
-    items = []
-    run_log = {
-        "run_at": datetime.now().isoformat(),
-        "kind": "support",
-        "fetched_count": 0,
-        "new_count": 0,
-        "updated_count": 0,
-        "error": None
-    }
+def _ingest(kind: str) -> timedelta:
+    """
+    One poll of a feed. Returns the delay until the next poll, planned from
+    the change rate observed for this feed (see adaptive_poll.py); failed
+    fetches retry after MIN_INTERVAL, an open circuit after its cooldown.
+    """
+    with tracing.trace(f"ingest:{kind}") as root:
+        logger.info(f"Starting {kind} ingestion")
+        url, fetch, normalize = FEEDS[kind]
+        now = datetime.now(kst)
+        recent = get_recent_runs(kind)
+        circuit = fetch_policy.circuit_state(recent, datetime.now())
+        run_log = telemetry.new_run(kind, circuit)
+        root.set(circuit=circuit)
+        if circuit == fetch_policy.OPEN:
+            # Feed is failing: don't hammer it, try one probe after the cooldown
+            run_log["error"] = "circuit open"
+            log_ingestion_run(run_log)
+            delay = max(MIN_INTERVAL, fetch_policy.cooldown_left(recent, datetime.now()))
+            logger.warning(f"Skipping {kind} ingestion: circuit open, next try in {delay}")
+            return delay
     
-    try:
-        # Retry logic handled in client? No, client just returns list or empty.
-        # But we want robust retry if network fails *inside* client.
-        # Client handles basic errors. Let's trust client or wrap here.
-        # For MVP, assume client does its best.
-        
-        items = client.fetch_support_programs()
+        # Conditional-fetch validators and fetch latencies survive restarts via
+        # feed_state / ingestion_runs
+        state = get_feed_state(kind)
+        if url not in client.validators and state.get("body_hash"):
+            client.validators[url] = {k: state.get(k) for k in ("etag", "last_modified", "body_hash")}
+        if url not in client.latencies:
+            client.latencies[url] = deque(get_fetch_latencies(kind), maxlen=fetch_policy.LATENCY_WINDOW)
+    
+        started = time.monotonic()
+        try:
+            items = fetch(circuit == fetch_policy.HALF_OPEN)
+        except Exception as e:
+            # An outage is an error, not "no new items": no poll stats, no
+            # feed_state update, retry at the shortest interval
+            run_log["error"] = str(e)
+            root.set(error=str(e))
+            telemetry.record_fetch(run_log, client.stats.get(url, empty_stats()), round((time.monotonic() - started) * 1000))
+            log_ingestion_run(run_log)
+            logger.error(f"{kind} ingestion failed: {e}")
+            return MIN_INTERVAL
+        telemetry.record_fetch(run_log, client.stats.get(url, empty_stats()), round((time.monotonic() - started) * 1000))
         run_log["fetched_count"] = len(items)
-        
-        for item in items:
-            try:
-                normalized = normalize_support(item)
-                upsert_program(normalized)
-                # We don't track new/updated count precisely in upsert (SQLite UPSERT doesn't return status easily),
-                # but we could check distinct. For MVP, just log total fetched.
-                run_log["new_count"] += 1 # Rough estimate or just set to same as fetched
-            except Exception as e:
-                logger.error(f"Error normalizing/upserting item: {e}")
-                
-    except Exception as e:
-        run_log["error"] = str(e)
-        logger.error(f"Support ingestion failed: {e}")
-        
-    log_ingestion_run(run_log)
-    logger.info("Finished Support Ingestion")
-
-async def ingest_event():
-    logger.info("Starting Event Ingestion")
-    items = []
-    run_log = {
-        "run_at": datetime.now().isoformat(),
-        "kind": "event",
-        "fetched_count": 0,
-        "new_count": 0,
-        "updated_count": 0,
-        "error": None
-    }
     
+        programs = []
+        with telemetry.stage(run_log, "normalize") as span:
+            for item in items:
+                try:
+                    programs.append(normalize(item))
+                except Exception as e:
+                    logger.error(f"Error normalizing item: {e}")
+            span.set(items=len(items), normalized=len(programs))
+        failed = 0
+        with telemetry.stage(run_log, "upsert") as span:
+            for program in programs:
+                try:
+                    telemetry.count_upsert(run_log, upsert_program(program))
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Error upserting {program.program_key}: {e}")
+            span.set(inserted=run_log["new_count"], updated=run_log["updated_count"],
+                     unchanged=run_log["unchanged_count"])
+    
+        changes = run_log["new_count"] + run_log["updated_count"]
+        if changes:
+            # Scoring happens here: active set features and every profile's digest
+            with telemetry.stage(run_log, "score"):
+                with tracing.span("hot_set.load") as span:
+                    span.set(active=len(hot_set.load().programs))
+                materialize_digests()
+        log_ingestion_run(run_log)
+    
+        delay = record_and_plan(kind, changes, now)
+        # The body counts as seen only once all of it is stored
+        validators = client.validators.get(url, {}) if failed else client.commit_validators(url)
+        save_feed_state(kind, validators.get("etag"), validators.get("last_modified"),
+                        validators.get("body_hash"), now.isoformat())
+        logger.info(f"Finished {kind} ingestion: {changes} changes, next poll in {delay}")
+        return delay
+
+@metrics.instrument()
+async def ingest_feed(kind: str):
+    # Ingestion does blocking HTTP + SQLite work; run it off the event loop so a
+    # slow Bizinfo response never holds up bot commands or the digest send.
     try:
-        items = client.fetch_events()
-        run_log["fetched_count"] = len(items)
-        
-        for item in items:
-            try:
-                normalized = normalize_event(item)
-                upsert_program(normalized)
-                run_log["new_count"] += 1
-            except Exception as e:
-                logger.error(f"Error normalizing/upserting item: {e}")
-                
+        delay = await asyncio.to_thread(_ingest, kind)
     except Exception as e:
-        run_log["error"] = str(e)
-        logger.error(f"Event ingestion failed: {e}")
-        
-    log_ingestion_run(run_log)
-    logger.info("Finished Event Ingestion")
+        logger.error(f"{kind} ingestion crashed: {e}")
+        delay = MIN_INTERVAL
+    _schedule_ingest(kind, datetime.now(kst) + delay)
+
+def _schedule_ingest(kind: str, run_at: datetime):
+    scheduler.add_job(ingest_feed, DateTrigger(run_date=run_at, timezone=kst), args=[kind],
+                      id=f"ingest_{kind}", replace_existing=True)
 
-async def run_digest_job(bot_app):
+def _first_ingest_at(kind: str, now: datetime) -> datetime:
+    # Resume the adaptive plan across restarts; poll right away if overdue.
+    last = get_feed_state(kind).get("last_polled_at")
+    if not last:
+        return now
+    last_dt = datetime.fromisoformat(last)
+    return max(now, last_dt + next_interval(get_poll_rates(kind), last_dt))
+
+@metrics.instrument()
+async def run_digest_job(bot_app, profile_id: int = 1):
     """
-    Sends digest to the allowed chat ID.
-    logic: fetch top N items from last 24h that match profile.
+    Sends the profile's digest to its chat.
+    Normally just sends the artifact materialized by the last ingestion;
+    computes it live (top N unsent items from last 24h) only if that is stale.
     """
-    profile = get_profile()
+    # This fire time counts as handled (job_runs) only once the digest is out,
+    # or there is nothing to send; a failed or interrupted send is caught up
+    job_id, fired_at = digest_job_id(profile_id), datetime.now(kst).isoformat()
+    
+    profile = get_profile(profile_id)
     if not profile or not profile.get('notify_enabled', 1):
+        mark_job_run(job_id, fired_at)
         return
         
-    # Import here to avoid circular dependency if any (though bot imports scheduler usually)
-    # Actually we just use the bot_app passed in.
-    
-    # We need to query DB. `db.py` needs a query function.
-    # I'll implement a query helper in db or use raw sql here?
-    # Better to keep db logic in db.py.
-    # For now, I'll access DB directly via get_connection or add a helper in db.py.
-    # I'll add `get_recent_recommendations` to db.py later or just use connection here.
-    
-    # Wait, I should add the logic.
-    from .db import get_connection
-    conn = get_connection()
-    cursor = conn.cursor() # Need row factory if set in db.py
-    
-    # Get items ingested in last 24h
-    yesterday = (datetime.now() - timedelta(hours=24)).isoformat()
-    cursor.execute("SELECT * FROM programs WHERE ingested_at >= ?", (yesterday,))
-    items = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    
-    from .filters import is_recommended
-    
-    recommendations = []
-    for item in items:
-        # Check if already dismissed
-        # (Need another query or just check in memory if list small. Better query.)
-        # Optimization: Filter out dismissed in SQL?
-        # Let's do it in python for MVP.
-        recommended, score, reasons = is_recommended(item, profile)
-        if recommended:
-            recommendations.append({
-                "item": item,
-                "score": score,
-                "reasons": reasons
-            })
-            
-    # Sort by score desc
-    recommendations.sort(key=lambda x: x["score"], reverse=True)
-    
-    # Top 10
-    top_10 = recommendations[:10]
-    
-    if not top_10:
-        return # Nothing to send
-        
-    # Send via bot
-    # We need to construct the message.
-    # Re-use telegram_bot.format_message?
-    # I'll let telegram_bot handle formatting if possible, or do it here.
-    # Ideally `telegram_bot.py` has a `send_digest` function.
-    # But `bot_app` is generic.
-    # I'll assume `bot_app.bot.send_message`.
-    
-    chat_id = os.getenv("TELEGRAM_ALLOWED_CHAT_ID")
+    chat_id = profile.get('chat_id') or (os.getenv("TELEGRAM_ALLOWED_CHAT_ID") if profile_id == 1 else None)
     if not chat_id:
+        mark_job_run(job_id, fired_at)
         return
 
-    # Importing formatter from telegram_bot might cause circular import if telegram_bot imports scheduler.
-    # Creating a `utils.py` or `formatting.py` is better.
-    # For now, I'll inline a simple formatter or defer to a method on bot_app if I attach one.
-    
-    message = f"📢 **일일 추천 ({len(top_10)}건)**\n\n"
-    for r in top_10:
-        item = r['item']
-        reasons = ", ".join(r['reasons'])
-        message += f"[{r['score']}] [{item['kind']}] {item['title']}\n"
-        message += f"사유: {reasons}\n"
-        message += f"/open_{item['program_key'].replace(':','_')}\n\n" 
-        # Note: key has ':', telegram commands can't have ':'. Replace with '_' or use callback buttons.
-        # PRD says "/open <id>". 
-        # I'll match the PRD command format in the text, but for clickable links, maybe generic?
-        # "액션: /save ..."
+    with tracing.trace(f"digest:{profile_id}"):
+        with tracing.span("digest.text") as span:
+            message, from_artifact, sent = await asyncio.to_thread(get_digest_text, profile)
+            span.set(from_artifact=from_artifact, bytes=len(message.encode("utf-8")))
+        if not message:
+            await asyncio.to_thread(mark_job_run, job_id, fired_at)
+            return # Nothing to send
+        logger.info(f"Sending digest to profile {profile_id} ({'materialized' if from_artifact else 'live'})")
         
-    # Send
-    # Chunking...
+        metrics.add_message_bytes(message)
+        try:
+            with tracing.span("telegram.send"):
+                await bot_app.bot.send_message(chat_id=chat_id, text=message)
+        except Exception as e:
+            logger.error(f"Failed to send digest: {e}")
+            return
+        # Only the delta goes out next time
+        await asyncio.to_thread(mark_digest_sent, sent)
+        await asyncio.to_thread(mark_job_run, job_id, fired_at)
+
+async def flush_traces():
+    await asyncio.to_thread(tracing.flush)
+
+async def prune_traces():
+    await asyncio.to_thread(tracing.prune)
+
+def _digest_time(profile) -> tuple:
+    notify_time = (profile or {}).get('notify_time_kst') or "08:30"
+    h, m = map(int, notify_time.split(':'))
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise ValueError(f"invalid notify_time_kst: {notify_time}")
+    return h, m
+
+def reschedule_digest(profile, startup: bool = False):
+    """
+    Rebuild the digest job in place from the profile: cron at notify_time_kst,
+    or no job at all while muted. Called at startup and whenever the profile changes.
+
+    Fire times skipped while muted count as handled (job_runs), so neither
+    the unmute nor a later restart sends a catch-up digest for them.
+    """
+    if _bot_app is None or not profile:
+        return
+    profile_id = profile.get('id') or 1
+    job_id = digest_job_id(profile_id)
+    if not profile.get('notify_enabled', 1):
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
+        mark_job_run(job_id, datetime.now(kst).isoformat())
+        logger.info(f"Digest job {job_id} removed (notifications off)")
+        return
     try:
-        await bot_app.bot.send_message(chat_id=chat_id, text=message)
-    except Exception as e:
-        logger.error(f"Failed to send digest: {e}")
+        h, m = _digest_time(profile)
+    except ValueError as e:
+        logger.error(f"Keeping current digest schedule: {e}")
+        return
+    if not startup and scheduler.get_job(job_id) is None:
+        # Unmuted (or a new chat): nothing is owed up to now
+        mark_job_run(job_id, datetime.now(kst).isoformat())
+    scheduler.add_job(run_digest_job, CronTrigger(hour=h, minute=m, timezone=kst), args=[_bot_app, profile_id],
+                      id=job_id, replace_existing=True)
+    logger.info(f"Digest {job_id} scheduled at {h:02d}:{m:02d} KST")
+
+def _missed_digest(profile, now: datetime) -> bool:
+    """True if the latest scheduled digest time passed without a recorded run."""
+    if not profile:
+        return False
+    last_run = get_job_run(digest_job_id(profile.get('id') or 1))
+    if not last_run or not profile.get('notify_enabled', 1):
+        return False
+    try:
+        h, m = _digest_time(profile)
+    except ValueError:
+        return False
+    due = now.replace(hour=h, minute=m, second=0, microsecond=0)
+    if due > now:
+        due -= timedelta(days=1)
+    return datetime.fromisoformat(last_run) < due
+
+def digest_profiles() -> list:
+    """Profiles that get a digest: the owner's, and chats still in TELEGRAM_ALLOWED_CHAT_IDS."""
+    from .telegram_bot import ALLOWED_CHAT_IDS
+    return [p for p in list_profiles() if p["id"] == 1 or str(p.get("chat_id")) in ALLOWED_CHAT_IDS]
 
 def start_scheduler(bot_app):
-    # Ingest jobs
-    scheduler.add_job(ingest_support, CronTrigger(hour=8, minute=0, timezone=kst))
-    scheduler.add_job(ingest_support, CronTrigger(hour=18, minute=0, timezone=kst))
+    global _bot_app
+    _bot_app = bot_app
     
-    scheduler.add_job(ingest_event, CronTrigger(hour=8, minute=0, timezone=kst))
-    scheduler.add_job(ingest_event, CronTrigger(hour=18, minute=0, timezone=kst))
+    # Ingest jobs: one self-rescheduling job per feed, at an adaptive interval.
+    # Overdue feeds poll right away, which doubles as the restart catch-up.
+    now = datetime.now(kst)
+    for kind in FEEDS:
+        _schedule_ingest(kind, _first_ingest_at(kind, now))
     
-    # Digest job
-    # Fetch time from profile?
-    # PRD: "Daily digest... 08:30 KST (if notify_enabled=1)".
-    # Profile has `notify_time_kst`.
-    # We should dynamically set this?
-    # For MVP: Load from profile on startup. If profile changes, we might need to reschedule.
-    # MVP Simplicity: Just stick to 08:30 or read from profile once.
+    # Digest jobs (PRD: daily at notify_time_kst when notify_enabled), one per
+    # profile, kept in sync with the profile by reschedule_digest.
+    for profile in digest_profiles():
+        reschedule_digest(profile, startup=True)
+        job_id = digest_job_id(profile["id"])
     
-    profile = get_profile()
-    notify_time = profile.get('notify_time_kst', "08:30")
-    h, m = map(int, notify_time.split(':'))
+        # Exactly one catch-up digest if the last fire time was missed while down
+        if _missed_digest(profile, now):
+            logger.info(f"Missed {job_id} while down, scheduling one catch-up run")
+            scheduler.add_job(run_digest_job, DateTrigger(run_date=now + CATCH_UP_DELAY, timezone=kst),
+                              args=[bot_app, profile["id"]], id=f"{job_id}_catch_up", replace_existing=True)
+        elif not get_job_run(job_id):
+            # First start: nothing to catch up, but later restarts need a baseline
+            mark_job_run(job_id, now.isoformat())
     
-    scheduler.add_job(run_digest_job, CronTrigger(hour=h, minute=m, timezone=kst), args=[bot_app])
+    # Sampled traces are buffered in memory; write and prune them off the loop
+    scheduler.add_job(flush_traces, IntervalTrigger(seconds=tracing.FLUSH_INTERVAL.total_seconds(), timezone=kst),
+                      id="trace_flush", replace_existing=True)
+    scheduler.add_job(prune_traces, CronTrigger(hour=4, minute=0, timezone=kst), id="trace_prune",
+                      replace_existing=True)
     
     scheduler.start()
@@ -0,0 +1,125 @@
+"""
+Compact, compressed snapshot of the state run_once needs between CI runs.
+
+GitHub Actions starts every run from an empty DB, so run_once restores this
+snapshot first and saves it at the end (the workflow keeps the file in the
+Actions cache). It holds only what makes runs incremental:
+- programs: program_key -> [content_hash, last_seen date], to tell new or
+  changed postings from ones already handled;
+- the user_actions, company_profile, feed_state, poll_stats, notifications,
+  preference_model and (recent) ingestion_runs tables (BLOBs as
+  {"b64": ...}); the runs carry the fetch circuit breaker state;
+- the programs rows of saved postings still open (title, deadlines, url),
+  so due reminders don't depend on the feed being fetched this run;
+- the Telegram getUpdates offset for save/dismiss commands sent between runs,
+  and pending_learning: those actions not yet folded into the preference model.
+"""
+import base64
+import gzip
+import json
+import logging
+import os
+from datetime import date, timedelta
+from typing import Any, Dict
+
+from .db import get_connection
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("STATE_SNAPSHOT_PATH", "data/state.json.gz")
+SNAPSHOT_VERSION = 1
+# Postings not seen in the feed for this long are forgotten
+PROGRAM_RETENTION = timedelta(days=60)
+
+# Ingestion runs kept (circuit breaker, fetch latencies)
+RUN_HISTORY = timedelta(days=7)
+
+TABLES = ("user_actions", "company_profile", "feed_state", "poll_stats", "notifications", "preference_model",
+          "ingestion_runs")
+# programs columns kept for saved postings: enough for due reminders and their ledger hash
+SAVED_PROGRAM_COLUMNS = ("program_key", "kind", "source", "seq", "title", "apply_end_at", "event_end_at", "url")
+
+# Ledger channel of run_once pushes
+PUSH_CHANNEL = "push"
+
+
+def empty_snapshot() -> Dict[str, Any]:
+    return {"version": SNAPSHOT_VERSION, "programs": {}, "tables": {}, "telegram_offset": None}
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        logger.info("No state snapshot, starting fresh")
+        return empty_snapshot()
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Unreadable state snapshot {path}, starting fresh: {e}")
+        return empty_snapshot()
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        logger.warning("State snapshot version mismatch, starting fresh")
+        return empty_snapshot()
+    return snapshot
+
+
+def save_snapshot(snapshot: Dict[str, Any], path: str = SNAPSHOT_PATH):
+    cutoff = (date.today() - PROGRAM_RETENTION).isoformat()
+    snapshot["programs"] = {k: v for k, v in snapshot["programs"].items() if v[1] >= cutoff}
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=9) as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    logger.info(f"Saved state snapshot: {len(snapshot['programs'])} programs, {os.path.getsize(path)} bytes")
+
+
+def _encode(value):
+    return {"b64": base64.b64encode(value).decode("ascii")} if isinstance(value, bytes) else value
+
+
+def _decode(value):
+    return base64.b64decode(value["b64"]) if isinstance(value, dict) else value
+
+
+def dump_tables(snapshot: Dict[str, Any]):
+    """Copy the stateful tables from the DB into the snapshot."""
+    conn = get_connection()
+    tables = {}
+    for table in TABLES:
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        columns = [d[0] for d in cursor.description]
+        tables[table] = {"columns": columns, "rows": [[_encode(v) for v in r] for r in cursor.fetchall()]}
+    # A day of slack: deadlines are KST dates, the runner's clock is UTC
+    cutoff = (date.today() - timedelta(days=1)).isoformat()
+    cursor = conn.execute(f"""
+    SELECT {','.join(SAVED_PROGRAM_COLUMNS)} FROM programs
+    WHERE program_key IN (SELECT program_key FROM user_actions WHERE action='saved') AND apply_end_at >= ?
+    """, (cutoff,))
+    tables["programs"] = {"columns": list(SAVED_PROGRAM_COLUMNS), "rows": [list(r) for r in cursor.fetchall()]}
+    conn.close()
+    snapshot["tables"] = tables
+
+
+def restore_tables(snapshot: Dict[str, Any]):
+    """Load the snapshot's stateful tables into a freshly initialized DB."""
+    conn = get_connection()
+    existing = {}
+    for table in TABLES + ("programs",):
+        existing[table] = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    for table, data in snapshot.get("tables", {}).items():
+        if table not in existing:
+            continue
+        # Tolerate schema drift: only restore columns the current schema has
+        keep = [i for i, c in enumerate(data["columns"]) if c in existing[table]]
+        if not keep:
+            continue
+        columns = ",".join(data["columns"][i] for i in keep)
+        placeholders = ",".join("?" * len(keep))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})",
+            [[_decode(row[i]) for i in keep] for row in data["rows"]],
+        )
+    conn.commit()
+    conn.close()
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import logging
 import json
@@ -8,10 +9,13 @@ from telegram.ext import (
 )
 from datetime import datetime, timedelta
 from .db import (
-    get_connection, get_profile, update_profile, 
-    upsert_program # used for save/dismiss logic if we track distinct table
+    get_connection, get_profile, get_profile_for_chat, update_profile, record_user_action,
+    list_program_changes, get_stage_percentiles, get_last_trace, get_programs
 )
+from .actions import parse_action_command, parse_open_command
 from .filters import is_recommended, get_days_left
+from . import dedup, hot_set, metrics, preferences, profiling, response_cache, telemetry, tracing, update_processor
+from .models import Recommendation
 
 # Logger
 logger = logging.getLogger(__name__)
@@ -29,21 +33,44 @@ logger = logging.getLogger(__name__)
 ) = range(8)
 
 ALLOWED_CHAT_ID = os.getenv("TELEGRAM_ALLOWED_CHAT_ID")
+# Local Bot API server or the load-test fake (benchmarks/fake_telegram.py)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "").strip()
+# Further chats (comma-separated), each with its own profile, digest and actions
+ALLOWED_CHAT_IDS = {c.strip() for c in [ALLOWED_CHAT_ID or "", *os.getenv("TELEGRAM_ALLOWED_CHAT_IDS", "").split(",")]
+                    if c.strip()}
+
+async def chat_profile(update: Update):
+    """The chat's profile (created on first use), or None for chats that aren't allowed."""
+    chat_id = str(update.effective_chat.id)
+    if chat_id not in ALLOWED_CHAT_IDS:
+        return None
+    profile = get_profile_for_chat(chat_id, create=False)
+    if profile is None:
+        # First command from this chat: its own profile (matched against
+        # recent programs, off the loop), and a digest job for it
+        profile = await asyncio.to_thread(get_profile_for_chat, chat_id)
+        _reschedule_digest(profile['id'])
+    return profile
 
 def restricted(func):
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
         chat_id = update.effective_chat.id
         # Check against string or int
-        allowed = str(ALLOWED_CHAT_ID)
-        if str(chat_id) != allowed and str(user_id) != allowed:
+        if str(chat_id) not in ALLOWED_CHAT_IDS and str(user_id) not in ALLOWED_CHAT_IDS:
             await update.message.reply_text("⛔ 승인되지 않은 사용자입니다.")
             return
         return await func(update, context, *args, **kwargs)
     return wrapped
 
+def _reschedule_digest(profile_id: int):
+    # The scheduler (apscheduler, pytz, the Bizinfo client) is loaded by
+    # main's post_init, not when this module is imported
+    from .scheduler import reschedule_digest
+    reschedule_digest(get_profile(profile_id))
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if str(update.effective_chat.id) != str(ALLOWED_CHAT_ID):
+    if str(update.effective_chat.id) not in ALLOWED_CHAT_IDS:
         return
     await update.message.reply_text(
         "👋 기업마당 봇입니다.\n\n"
@@ -52,13 +79,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/support - 지원사업 추천\n"
         "/events - 행사 추천\n"
         "/due - 마감 임박\n"
+        "/changes [일수] - 최근 변경된 공고\n"
         "/profile - 프로필 조회\n"
         "/set_profile - 프로필 설정\n"
-        "/health - 상태 확인"
+        "/health - 상태 확인\n"
+        "/trace last - 최근 실행의 임계 경로"
     )
 
 async def health(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if str(update.effective_chat.id) != str(ALLOWED_CHAT_ID):
+    if str(update.effective_chat.id) not in ALLOWED_CHAT_IDS:
         return
         
     conn = get_connection()
@@ -67,137 +96,158 @@ async def health(update: Update, context: ContextTypes.DEFAULT_TYPE):
     rows = cursor.fetchall()
     conn.close()
     
-    msg = "🏥 **시스템 상태**\n\n"
+    msg = "🏥 시스템 상태\n\n"
     for r in rows:
         err = f"(Error: {r['error']})" if r['error'] else "✅"
-        msg += f"[{r['run_at'][:16]}] {r['kind']}: {r['fetched_count']} fetched, {r['new_count']} new {err}\n"
+        msg += (f"[{r['run_at'][:16]}] {r['kind']}: {r['fetched_count']} fetched, {r['new_count']} new, "
+                f"{r['updated_count'] or 0} upd, {r['unchanged_count'] or 0} same, "
+                f"HTTP {r['http_status'] or '-'}, retry {r['retries'] or 0} {err}\n")
+    
+    msg += f"\n수집 단계별 소요(ms, 최근 {telemetry.TREND_RUNS}회 p50/p95)\n"
+    from .scheduler import FEEDS
+    for kind in FEEDS:
+        msg += format_stage_trend(kind, get_stage_percentiles(kind, telemetry.STAGES, telemetry.TREND_RUNS))
+    
+    stats = response_cache.cache.stats()
+    msg += (f"\n응답 캐시: {stats['hits']} hit / {stats['misses']} miss ({stats['entries']}개, "
+            f"evict {stats['evictions']}, 합류 {stats['coalesced']})\n")
+    processor = context.application.update_processor
+    if isinstance(processor, update_processor.CommandProcessor):
+        msg += "업데이트 처리: " + ", ".join(f"{k} {v}" for k, v in processor.stats().items()) + "\n"
+    
+    latencies = metrics.summary()
+    if latencies:
+        msg += f"\n명령/작업 지연 (재시작 이후)\n{latencies}\n"
         
-    await update.message.reply_text(msg, parse_mode="Markdown")
+    # Plain text: handler/job names (cmd_support, in_flight...) would break Markdown entities
+    metrics.add_message_bytes(msg)
+    await update.message.reply_text(msg, parse_mode=None)
+
+async def cmd_trace(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/trace last [ingest|digest|list]: critical path of the newest (matching) trace."""
+    if str(update.effective_chat.id) not in ALLOWED_CHAT_IDS:
+        return
+    args = [a for a in (context.args or []) if a != "last"]
+    await asyncio.to_thread(tracing.flush)  # the newest trace may still be buffered
+    spans = await asyncio.to_thread(get_last_trace, args[0] if args else "")
+    await send_chunked(update, tracing.format_critical_path(spans))
+
+async def cmd_profile_next(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile_next [N] or /profile_next job [N]: profile the next handler calls / scheduler jobs (owner only)."""
+    chat_id = update.effective_chat.id
+    if not ALLOWED_CHAT_ID or str(chat_id) != ALLOWED_CHAT_ID:
+        return
+    args = list(context.args or [])
+    kind = "job" if args and args[0] == "job" else "handler"
+    if kind == "job":
+        args = args[1:]
+    calls = int(args[0]) if args and args[0].isdigit() else 1
+
+    async def report(text):
+        await context.bot.send_message(chat_id=chat_id, text=text)
+
+    profiling.arm(kind, calls, report)
+    target = "스케줄러 작업" if kind == "job" else "명령"
+    await update.message.reply_text(f"🔬 다음 {target} {calls}회를 프로파일링합니다.")
+
+def format_stage_trend(kind: str, percentiles) -> str:
+    parts = [f"{stage} {p50}/{p95}" for stage, (p50, p95, n) in percentiles.items() if n]
+    return f"{kind}: {', '.join(parts) if parts else '기록 없음'}\n"
 
 # --- Helper for list formatting ---
 async def send_chunked(update: Update, text: str):
-    # Split by chunks of 4000
-    if len(text) <= 4000:
-        await update.message.reply_text(text, parse_mode=None) # plain text to avoid markdown errors or disable preview
-        return
+    metrics.add_message_bytes(text)
+    with tracing.span("telegram.send", bytes=len(text.encode("utf-8"))) as span:
+        # Split by chunks of 4000
+        if len(text) <= 4000:
+            await update.message.reply_text(text, parse_mode=None) # plain text to avoid markdown errors or disable preview
+            return
         
-    for i in range(0, len(text), 4000):
-        await update.message.reply_text(text[i:i+4000], parse_mode=None)
+        span.set(chunks=(len(text) + 3999) // 4000)
+        for i in range(0, len(text), 4000):
+            await update.message.reply_text(text[i:i+4000], parse_mode=None)
 
-def format_program_list(programs, profile, title="목록"):
-    if not programs:
+def format_program_list(recommendations, title="목록"):
+    if not recommendations:
         return f"📭 {title}: 결과가 없습니다."
         
-    msg = f"📢 **{title} ({len(programs)}건)**\n\n"
-    for p in programs:
-        # Check recommendation
-        # We might pass pre-calculated reasons if available, else calc on fly
-        rec, score, reasons = is_recommended(p, profile)
-        
-        icon = "📅" if p['kind'] == 'event' else "💰"
+    msg = f"📢 **{title} ({len(recommendations)}건)**\n\n"
+    for p, score, reasons in recommendations:
+        icon = "📅" if p.kind == 'event' else "💰"
+        action_key = p.program_key.replace(':', '_')
         
-        msg += f"{icon} [{score}점] {p['title']}\n"
-        if p.get('apply_end_at'):
-            msg += f"⏳ 마감: {p['apply_end_at']}\n"
+        msg += f"{icon} [{score}점] {p.title}\n"
+        if p.apply_end_at:
+            msg += f"⏳ 마감: {p.apply_end_at}\n"
         if reasons:
             msg += f"💡 {', '.join(reasons)}\n"
-        msg += f"🔗 {p['url']}\n"
-        msg += f"👉 /save_{p['program_key'].replace(':','_')} | /dismiss_{p['program_key'].replace(':','_')}\n\n"
+        msg += f"🔗 {p.url}\n"
+        msg += f"👉 /save_{action_key} | /dismiss_{action_key}\n\n"
         
     return msg
 
 # --- List Handlers ---
-async def list_programs(update: Update, context: ContextTypes.DEFAULT_TYPE, kind=None, due_only=False):
-    if str(update.effective_chat.id) != str(ALLOWED_CHAT_ID):
-        return
-
-    conn = get_connection()
-    cursor = conn.cursor()
-    profile = get_profile()
-    
-    limit = 10
-    if context.args and context.args[0].isdigit():
-        limit = int(context.args[0])
-    
-    query = "SELECT * FROM programs WHERE 1=1"
-    params = []
-    
-    if kind:
-        query += " AND kind = ?"
-        params.append(kind)
-        
-    # Filtering handled in Python or SQL?
-    # Logic: Get candidates -> Filter/Score -> Sort -> Slice
-    # Since we need scoring, better to fetch valid candidates then sort in python.
-    # Filter out dismissed?
-    # For now fetch recent active items.
-    
-    # "Recent" definition for general list? OR "All valid"?
-    # Usually lists show "Active" items (not closed).
-    today = datetime.now().strftime("%Y-%m-%d")
-    # For support, apply_end_at >= today or null
-    # For event, event_end_at >= today or null (or apply_end_at)
-    
-    # We can fetch all that are not clearly closed in past.
-    # Logic: apply_end_at IS NULL OR apply_end_at >= today
-    query += f" AND (apply_end_at IS NULL OR apply_end_at >= '{today}')"
-    
-    # Also sort by created_at desc for general list? Or Score?
-    # PRD assumes recommendation for /digest, /support.
-    # "/support [n] : 지원사업 추천 n개" -> implies scoring.
-    
-    cursor.execute(query, params)
-    rows = [dict(r) for r in cursor.fetchall()]
-    conn.close()
-    
-    # Check dismissed
-    # Need user_actions. 
-    # Let's simple check: exclude if action='dismissed'
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT program_key FROM user_actions WHERE action='dismissed'")
-    dismissed = set(r[0] for r in c.fetchall())
-    conn.close()
-    
+def render_list(profile: dict, kind=None, due_only=False, limit=10) -> str:
+    """
+    Lists show "Active" items (not clearly closed, not dismissed), served
+    from the in-memory active set: Filter/Score -> Sort -> Slice.
+    Blocking; list_programs runs it off the event loop.
+    """
+    relevance = hot_set.get_relevance_stats(profile)
+    weights = hot_set.preference_weights(profile['id'])
+    today = hot_set.get().today  # KST, same day the active set was expired for
     candidates = []
-    for r in rows:
-        if r['program_key'] in dismissed:
-            continue
+    with tracing.span("score", profile_id=profile['id']) as span:
+        scanned = 0
+        for p, features in hot_set.iter_active(kind, profile['id']):
+            scanned += 1
+            if due_only:
+                # Check if due <= threshold
+                days = get_days_left(p, features, today)
+                if days is None or days < 0 or days > profile['due_days_threshold']:
+                    continue
             
-        rec, score, reasons = is_recommended(r, profile)
-        
-        if due_only:
-            # Check if due <= threshold
-            days = get_days_left(r)
-            if days is not None and days <= profile['due_days_threshold'] and days >= 0:
-                pass
-            else:
-                continue
-                
-        # If standard recommendation command, must meet min_score?
-        # PRD: "/support [n] : 지원사업 추천" -> yes.
-        # But if user wants to see *all* due?
-        # Let's apply min_score filter generally for recommendation info.
-        # But for /due, maybe loose score?
-        # PRD 8.2 says "score >= min_score일 때 추천 목록에 포함".
-        # So yes, filter by score.
+            rec, score, reasons = is_recommended(p, profile, features, relevance, weights, today)
+    
+            # PRD 8.2 says "score >= min_score일 때 추천 목록에 포함".
+            # So yes, filter by score (for /due as well).
+            if score >= profile['min_score']:
+                candidates.append(Recommendation(p, score, reasons))
+        span.set(scanned=scanned, recommended=len(candidates))
         
-        if score >= profile['min_score']:
-            candidates.append({
-                **r, 'score': score, 'reasons': reasons
-            })
-            
     # Sort
     if due_only:
-        # Sort by days left asc
-        candidates.sort(key=lambda x: get_days_left(x) if get_days_left(x) is not None else 999)
+        # Sort by days left asc (all candidates have a parsed deadline here)
+        candidates.sort(key=lambda r: get_days_left(r.program, today=today))
     else:
-        # Sort by score desc, then date
-        candidates.sort(key=lambda x: x['score'], reverse=True)
-        
-    top_n = candidates[:limit]
+        # Sort by score desc
+        candidates.sort(key=lambda r: r.score, reverse=True)
+    
+    # One posting per near-duplicate cluster (the best-ranked one)
+    top_n = dedup.collapse(candidates, limit)
+
+    return format_program_list(top_n, title=f"추천 {'마감임박' if due_only else ''} ({kind or '전체'})")
+
+async def list_programs(update: Update, context: ContextTypes.DEFAULT_TYPE, kind=None, due_only=False):
+    profile = await chat_profile(update)
+    if not profile:
+        return
+    
+    with tracing.trace("list", kind=kind or "all", due_only=due_only) as root:
+        limit = 10
+        if context.args and context.args[0].isdigit():
+            limit = int(context.args[0])
     
-    await send_chunked(update, format_program_list(top_n, profile, title=f"추천 {'마감임박' if due_only else ''} ({kind or '전체'})"))
+        # Same command/args against the same profile and data renders the same text.
+        cache_key = response_cache.make_key("list", (kind, due_only, limit), profile)
+        text = response_cache.cache.get(cache_key)
+        root.set(cache_hit=text is not None)
+        if text is None:
+            # Scoring runs in a worker thread so other updates keep flowing; an
+            # identical request already rendering is awaited instead of repeated.
+            text = await response_cache.cache.render_once(
+                cache_key, lambda: asyncio.to_thread(render_list, profile, kind, due_only, limit))
+        await send_chunked(update, text)
 
 async def cmd_digest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await list_programs(update, context, kind=None)
@@ -217,62 +267,112 @@ async def cmd_due_support(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def cmd_due_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await list_programs(update, context, kind='event', due_only=True)
 
+# --- Change Feed ---
+CHANGE_FIELD_LABELS = {
+    "title": "제목",
+    "apply_start_at": "접수 시작",
+    "apply_end_at": "마감",
+    "event_start_at": "행사 시작",
+    "event_end_at": "행사 종료",
+    "apply_period_raw": "접수기간",
+    "event_period_raw": "행사기간",
+    "agency": "기관",
+    "region_raw": "지역",
+    "url": "링크",
+}
+
+def format_changes(changes, days):
+    if not changes:
+        return f"📭 최근 {days}일간 변경된 공고가 없습니다."
+
+    # Group by program, newest change first
+    by_program = {}
+    for c in changes:
+        by_program.setdefault(c["program_key"], []).append(c)
+
+    msg = f"🔄 **최근 {days}일 변경 ({len(by_program)}건)**\n\n"
+    for key, rows in by_program.items():
+        msg += f"[{rows[0]['kind']}] {rows[0]['title']}\n"
+        other = 0
+        for c in rows:
+            label = CHANGE_FIELD_LABELS.get(c["field"])
+            if label:
+                msg += f"  • {label}: {c['old_value'] or '-'} → {c['new_value'] or '-'}\n"
+            else:
+                other += 1 # summary etc: too long to show as a diff
+        if other:
+            msg += f"  • 기타 {other}개 항목 수정\n"
+        msg += f"/open_{key.replace(':', '_')}\n\n"
+    return msg
+
+async def cmd_changes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_chat.id) not in ALLOWED_CHAT_IDS:
+        return
+    days = 7
+    if context.args and context.args[0].isdigit():
+        days = min(int(context.args[0]), 90)
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    changes = await asyncio.to_thread(list_program_changes, since)
+    await send_chunked(update, format_changes(changes, days))
+
+# --- Posting Detail (/open_<key> links in digests and /changes) ---
+def format_program_detail(p):
+    icon = "📅" if p.kind == 'event' else "💰"
+    action_key = p.program_key.replace(':', '_')
+    msg = f"{icon} [{p.kind}] {p.title or '제목 없음'}\n"
+    if p.agency:
+        msg += f"🏢 {p.agency}\n"
+    if p.apply_period_raw:
+        msg += f"🗓 접수기간: {p.apply_period_raw}\n"
+    if p.apply_end_at:
+        msg += f"⏳ 마감: {p.apply_end_at}\n"
+    if p.event_period_raw:
+        msg += f"🎪 행사기간: {p.event_period_raw}\n"
+    msg += f"🔗 {p.url or '#'}\n"
+    msg += f"👉 /save_{action_key} | /dismiss_{action_key}\n"
+    return msg
+
+async def cmd_open(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_chat.id) not in ALLOWED_CHAT_IDS:
+        return
+    key = parse_open_command(update.message.text)
+    if not key:
+        return
+    programs = await asyncio.to_thread(get_programs, [key])
+    if not programs:
+        await update.message.reply_text(f"📭 공고를 찾을 수 없습니다: {key}")
+        return
+    await send_chunked(update, format_program_detail(programs[0]))
+
 # --- Action Handlers (Save/Dismiss) ---
 # Since key structure is kind:seq, and telegram commands can't have ':', 
 # We use underscores in link and replace back.
 async def action_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if str(update.effective_chat.id) != str(ALLOWED_CHAT_ID):
+    profile = await chat_profile(update)
+    if not profile:
         return
         
-    msg = update.message.text
-    # /save_support_123 or /save support:123 if typed manually?
-    # PRD says "/save <id>". 
-    # Let's support both /save <id> and /save_id
-    
-    cmd, *args = msg.split()
-    action = None
-    if "save" in cmd:
-        action = "saved"
-    elif "dismiss" in cmd:
-        action = "dismissed"
-    else:
+    parsed = parse_action_command(update.message.text)
+    if not parsed:
         return
+    action, key = parsed
         
-    # Extract key
-    key = None
-    if "_" in cmd:
-        # /save_program_key
-        parts = cmd.split("_", 1)
-        if len(parts) > 1:
-            key = parts[1].replace("_", ":", 1) # Support:123 -> support_123 -> support:123. 
-            # Wait, 123 might have underscores? Bizinfo IDs are usually numeric or alphanumeric.
-            # "support:123" -> "support_123". "event:ABC" -> "event_ABC".
-            # Be careful if ID has ":".
-            # Assuming kind is "support" same as "support".
-            pass
-    elif args:
-        key = args[0]
-        
-    if not key:
-        return
-        
-    # Logic
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        c.execute("INSERT OR REPLACE INTO user_actions (program_key, action, created_at) VALUES (?, ?, ?)", 
-                  (key, action, datetime.now().isoformat()))
-        conn.commit()
+        # Blocking writes off the loop; interactive updates run concurrently
+        await asyncio.to_thread(record_user_action, key, action, profile['id'])
+        await asyncio.to_thread(preferences.learn, key, action, profile['id'])
+        hot_set.apply_action(key, action, profile['id'])
         await update.message.reply_text(f"✅ {action}: {key}")
     except Exception as e:
         await update.message.reply_text(f"❌ Error: {e}")
-    finally:
-        conn.close()
 
 # --- Conversation Flow for Profile ---
 async def set_profile_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if str(update.effective_chat.id) != str(ALLOWED_CHAT_ID):
+    profile = await chat_profile(update)
+    if not profile:
         return ConversationHandler.END
+    context.user_data.clear()
+    context.chat_data['profile_id'] = profile['id']
     await update.message.reply_text("프로필 설정을 시작합니다.\n\n허용 지역을 입력하세요.\n(예: 서울, 경기 / 또는 '전국')")
     return SET_REGION
 
@@ -339,7 +439,10 @@ async def set_due_threshold(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['due_days_threshold'] = days
         
         # Save
-        update_profile(context.user_data)
+        profile_id = context.chat_data.get('profile_id', 1)
+        # Rematches recent programs: off the loop
+        await asyncio.to_thread(update_profile, context.user_data, profile_id)
+        _reschedule_digest(profile_id)
         
         await update.message.reply_text("✅ 프로필 설정이 완료되었습니다!")
         return ConversationHandler.END
@@ -353,9 +456,9 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- Profile View ---
 async def cmd_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if str(update.effective_chat.id) != str(ALLOWED_CHAT_ID):
+    p = await chat_profile(update)
+    if not p:
         return
-    p = get_profile()
     msg = f"👤 **프로필 설정**\n\n"
     msg += f"허용지역: {p['region_allow']}\n"
     msg += f"관심분야: {p['interests']}\n"
@@ -368,24 +471,35 @@ async def cmd_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- Mute/Unmute ---
 async def cmd_mute(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if str(update.effective_chat.id) != str(ALLOWED_CHAT_ID):
+    profile = await chat_profile(update)
+    if not profile:
         return
-    update_profile({"notify_enabled": 0})
+    await asyncio.to_thread(update_profile, {"notify_enabled": 0}, profile['id'])
+    _reschedule_digest(profile['id'])
     await update.message.reply_text("🔕 알림이 꺼졌습니다.")
 
 async def cmd_unmute(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if str(update.effective_chat.id) != str(ALLOWED_CHAT_ID):
+    profile = await chat_profile(update)
+    if not profile:
         return
-    update_profile({"notify_enabled": 1})
+    await asyncio.to_thread(update_profile, {"notify_enabled": 1}, profile['id'])
+    _reschedule_digest(profile['id'])
     await update.message.reply_text("🔔 알림이 켜졌습니다.")
 
 # --- Setup Application ---
 def create_app(token):
-    app = ApplicationBuilder().token(token).build()
+    builder = ApplicationBuilder().token(token)
+    if TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(TELEGRAM_API_BASE_URL)
+    # Concurrent updates: cheap commands don't queue behind list renders (see update_processor)
+    builder = builder.concurrent_updates(update_processor.CommandProcessor())
+    app = builder.build()
     
     # Commands
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("health", health))
+    app.add_handler(CommandHandler("trace", cmd_trace))
+    app.add_handler(CommandHandler("profile_next", cmd_profile_next))
     app.add_handler(CommandHandler("profile", cmd_profile))
     app.add_handler(CommandHandler("digest", cmd_digest))
     app.add_handler(CommandHandler("support", cmd_support))
@@ -393,6 +507,7 @@ def create_app(token):
     app.add_handler(CommandHandler("due", cmd_due))
     app.add_handler(CommandHandler("due_support", cmd_due_support))
     app.add_handler(CommandHandler("due_events", cmd_due_events))
+    app.add_handler(CommandHandler("changes", cmd_changes))
     
     # Conversation
     conv_handler = ConversationHandler(
@@ -419,5 +534,9 @@ def create_app(token):
     # CommandHandler usually takes a string.
     # To handle /save_foo_bar, we can use `MessageHandler(filters.Regex(r'^/(save|dismiss)_'), ...)`
     app.add_handler(MessageHandler(filters.Regex(r'^/(save|dismiss)'), action_handler))
+    app.add_handler(MessageHandler(filters.Regex(r'^/open_'), cmd_open))
+    
+    # Latency/DB/rows/bytes histograms for every handler above (/metrics, /health)
+    metrics.instrument_handlers(app)
     
     return app
@@ -0,0 +1,72 @@
+"""
+Per-stage ingestion telemetry, one `ingestion_runs` row per feed poll.
+
+Both ingestion paths (scheduler._ingest and run_once) fill the same row:
+milliseconds spent per STAGES entry, bytes and pages downloaded, the last
+HTTP status, retries, and exact inserted/updated/unchanged counts. /health
+shows the trend as p50/p95 per stage over the last TREND_RUNS runs of each
+feed (db.get_stage_percentiles), so a slow API or a regressed upsert shows
+up before the data goes stale. Each stage is also a span of the run's trace
+(see tracing.py).
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict
+
+from . import tracing
+
+STAGES = ("http", "decode", "normalize", "upsert", "score")
+TREND_RUNS = 50
+
+
+def new_run(kind: str, circuit: str) -> Dict[str, Any]:
+    """An ingestion_runs row with every counter at zero."""
+    return {
+        "run_at": datetime.now().isoformat(),
+        "kind": kind,
+        "fetched_count": 0,
+        "new_count": 0,
+        "updated_count": 0,
+        "unchanged_count": 0,
+        "error": None,
+        "circuit": circuit,
+        "attempts": 0,
+        "retries": 0,
+        "pages": 0,
+        "bytes_downloaded": 0,
+        "http_status": None,
+        "fetch_ms": None,
+        **{f"{name}_ms": None for name in STAGES},
+    }
+
+
+@contextmanager
+def stage(run_log: Dict[str, Any], name: str):
+    """Add the time spent in the block to `<name>_ms`; yields the stage's trace span."""
+    started = time.perf_counter()
+    try:
+        with tracing.span(name) as span:
+            yield span
+    finally:
+        run_log[f"{name}_ms"] = (run_log[f"{name}_ms"] or 0) + round((time.perf_counter() - started) * 1000)
+
+
+def record_fetch(run_log: Dict[str, Any], stats: Dict[str, Any], fetch_ms: int):
+    """Copy BizinfoClient.stats of one fetch into the row."""
+    run_log.update(
+        attempts=stats["attempts"],
+        retries=max(0, stats["attempts"] - stats["pages"]),
+        pages=stats["pages"],
+        bytes_downloaded=stats["bytes"],
+        http_status=stats["http_status"],
+        http_ms=stats["http_ms"],
+        decode_ms=stats["decode_ms"],
+        fetch_ms=fetch_ms,
+    )
+
+
+def count_upsert(run_log: Dict[str, Any], status: str):
+    """Tally an upsert_program result ("inserted", "updated", "unchanged")."""
+    column = {"inserted": "new_count", "updated": "updated_count"}.get(status, "unchanged_count")
+    run_log[column] += 1
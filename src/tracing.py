@@ -0,0 +1,198 @@
+"""
+Minimal tracing: nested spans per ingestion run, digest send and list
+command, with no external collector.
+
+trace(name) opens a root span (sampled at TRACE_SAMPLE_RATE); span(name)
+opens a child of the current one and is a no-op outside a sampled trace,
+so library code (bizinfo_client, db, digest) can open spans freely.
+The current span lives in a ContextVar, which asyncio.to_thread copies
+into worker threads. Spans carry attributes (row counts, cache hits,
+bytes) set through .set().
+
+When the root ends, the trace's spans go to an in-memory buffer; nothing
+is written on the traced path. flush() writes the buffer to the SQLite
+`traces` table, or appends it as JSON lines to TRACE_FILE if that is set.
+The bot flushes every FLUSH_INTERVAL from a worker thread and prunes
+traces older than TRACE_RETENTION once a day (see scheduler.py).
+`/trace last` shows the critical path of the newest trace.
+"""
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+TRACE_FILE = os.getenv("TRACE_FILE", "").strip()
+TRACE_RETENTION = timedelta(days=7)
+FLUSH_INTERVAL = timedelta(seconds=30)
+# Finished span rows waiting for flush(); the oldest are dropped if flushing stalls
+MAX_BUFFERED_SPANS = 10_000
+_buffer: deque = deque(maxlen=MAX_BUFFERED_SPANS)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "started_at", "start", "offset_ms",
+                 "duration_ms", "attrs", "spans")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], parent: Optional["Span"] = None):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        # Offsets are relative to the root, so the critical path needs no clock sync
+        self.offset_ms = round((self.start - parent.start) * 1000 + parent.offset_ms, 3) if parent else 0.0
+        self.duration_ms = None
+        self.attrs = dict(attrs)
+        self.spans = parent.spans if parent else []  # finished spans of the whole trace
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def row(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "started_at": self.started_at, "offset_ms": self.offset_ms,
+            "duration_ms": self.duration_ms, "attrs": json.dumps(self.attrs, ensure_ascii=False, default=str),
+        }
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+
+NOOP = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+@contextmanager
+def _run(span: Span) -> Iterator[Span]:
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        span.duration_ms = round((time.perf_counter() - span.start) * 1000, 3)
+        span.spans.append(span)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Root span of a new trace (a child span if a trace is already open)."""
+    if _current.get() is not None:
+        with span(name, **attrs) as child:
+            yield child
+        return
+    if random.random() >= TRACE_SAMPLE_RATE:
+        yield NOOP
+        return
+    root = Span(name, attrs)
+    try:
+        with _run(root):
+            yield root
+    finally:
+        _write(root.spans)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    parent = _current.get()
+    if parent is None:
+        yield NOOP
+        return
+    with _run(Span(name, attrs, parent)) as child:
+        yield child
+
+
+def current() -> Any:
+    """The open span (NOOP outside a sampled trace), to set attributes on."""
+    return _current.get() or NOOP
+
+
+def _write(spans: List[Span]):
+    _buffer.extend(s.row() for s in spans)
+
+
+def flush():
+    """Write buffered spans (blocking; the bot calls it off the event loop)."""
+    rows = []
+    while _buffer:
+        rows.append(_buffer.popleft())
+    if not rows:
+        return
+    try:
+        if TRACE_FILE:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            from .db import save_spans
+            save_spans(rows)
+    except Exception as e:
+        # Tracing never breaks the traced work
+        logger.warning(f"Could not write {len(rows)} spans: {e}")
+
+
+def prune():
+    """Drop stored traces older than TRACE_RETENTION (blocking)."""
+    if TRACE_FILE:
+        return
+    from .db import prune_traces
+    prune_traces((datetime.now() - TRACE_RETENTION).isoformat())
+
+
+def critical_path(spans: List[dict]) -> List[Tuple[int, dict]]:
+    """
+    (depth, span) along the critical path, in start order. Below each span,
+    walk back from its end: the child that finished last, then the last one
+    that finished before that child started, and so on.
+    """
+    children = defaultdict(list)
+    for s in spans:
+        children[s["parent_id"]].append(s)
+    roots = children.get(None)
+    if not roots:
+        return []
+
+    path = []
+
+    def walk(s: dict, depth: int):
+        path.append((depth, s))
+        chain = []
+        limit = float("inf")
+        for child in sorted(children[s["span_id"]], key=lambda c: c["offset_ms"] + c["duration_ms"], reverse=True):
+            if child["offset_ms"] + child["duration_ms"] <= limit:
+                chain.append(child)
+                limit = child["offset_ms"]
+        for child in reversed(chain):
+            walk(child, depth + 1)
+
+    walk(roots[0], 0)
+    return path
+
+
+def format_critical_path(spans: List[dict]) -> str:
+    path = critical_path(spans)
+    if not path:
+        return "기록된 트레이스가 없습니다."
+    root = path[0][1]
+    lines = [f"🔎 {root['name']} ({root['started_at'][:19]}), {root['duration_ms']:.0f}ms", "임계 경로:"]
+    for depth, s in path:
+        attrs = json.loads(s["attrs"] or "{}")
+        attr_text = " ".join(f"{k}={v}" for k, v in attrs.items())
+        lines.append(f"{'  ' * depth}{s['name']} {s['duration_ms']:.0f}ms {attr_text}".rstrip())
+    return "\n".join(lines)
@@ -0,0 +1,85 @@
+"""
+Concurrent update processing for the long-running bot (create_app).
+
+PTB handles updates one at a time by default, so a /digest over a big
+archive held up /health, /mute and everything queued behind it.
+CommandProcessor runs updates concurrently (at most
+MAX_CONCURRENT_UPDATES), with a per-class policy:
+- "list" (the list commands and /changes): at most LIST_CONCURRENCY at a
+  time; the rest wait their turn without holding anything else up.
+  Rendering runs off the event loop, and identical in-flight renders
+  coalesce (response_cache.render_once);
+- "conversation" (/set_profile, /cancel and plain-text answers): one at
+  a time per chat, in arrival order, so the ConversationHandler sees a
+  chat's answers in the order they were sent;
+- "interactive" (everything else: /health, /mute, save/dismiss...): runs
+  right away, so cheap commands never queue behind expensive ones.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "256"))
+LIST_CONCURRENCY = int(os.getenv("BOT_LIST_CONCURRENCY", "4"))
+
+LIST_COMMANDS = {"digest", "support", "events", "due", "due_support", "due_events", "changes"}
+CONVERSATION_COMMANDS = {"set_profile", "cancel"}
+
+
+def classify(update: object) -> str:
+    message = getattr(update, "message", None) if isinstance(update, Update) else None
+    text = (message.text or "") if message else ""
+    if not text:
+        return "interactive"
+    if not text.startswith("/"):
+        return "conversation"
+    command = text.split()[0][1:].split("@")[0].lower()
+    if command in LIST_COMMANDS:
+        return "list"
+    if command in CONVERSATION_COMMANDS:
+        return "conversation"
+    return "interactive"
+
+
+class CommandProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES,
+                 list_concurrency: int = LIST_CONCURRENCY):
+        super().__init__(max_concurrent_updates)
+        self.list_concurrency = list_concurrency
+        self._list_slots: Optional[asyncio.Semaphore] = None
+        # chat id -> [lock, updates holding or waiting for it]
+        self._chat_locks: Dict[Any, list] = {}
+        self.processed = defaultdict(int)
+
+    async def initialize(self):
+        self._list_slots = asyncio.Semaphore(self.list_concurrency)
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        kind = classify(update)
+        self.processed[kind] += 1
+        if kind == "list":
+            async with self._list_slots:
+                await coroutine
+        elif kind == "conversation":
+            chat_id = update.effective_chat.id if update.effective_chat else None
+            entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    await coroutine
+            finally:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._chat_locks[chat_id]
+        else:
+            await coroutine
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self.current_concurrent_updates, **self.processed}
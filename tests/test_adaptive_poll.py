@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+import pytest
+import src.db as db
+from src import bizinfo_client
+from src.adaptive_poll import next_interval, hour_of_week, record_and_plan, KST
+from src.bizinfo_client import BizinfoClient, SUPPORT_API_URL
+from src.db import init_db, upsert_program
+from src.models import Program
+
+MIN, MAX = timedelta(minutes=30), timedelta(hours=6)
+
+def test_busy_hours_poll_often_quiet_hours_rarely():
+    monday_9 = datetime(2024, 3, 4, 9, 0, tzinfo=KST)
+    busy = {hour_of_week(monday_9): 10.0}
+    assert next_interval(busy, monday_9, MIN, MAX) == MIN
+
+    monday_1 = datetime(2024, 3, 4, 1, 0, tzinfo=KST)
+    quiet = {h: 0.0 for h in range(168)}
+    assert next_interval(quiet, monday_1, MIN, MAX) == MAX
+
+def test_quiet_night_waits_until_busy_morning():
+    monday_3 = datetime(2024, 3, 4, 3, 0, tzinfo=KST)
+    rates = {h: 0.0 for h in range(168)}
+    rates[hour_of_week(monday_3.replace(hour=7))] = 4.0
+    # 3:00 -> 7:00 nothing expected, then one change within 15 minutes
+    assert next_interval(rates, monday_3, MIN, MAX) == timedelta(hours=4, minutes=15)
+
+def test_record_and_plan_and_upsert_status(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+    p = Program(program_key="support:1", kind="support", seq="1", title="A")
+    assert upsert_program(p) == "inserted"
+    assert upsert_program(p._replace(ingested_at="later")) == "unchanged"
+    assert upsert_program(p._replace(title="B")) == "updated"
+
+    now = datetime(2024, 3, 4, 9, 0, tzinfo=KST)
+    db.save_feed_state("support", None, None, None, (now - timedelta(hours=1)).isoformat())
+    record_and_plan("support", 6, now)
+    assert db.get_poll_rates("support") == {hour_of_week(now): 6.0}
+
+class FakeResponse:
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+    def raise_for_status(self):
+        pass
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+def test_conditional_fetch_skips_unchanged(monkeypatch):
+    monkeypatch.setenv("BIZINFO_SUPPORT_KEY", "key")
+    sent_headers = []
+    responses = [
+        FakeResponse(200, b'{"jsonArray": [{"pblancId": "1"}]}', {"ETag": '"v1"'}),
+        FakeResponse(304, b""),
+        FakeResponse(200, b'{"jsonArray": [{"pblancId": "1"}]}'),
+    ]
+    def fake_get(url, params=None, headers=None, timeout=None):
+        sent_headers.append(headers)
+        return responses.pop(0)
+    monkeypatch.setattr(bizinfo_client.requests, "get", fake_get)
+
+    client = BizinfoClient()
+    assert client.fetch_support_programs() == [{"pblancId": "1"}]
+    # Validators apply once the caller has stored the items
+    assert client.validators == {}
+    assert client.commit_validators(SUPPORT_API_URL)["etag"] == '"v1"'
+    assert client.fetch_support_programs() == []
+    assert client.not_modified[SUPPORT_API_URL]
+    assert sent_headers[1] == {"If-None-Match": '"v1"'}
+    # Same body again without validators: still treated as unchanged
+    assert client.fetch_support_programs() == []
+
+def test_validators_persist_only_after_items_are_stored(tmp_path, monkeypatch):
+    from src import hot_set, scheduler as sched
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    init_db()
+    monkeypatch.setenv("BIZINFO_SUPPORT_KEY", "key")
+    body = b'{"jsonArray": [{"pblancId": "1", "pblancNm": "AI"}]}'
+    monkeypatch.setattr(bizinfo_client.requests, "get", lambda *a, **k: FakeResponse(200, body, {"ETag": '"v1"'}))
+    monkeypatch.setattr(sched, "client", BizinfoClient())
+    monkeypatch.setitem(sched.FEEDS, "support", (SUPPORT_API_URL, lambda probe: sched.client.fetch_support_programs(probe=probe),
+                                                 sched.FEEDS["support"][2]))
+
+    def locked(program):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(sched, "upsert_program", locked)
+    sched._ingest("support")
+    assert db.get_feed_state("support").get("body_hash") is None
+
+    # The same body is ingested on the next poll, and only then remembered
+    monkeypatch.setattr(sched, "upsert_program", upsert_program)
+    sched._ingest("support")
+    assert db.get_recent_runs("support")[0]["new_count"] == 1
+    assert db.get_feed_state("support")["etag"] == '"v1"'
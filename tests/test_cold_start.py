@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import pytest
+import src.db as db
+from src.db import init_db, get_connection
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Generous: catches an eager heavy import (hundreds of ms), not machine noise
+IMPORT_BUDGET_MS = 1000
+
+def _import_profile(module):
+    """{module: cumulative µs} from `python -X importtime -c 'import <module>'`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+@pytest.mark.parametrize("entry_point, deferred", [
+    ("src.run_once", ["telegram", "apscheduler", "requests", "xmltodict", "http.server", "src.bizinfo_client"]),
+    ("src.main", ["requests", "xmltodict", "http.server", "src.scheduler", "src.bizinfo_client"]),
+])
+def test_entry_points_import_fast_without_heavy_modules(entry_point, deferred):
+    timings = _import_profile(entry_point)
+    assert not [m for m in deferred if m in timings]
+    assert timings[entry_point] / 1000 < IMPORT_BUDGET_MS
+
+def test_schema_setup_skipped_when_user_version_matches(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+    conn = get_connection()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    conn.close()
+
+    def fail(cursor):
+        raise AssertionError("schema setup should be skipped")
+    monkeypatch.setattr(db, "_create_schema", fail)
+    monkeypatch.setenv("TELEGRAM_ALLOWED_CHAT_ID", "777")
+    init_db()  # still binds the owner chat
+    assert db.get_profile(1)["chat_id"] == "777"
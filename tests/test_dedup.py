@@ -0,0 +1,49 @@
+import pytest
+import src.db as db
+from src.db import init_db, upsert_program, get_programs
+from src.dedup import collapse, signature, similarity
+from src.models import Program, Recommendation
+
+SUMMARY = "중소기업의 인공지능 도입을 위한 바우처를 지원합니다. 신청 기업은 공급기업과 매칭 후 사업계획서를 제출해야 합니다."
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+
+def _program(key, title, summary=SUMMARY):
+    kind, seq = key.split(":")
+    return Program(program_key=key, kind=kind, seq=seq, title=title, summary_raw=summary)
+
+def test_reposts_share_a_cluster(temp_db):
+    upsert_program(_program("support:1", "2024년 AI 바우처 지원사업 공고"))
+    upsert_program(_program("support:2", "[경기] 2024년 AI 바우처 지원사업 공고"))
+    upsert_program(_program("event:3", "2024년 AI 바우처 지원사업 설명회 안내", SUMMARY + " 설명회 참석 바랍니다."))
+    upsert_program(_program("support:4", "수출 물류비 지원", "해외 수출 기업의 물류비 일부를 지원합니다."))
+
+    clusters = {p.program_key: p.cluster_id for p in get_programs(["support:1", "support:2", "event:3", "support:4"])}
+    assert clusters["support:2"] == clusters["support:1"] == "support:1"
+    assert clusters["event:3"] == "support:1"
+    assert clusters["support:4"] == "support:4"
+
+def test_rewording_moves_posting_out_of_cluster(temp_db):
+    upsert_program(_program("support:1", "AI 바우처 지원사업"))
+    upsert_program(_program("support:2", "AI 바우처 지원사업 (재공고)"))
+    assert get_programs(["support:2"])[0].cluster_id == "support:1"
+
+    upsert_program(_program("support:2", "스마트공장 구축 지원", "제조 현장의 스마트공장 구축 비용을 지원합니다."))
+    assert get_programs(["support:2"])[0].cluster_id == "support:2"
+
+def test_signature_similarity_tracks_overlap():
+    a = signature(_program("support:1", "AI 바우처 지원사업"))
+    assert similarity(a, signature(_program("support:2", "AI 바우처 지원사업"))) == 1.0
+    assert similarity(a, signature(_program("support:3", "수출 물류비", "물류비 지원"))) < 0.3
+    assert signature(_program("support:4", "", "")) is None
+
+def test_collapse_keeps_best_ranked_member():
+    p1 = Program(program_key="support:1", kind="support", cluster_id="support:1")
+    p2 = Program(program_key="support:2", kind="support", cluster_id="support:1")
+    p3 = Program(program_key="support:3", kind="support")
+    ranked = [Recommendation(p2, 90, []), Recommendation(p1, 80, []), Recommendation(p3, 70, [])]
+    assert [r.program.program_key for r in collapse(ranked)] == ["support:2", "support:3"]
+    assert len(collapse(ranked, limit=1)) == 1
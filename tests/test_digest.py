@@ -0,0 +1,93 @@
+import json
+import pytest
+import src.db as db
+from src.db import init_db, get_connection, get_profile, update_profile, upsert_program, record_user_action
+from src.digest import (
+    materialize_digest, get_digest_text, mark_digest_sent, compute_due_reminders, format_digest, kst_date
+)
+from src.models import Program
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+    update_profile({"interests": json.dumps(["AI"]), "min_score": 30})
+
+def _ingest(seq, title):
+    from datetime import datetime
+    upsert_program(Program(program_key=f"support:{seq}", kind="support", seq=seq, title=title,
+                           ingested_at=datetime.now().isoformat()))
+
+def test_send_uses_materialized_artifact(temp_db):
+    _ingest("1", "AI 바우처")
+    _ingest("2", "일반 공고")
+    materialize_digest()
+
+    text, from_artifact, _ = get_digest_text(get_profile())
+    assert from_artifact
+    assert "AI 바우처" in text and "일반 공고" not in text
+
+def test_stale_artifact_falls_back_to_live(temp_db):
+    _ingest("1", "AI 바우처")
+    _ingest("3", "AI 해외진출")
+    materialize_digest()
+
+    conn = get_connection()
+    conn.execute("INSERT INTO user_actions (program_key, action, created_at) VALUES ('support:1', 'dismissed', '9999-01-01T00:00:00')")
+    conn.commit()
+    conn.close()
+
+    text, from_artifact, _ = get_digest_text(get_profile())
+    assert not from_artifact
+    assert "AI 바우처" not in text and "AI 해외진출" in text
+
+    materialize_digest()
+    update_profile({"interests": json.dumps(["수출"])})
+    text, from_artifact, _ = get_digest_text(get_profile())
+    assert not from_artifact
+    assert text == ""
+
+def test_sent_items_are_not_repeated_unless_title_or_deadline_changes(temp_db):
+    _ingest("1", "AI 바우처")
+    materialize_digest()
+    text, _, sent = get_digest_text(get_profile())
+    assert "AI 바우처" in text
+    mark_digest_sent(sent)
+
+    # Summary-only edit: nothing new to send
+    upsert_program(Program(program_key="support:1", kind="support", seq="1", title="AI 바우처",
+                           summary_raw="수정", ingested_at="9999-01-01T00:00:00"))
+    text, _, _ = get_digest_text(get_profile())
+    assert text == ""
+
+    # Deadline extension: sent again
+    upsert_program(Program(program_key="support:1", kind="support", seq="1", title="AI 바우처",
+                           apply_end_at="2999-12-31", ingested_at="9999-01-01T00:00:00"))
+    text, _, _ = get_digest_text(get_profile())
+    assert "AI 바우처" in text
+
+def test_saved_item_entering_due_window_is_reminded_once(temp_db):
+    from datetime import datetime, timedelta
+    end = (kst_date(datetime.now()) + timedelta(days=3)).isoformat()
+    upsert_program(Program(program_key="event:7", kind="event", seq="7", title="수출 상담회",
+                           apply_end_at=end, ingested_at="2000-01-01T00:00:00"))
+    record_user_action("event:7", "saved")
+
+    text, _, sent = get_digest_text(get_profile())
+    assert "[D-3] [event] 수출 상담회" in text
+    mark_digest_sent(sent)
+    text, _, _ = get_digest_text(get_profile())
+    assert text == ""
+
+def test_due_days_count_from_the_kst_date(temp_db):
+    from datetime import date, datetime, timezone
+    upsert_program(Program(program_key="event:7", kind="event", seq="7", title="수출 상담회",
+                           apply_end_at="2030-01-12", ingested_at="2000-01-01T00:00:00"))
+    record_user_action("event:7", "saved")
+
+    # 16:00 UTC is already the next day in KST
+    today = kst_date(datetime(2030, 1, 9, 16, 0, tzinfo=timezone.utc))
+    assert today == date(2030, 1, 10)
+    due = compute_due_reminders(get_profile(), today)
+    assert [p.program_key for p in due] == ["event:7"]
+    assert "[D-2] [event] 수출 상담회" in format_digest([], due, today)
@@ -1,5 +1,5 @@
 import pytest
-from src.due_parser import parse_period
+from src.due_parser import parse_period, parse_iso, tokenize_period, ordinal_to_iso
 
 def test_parse_period_range():
     raw = "2023-01-01 ~ 2023-12-31"
@@ -25,3 +25,38 @@ def test_parse_single_date():
 def test_parse_none():
     assert parse_period(None) == (None, None)
     assert parse_period("") == (None, None)
+
+def test_parse_compact_and_korean():
+    assert parse_period("20240301 ~ 20240315") == ("2024-03-01", "2024-03-15")
+    assert parse_period("2024년 3월 1일 ~ 2024년 3월 15일") == ("2024-03-01", "2024-03-15")
+
+def test_tokenize_times():
+    period = tokenize_period("2024-03-01 18:00 ~ 2024-03-15 18:00")
+    assert ordinal_to_iso(period.start) == "2024-03-01"
+    assert ordinal_to_iso(period.end) == "2024-03-15"
+    assert period.start_minute == 18 * 60
+    assert period.end_minute == 18 * 60
+
+def test_rolling_intake():
+    period = tokenize_period("상시 접수")
+    assert period.rolling
+    assert period.end is None
+    assert parse_period("상시 접수") == (None, None)
+
+def test_invalid_date_skipped():
+    assert parse_period("2024-13-01 ~ 2024-03-15") == (None, "2024-03-15")
+    assert parse_iso("접수: 2024.3.5") == "2024-03-05"
+
+def test_invalid_start_is_not_replaced_by_the_end():
+    period = tokenize_period("2024-02-30 10:00 ~ 2024-03-15 18:00")
+    assert (period.start, period.start_minute) == (None, None)
+    assert ordinal_to_iso(period.end) == "2024-03-15" and period.end_minute == 18 * 60
+    # An unrelated invalid date earlier on doesn't make a deadline-only period an end
+    assert parse_period("공고 2024-13-01, 2024-03-15까지") == ("2024-03-15", "2024-03-15")
+
+def test_range_ends_at_the_date_after_the_separator():
+    assert parse_period("2024-03-01 ~ 2024-03-15 (발표: 2024-04-01)") == ("2024-03-01", "2024-03-15")
+    assert parse_period("1차 2024.03.01(금) ~ 2024.03.15(금), 2차 2024.05.01 ~ 2024.05.15") == ("2024-03-01", "2024-03-15")
+    assert parse_period("2024년 3월 1일부터 2024년 3월 15일까지") == ("2024-03-01", "2024-03-15")
+    # A later date that isn't the other end of the range is not the deadline
+    assert parse_period("2024-03-15까지 (발표 2024-04-01)") == ("2024-03-15", "2024-03-15")
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+import pytest
+import src.db as db
+from benchmarks.fake_telegram import FakeConfig, FakeTelegram
+from src import hot_set, response_cache, telegram_bot
+from src.db import init_db, upsert_program
+from src.models import Program
+
+CHATS = [501, 502]
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    monkeypatch.setattr(response_cache, "cache", response_cache.ResponseCache())
+    monkeypatch.setattr(telegram_bot, "ALLOWED_CHAT_IDS", {str(c) for c in CHATS})
+    init_db()
+
+def _call(fake, method, **params):
+    data = urllib.parse.urlencode({k: v if isinstance(v, str) else json.dumps(v) for k, v in params.items()}).encode()
+    try:
+        with urllib.request.urlopen(f"{fake.base_url}TOKEN/{method}", data=data, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_fake_api_injects_rate_limits_and_size_limits():
+    with FakeTelegram(FakeConfig(per_chat_rate=1, max_message_length=10)) as fake:
+        assert _call(fake, "sendMessage", chat_id=1, text="hi")[0] == 200
+        status, body = _call(fake, "sendMessage", chat_id=1, text="again")
+        assert status == 429 and body["parameters"]["retry_after"] == 1
+        assert _call(fake, "sendMessage", chat_id=2, text="x" * 11)[1]["description"].endswith("too long")
+        assert _call(fake, "answerCallbackQuery", callback_query_id="7")[1]["result"] is True
+        assert _call(fake, "setWebhook", url="https://example.com/hook")[1]["result"] is True
+        assert _call(fake, "getUpdates")[0] == 409
+        assert fake.stats["429"] == 1 and fake.stats["too_long"] == 1
+
+def test_bot_answers_commands_through_the_fake_api(temp_db, monkeypatch):
+    async def scenario():
+        with FakeTelegram() as fake:
+            monkeypatch.setattr(telegram_bot, "TELEGRAM_API_BASE_URL", fake.base_url)
+            app = telegram_bot.create_app("123:TEST")
+            await app.initialize()
+            await app.start()
+            await app.updater.start_polling(poll_interval=0, timeout=1)
+            try:
+                replies = await asyncio.gather(*(fake.ask(chat, "/start") for chat in CHATS))
+                listing, seconds = await fake.ask(CHATS[0], "/support")
+                health, _ = await fake.ask(CHATS[0], "/health")
+                opened, _ = await fake.ask(CHATS[0], "/open_event_1")
+                ignored = fake.ask(999, "/start", timeout=0.5)  # not an allowed chat
+                with pytest.raises(asyncio.TimeoutError):
+                    await ignored
+            finally:
+                await app.updater.stop()
+                await app.stop()
+                await app.shutdown()
+            return replies, listing, seconds, health, opened
+
+    upsert_program(Program(program_key="event:1", kind="event", seq="1", title="AI 세미나",
+                           url="https://example.com/1"))
+    replies, listing, seconds, health, opened = asyncio.run(scenario())
+    assert all("기업마당 봇" in reply.text for reply, _ in replies)
+    assert "결과가 없습니다" in listing.text and seconds > 0
+    # Names like cmd_support / in_flight would be unpaired Markdown entities
+    assert "cmd_support" in health.text and "parse_mode" not in health.params
+    # /open_ links (digest, /changes) show the posting
+    assert "AI 세미나" in opened.text and "https://example.com/1" in opened.text
+    # The listing chat got its own profile on first use
+    assert db.get_profile_for_chat(CHATS[0], create=False)["id"] != 1
@@ -0,0 +1,190 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+import requests
+import src.db as db
+from src import bizinfo_client, fetch_policy, scheduler as sched
+from src.db import init_db, get_recent_runs, get_feed_state
+from src.fetch_policy import FetchError, Policy
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(fetch_policy, "backoff", lambda attempt: 0)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += seconds
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+def test_retries_transient_errors_only(no_backoff):
+    calls = []
+    def flaky(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise requests.ConnectionError("reset")
+        return "ok"
+    assert fetch_policy.call(flaky, Policy(retries=3), deadline_at=float("inf")) == "ok"
+    assert len(calls) == 3
+
+    calls.clear()
+    def not_found(timeout):
+        calls.append(timeout)
+        raise _http_error(404)
+    with pytest.raises(FetchError):
+        fetch_policy.call(not_found, Policy(retries=3), deadline_at=float("inf"))
+    assert len(calls) == 1
+
+def test_deadline_bounds_attempts_and_timeouts():
+    clock = FakeClock()
+    timeouts = []
+    def slow(timeout):
+        timeouts.append(timeout)
+        clock.now += timeout
+        raise requests.Timeout()
+    with pytest.raises(FetchError):
+        fetch_policy.call(slow, Policy(attempt_timeout=10, retries=3), deadline_at=15,
+                          sleep=clock.sleep, clock=clock)
+    # Second attempt only gets what is left of the 15s, and nothing runs past it
+    assert timeouts[0] == 10 and sum(timeouts) <= 15 and clock.now <= 15
+
+def test_hedged_request_wins_over_slow_one():
+    release = threading.Event()
+    calls = []
+    def request(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            release.wait(2)
+            return "slow"
+        return "fast"
+    try:
+        assert fetch_policy.call(request, Policy(hedge_after=0.05), deadline_at=float("inf")) == "fast"
+    finally:
+        release.set()
+    assert fetch_policy.p95([0.1] * 9) is None
+    assert fetch_policy.p95([i / 10 for i in range(1, 21)]) == 1.9
+
+def test_circuit_opens_after_failed_runs_and_probes_after_cooldown():
+    now = datetime(2024, 3, 5, 12, 0)
+    def run(minutes_ago, error=None, circuit="closed"):
+        return {"run_at": (now - timedelta(minutes=minutes_ago)).isoformat(), "error": error, "circuit": circuit}
+    failing = [run(10, "timeout"), run(70, "timeout"), run(130, "timeout")]
+    assert fetch_policy.circuit_state(failing[:2], now) == fetch_policy.CLOSED
+    assert fetch_policy.circuit_state(failing, now) == fetch_policy.OPEN
+    # Skipped runs don't reset or extend anything; the cooldown counts from the last attempt
+    assert fetch_policy.circuit_state([run(1, "circuit open", "open")] + failing, now) == fetch_policy.OPEN
+    assert fetch_policy.circuit_state([run(40, "timeout")] + failing[1:], now) == fetch_policy.HALF_OPEN
+    assert fetch_policy.circuit_state([run(5)] + failing, now) == fetch_policy.CLOSED
+
+def test_client_raises_instead_of_returning_empty(monkeypatch, no_backoff):
+    monkeypatch.setenv("BIZINFO_SUPPORT_KEY", "key")
+    def down(url, params=None, headers=None, timeout=None):
+        raise requests.ConnectionError("refused")
+    monkeypatch.setattr(bizinfo_client.requests, "get", down)
+    client = bizinfo_client.BizinfoClient()
+    with pytest.raises(FetchError):
+        client.fetch_support_programs()
+    assert client.stats[bizinfo_client.SUPPORT_API_URL]["attempts"] == fetch_policy.FETCH_RETRIES + 1
+    with pytest.raises(FetchError):
+        client.fetch_support_programs(probe=True)
+    assert client.stats[bizinfo_client.SUPPORT_API_URL]["attempts"] == 1
+    # A missing key is an error too, not an empty feed
+    monkeypatch.delenv("BIZINFO_EVENT_KEY", raising=False)
+    with pytest.raises(FetchError):
+        bizinfo_client.BizinfoClient().fetch_events()
+
+def test_ingest_records_errors_and_skips_open_circuit(temp_db, monkeypatch):
+    fetches = []
+    def failing(probe):
+        fetches.append(probe)
+        raise FetchError("gave up after 4 attempt(s)")
+    monkeypatch.setitem(sched.FEEDS, "support", (bizinfo_client.SUPPORT_API_URL, failing, None))
+
+    for _ in range(fetch_policy.BREAKER_FAILURES):
+        assert sched._ingest("support") == sched.MIN_INTERVAL
+    assert "last_polled_at" not in get_feed_state("support")
+
+    # Open: no fetch, wait out the cooldown
+    assert sched._ingest("support") >= sched.MIN_INTERVAL
+    assert len(fetches) == fetch_policy.BREAKER_FAILURES
+    runs = get_recent_runs("support")
+    assert runs[0]["circuit"] == fetch_policy.OPEN
+    assert all(r["error"] for r in runs)
+
+class _Response:
+    status_code = 200
+    headers = {}
+    def __init__(self, content):
+        self.content = content
+    def raise_for_status(self):
+        pass
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+@pytest.mark.parametrize("body", [b"[]", b'"maintenance"', b"null", b'{"jsonArray": "none"}', b'{"jsonArray": [1, 2]}'])
+def test_malformed_body_is_a_fetch_error(temp_db, monkeypatch, body):
+    monkeypatch.setenv("BIZINFO_SUPPORT_KEY", "key")
+    monkeypatch.setattr(bizinfo_client.requests, "get", lambda *a, **k: _Response(body))
+    monkeypatch.setattr(sched, "client", bizinfo_client.BizinfoClient())
+    monkeypatch.setitem(sched.FEEDS, "support", (bizinfo_client.SUPPORT_API_URL,
+                                                 lambda probe: sched.client.fetch_support_programs(probe=probe), None))
+    with pytest.raises(FetchError):
+        bizinfo_client.BizinfoClient().fetch_support_programs()
+    # Counted against the circuit breaker like an outage, on every poll of the same body
+    for _ in range(2):
+        assert sched._ingest("support") == sched.MIN_INTERVAL
+        assert get_recent_runs("support")[0]["error"].startswith("Unexpected")
+
+def test_hedged_requests_run_in_the_callers_context():
+    import contextvars
+    var = contextvars.ContextVar("var", default=None)
+    seen = []
+    def request(timeout):
+        seen.append(var.get())
+        if len(seen) == 1:
+            threading.Event().wait(0.2)
+        return "ok"
+    var.set("trace")
+    assert fetch_policy.call(request, Policy(hedge_after=0.05), deadline_at=float("inf")) == "ok"
+    assert seen == ["trace", "trace"]
+
+def test_client_counts_only_the_winning_hedged_attempt(monkeypatch):
+    monkeypatch.setenv("BIZINFO_SUPPORT_KEY", "key")
+    release, loser_done = threading.Event(), threading.Event()
+    calls = []
+    def get(url, params=None, headers=None, timeout=None):
+        calls.append(timeout)
+        if len(calls) == 1:
+            release.wait(2)
+            loser_done.set()
+            return _Response(b'{"jsonArray": [{"pblancId": "slow"}], "padding": "x"}')
+        return _Response(b'{"jsonArray": [{"pblancId": "1"}]}')
+    monkeypatch.setattr(bizinfo_client.requests, "get", get)
+    client = bizinfo_client.BizinfoClient()
+    monkeypatch.setattr(client, "_policy", lambda url, probe: Policy(hedge_after=0.05))
+    assert client.fetch_support_programs() == [{"pblancId": "1"}]
+    release.set()
+    loser_done.wait(2)
+    stats = client.stats[bizinfo_client.SUPPORT_API_URL]
+    # The loser finishing later doesn't add to what the winner reported
+    assert (stats["attempts"], stats["pages"], stats["hedges"]) == (1, 1, 1)
+    assert stats["bytes"] == len(b'{"jsonArray": [{"pblancId": "1"}]}')
+
+def test_deadline_per_endpoint(monkeypatch):
+    monkeypatch.setitem(fetch_policy.FETCH_DEADLINES, "event", 7.0)
+    client = bizinfo_client.BizinfoClient()
+    assert client._policy(bizinfo_client.EVENT_API_URL, probe=False).deadline == 7.0
+    assert client._policy(bizinfo_client.SUPPORT_API_URL, probe=False).deadline == fetch_policy.FETCH_DEADLINES["support"]
@@ -0,0 +1,53 @@
+import pytest
+import src.db as db
+from src import hot_set
+from src.db import init_db, upsert_program
+from src.models import Program
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    init_db()
+
+def _program(key, end):
+    kind, seq = key.split(":")
+    return Program(program_key=key, kind=kind, seq=seq, title=f"Program {seq}", apply_end_at=end)
+
+def test_load_filters_closed_and_dismissed(temp_db, monkeypatch):
+    monkeypatch.setattr(hot_set, "kst_today", lambda: "2030-01-10")
+    upsert_program(_program("support:1", "2030-01-09"))
+    upsert_program(_program("support:2", "2030-01-10"))
+    upsert_program(_program("event:3", None))
+    hot_set.load()
+
+    assert {ap.program.program_key for ap in hot_set.iter_active()} == {"support:2", "event:3"}
+    assert [ap.program.program_key for ap in hot_set.iter_active("event")] == ["event:3"]
+
+    hot_set.apply_action("event:3", "dismissed")
+    assert {ap.program.program_key for ap in hot_set.iter_active()} == {"support:2"}
+
+def test_expires_at_kst_day_boundary(temp_db, monkeypatch):
+    monkeypatch.setattr(hot_set, "kst_today", lambda: "2030-01-10")
+    upsert_program(_program("support:2", "2030-01-10"))
+    upsert_program(_program("support:4", "2030-01-11"))
+    version = hot_set.load().version
+
+    # Next day: no DB read needed, the closed item just drops out
+    monkeypatch.setattr(hot_set, "kst_today", lambda: "2030-01-11")
+    monkeypatch.setattr(hot_set, "list_open_programs", None)
+    snapshot = hot_set.get()
+    assert snapshot.version > version
+    assert [ap.program.program_key for ap in snapshot.programs] == ["support:4"]
+
+def test_due_list_counts_days_from_the_kst_date(temp_db, monkeypatch):
+    from src.db import get_profile
+    from src.telegram_bot import render_list
+    # Host clock is far from 2030; D-days must follow the snapshot's KST date
+    monkeypatch.setattr(hot_set, "kst_today", lambda: "2030-01-10")
+    upsert_program(_program("support:4", "2030-01-12"))
+    hot_set.load()
+    profile = dict(get_profile(), min_score=0, due_days_threshold=7)
+
+    text = render_list(profile, due_only=True)
+    assert "Program 4" in text and "마감 임박: D-2" in text
@@ -0,0 +1,56 @@
+import asyncio
+import urllib.request
+import pytest
+import src.db as db
+from src import hot_set, metrics
+from src.db import init_db, list_open_programs
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    monkeypatch.setattr(metrics, "_histograms", {})
+    init_db()
+
+def test_histogram_buckets_and_quantile():
+    h = metrics.Histogram(metrics.SECONDS_BUCKETS)
+    for value in [0.001] * 18 + [0.3, 60]:
+        h.observe(value)
+    assert h.count == 20 and h.counts[0] == 18 and h.counts[-1] == 1
+    assert h.quantile(0.5) == 0.005
+    assert h.quantile(0.95) == 0.5
+    assert h.quantile(1.0) is None
+
+def test_instrument_records_db_time_rows_and_bytes(temp_db):
+    @metrics.instrument("probe", kind="handler")
+    async def handler():
+        await asyncio.to_thread(list_open_programs)  # DB work off the loop still counts
+        metrics.add_message_bytes("안녕")
+        return "done"
+
+    assert asyncio.run(handler()) == "done"
+    snap = metrics.snapshot()
+    assert snap[("bot_latency_seconds", "handler", "probe")].count == 1
+    assert snap[("bot_db_seconds", "handler", "probe")].sum > 0
+    assert snap[("bot_rows", "handler", "probe")].sum == 0
+    assert snap[("bot_message_bytes", "handler", "probe")].sum == 6
+    # Outside a measured call nothing is recorded
+    metrics.add_message_bytes("x")
+    assert len(metrics.snapshot()) == 4
+    assert metrics.summary().startswith("probe: 1회")
+
+def test_exporter_serves_prometheus_text(temp_db):
+    @metrics.instrument()
+    async def nightly():
+        pass
+    asyncio.run(nightly())
+
+    server = metrics.start_exporter(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        server.shutdown()
+    assert "# TYPE bot_latency_seconds histogram" in body
+    assert 'bot_latency_seconds_bucket{job="nightly",le="+Inf"} 1' in body
+    assert 'bot_rows_count{job="nightly"} 1' in body
@@ -0,0 +1,38 @@
+import sys
+import pytest
+import src.db as db
+from src.db import init_db, upsert_program, list_open_programs
+from src.models import Program, PROGRAM_COLUMNS
+from src.normalizer import normalize_event
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+
+def test_program_key_access():
+    p = Program(program_key="support:1", kind="support", title="AI")
+    assert p["title"] == "AI"
+    assert p.get("summary_raw", "") is None
+    assert p.get("score", 0) == 0
+    assert p.get("count") is None  # tuple methods are not fields
+    with pytest.raises(KeyError):
+        p["score"]
+    assert not hasattr(p, "__dict__")
+
+def test_program_db_roundtrip(temp_db):
+    event = normalize_event({"eventInfoId": "E1", "nttNm": "박람회", "rceptPd": "2099-01-01 ~ 2099-01-31"})
+    upsert_program(event)
+    upsert_program({"program_key": "support:2", "kind": "support", "source": "bizinfo", "seq": "2", "title": "Legacy dict"})
+
+    rows = {p.program_key: p for p in list_open_programs()}
+    assert isinstance(rows["event:E1"], Program)
+    assert rows["event:E1"].apply_end_at == "2099-01-31"
+    assert rows["event:E1"].raw_item is None  # lazy column, not read for lists
+    assert rows["support:2"].title == "Legacy dict"
+    assert [p.program_key for p in list_open_programs(kind="event")] == ["event:E1"]
+
+def test_program_smaller_than_dict():
+    values = [f"value-{i}" for i in range(len(PROGRAM_COLUMNS))]
+    p = Program._make(values)
+    assert sys.getsizeof(p) * 2 < sys.getsizeof(dict(zip(PROGRAM_COLUMNS, values)))
@@ -0,0 +1,82 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import src.db as db
+from src.db import init_db, upsert_program, get_preference_weights, get_connection
+from src.filters import calculate_score, preference_features, PREFERENCE_POINTS
+from src.models import Program
+from src import hot_set, preferences
+from src.state_snapshot import empty_snapshot, dump_tables, restore_tables
+
+PROFILE = {"interests": "[]", "include_keywords": "[]", "region_allow": "[]", "due_days_threshold": 7}
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_preferences", {})
+    init_db()
+    return tmp_path
+
+def _program(seq, title, agency):
+    return Program(program_key=f"support:{seq}", kind="support", seq=seq, title=title, agency=agency)
+
+def test_saves_and_dismisses_shift_scores(temp_db):
+    liked = _program("1", "AI 바우처", "정보통신산업진흥원")
+    disliked = _program("2", "농업 융자", "농림축산식품부")
+    upsert_program(liked)
+    upsert_program(disliked)
+    assert get_preference_weights() is None
+
+    for _ in range(3):
+        preferences.learn("support:1", "saved")
+        preferences.learn("support:2", "dismissed")
+    weights = get_preference_weights()
+
+    # A new posting from the same agency is lifted, with the reason named
+    similar = _program("3", "데이터 바우처", "정보통신산업진흥원")
+    score, reasons = calculate_score(similar, PROFILE, preferences=weights)
+    assert score > 5
+    assert any(r.startswith("저장 이력 반영(") for r in reasons)
+
+    score, reasons = calculate_score(_program("4", "농업 융자 2차", "농림축산식품부"), PROFILE, preferences=weights)
+    assert score == 0 # 5 base minus the learned penalty, clamped
+    assert any(r.startswith("제외 이력 반영(") for r in reasons)
+
+    row = get_connection().execute("SELECT updates FROM preference_model").fetchone()
+    assert row[0] == 6
+
+def test_concurrent_actions_are_all_learned(temp_db):
+    upsert_program(_program("1", "AI 바우처", "기관"))
+    ranked_with = hot_set.preference_weights()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: preferences.learn("support:1", "saved"), range(16)))
+
+    expected = preferences.empty_weights()
+    for _ in range(16):
+        preferences.update(expected, preference_features(_program("1", "AI 바우처", "기관")), 1.0)
+    assert hot_set.preference_weights() == expected == get_preference_weights()
+    assert ranked_with is None  # readers keep what they got; updates swap in a new array
+    assert get_connection().execute("SELECT updates FROM preference_model").fetchone()[0] == 16
+
+def test_update_touches_only_program_features():
+    weights = preferences.empty_weights()
+    features = preference_features(_program("1", "AI 바우처", "기관"))
+    preferences.update(weights, features, 1.0)
+    assert {i for i, w in enumerate(weights) if w} == set(features)
+
+def test_unknown_program_or_action_is_ignored(temp_db):
+    assert preferences.learn("support:404", "saved") is None
+    assert preferences.learn("support:404", "opened") is None
+    assert get_preference_weights() is None
+
+def test_weights_survive_snapshot(temp_db, monkeypatch):
+    upsert_program(_program("1", "AI 바우처", "기관"))
+    weights = preferences.learn("support:1", "saved")
+    snapshot = empty_snapshot()
+    dump_tables(snapshot)
+    json.dumps(snapshot)  # BLOBs are encoded
+
+    monkeypatch.setattr(db, "DB_PATH", str(temp_db / "fresh.db"))
+    init_db()
+    restore_tables(json.loads(json.dumps(snapshot)))
+    assert get_preference_weights() == weights
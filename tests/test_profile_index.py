@@ -0,0 +1,128 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from datetime import datetime
+import pytest
+import src.db as db
+from src import hot_set, profile_index, scheduler, telegram_bot
+from src.db import (
+    init_db, upsert_program, update_profile, get_profile_for_chat, get_profile, list_matched_programs,
+    record_user_action, get_dismissed_keys, get_connection
+)
+from src.models import Program
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    init_db()
+
+def _profile(pid, interests, min_score=60):
+    return {"id": pid, "interests": json.dumps(interests, ensure_ascii=False), "include_keywords": "[]",
+            "min_score": min_score}
+
+def _program(seq, title):
+    return Program(program_key=f"support:{seq}", kind="support", seq=seq, title=title,
+                   ingested_at=datetime.now().isoformat())
+
+def test_candidates_are_only_matching_profiles():
+    index = profile_index.build([_profile(1, ["AI"]), _profile(2, ["수출"]), _profile(3, ["바이오"]),
+                                 _profile(4, []), _profile(5, ["AI"], min_score=20)])
+    assert index.always == {4, 5}
+    # Substring hits, like scoring: "수출" inside "수출바우처"
+    assert profile_index.candidates(index, "AI 수출바우처 지원") == {1, 2, 4, 5}
+    assert profile_index.candidates(index, "경영안정 자금") == {4, 5}
+
+def test_new_chat_gets_copy_of_owner_profile(temp_db):
+    update_profile({"interests": json.dumps(["AI"]), "min_score": 70})
+    profile = get_profile_for_chat("555")
+    assert profile["id"] != 1 and profile["chat_id"] == "555"
+    assert (profile["interests"], profile["min_score"]) == (json.dumps(["AI"]), 70)
+    assert get_profile_for_chat("555")["id"] == profile["id"]
+    assert get_profile_for_chat("666", create=False) is None
+
+def test_programs_fan_out_to_matching_profiles(temp_db):
+    update_profile({"interests": json.dumps(["AI"]), "min_score": 60})
+    other = get_profile_for_chat("555")
+    update_profile({"interests": json.dumps(["수출"])}, other["id"])
+
+    upsert_program(_program("1", "AI 바우처"))
+    upsert_program(_program("2", "수출 상담회"))
+    assert [p.program_key for p in list_matched_programs(1, "")] == ["support:1"]
+    assert [p.program_key for p in list_matched_programs(other["id"], "")] == ["support:2"]
+
+    # A re-worded posting moves to the other profile
+    upsert_program(_program("1", "수출 AI"))
+    assert {p.program_key for p in list_matched_programs(other["id"], "")} == {"support:1", "support:2"}
+
+def test_profile_edit_rematches_recent_programs(temp_db):
+    update_profile({"interests": json.dumps(["AI"]), "min_score": 60})
+    upsert_program(_program("1", "수출 상담회"))
+    assert list_matched_programs(1, "") == []
+    update_profile({"interests": json.dumps(["수출"])})
+    assert [p.program_key for p in list_matched_programs(1, "")] == ["support:1"]
+
+def test_new_chat_is_matched_and_scheduled_right_away(temp_db, monkeypatch):
+    update_profile({"interests": json.dumps(["AI"]), "min_score": 60})
+    upsert_program(_program("1", "AI 바우처"))
+    scheduled = []
+    monkeypatch.setattr(telegram_bot, "ALLOWED_CHAT_IDS", {"555"})
+    monkeypatch.setattr(telegram_bot, "_reschedule_digest", scheduled.append)
+
+    class Chat:
+        id = 555
+    class Update:
+        effective_chat = Chat
+
+    created_in = []
+    def get_profile_for_chat(chat_id, create=True):
+        if create:
+            created_in.append(threading.current_thread() is threading.main_thread())
+        return db.get_profile_for_chat(chat_id, create)
+    monkeypatch.setattr(telegram_bot, "get_profile_for_chat", get_profile_for_chat)
+
+    profile = asyncio.run(telegram_bot.chat_profile(Update))
+    assert created_in == [False]  # created (and matched) in a worker thread
+    assert [p.program_key for p in list_matched_programs(profile["id"], "")] == ["support:1"]
+    assert scheduled == [profile["id"]]
+
+    # Known chats are answered from memory: no connection, no second schedule
+    monkeypatch.setattr(db, "get_connection", None)
+    assert asyncio.run(telegram_bot.chat_profile(Update))["id"] == profile["id"]
+    assert scheduled == [profile["id"]]
+
+def test_removed_chats_get_no_digest_job(temp_db, monkeypatch):
+    kept, removed = get_profile_for_chat("555"), get_profile_for_chat("666")
+    monkeypatch.setattr(telegram_bot, "ALLOWED_CHAT_IDS", {"555"})
+    assert [p["id"] for p in scheduler.digest_profiles()] == [1, kept["id"]]
+
+def test_actions_are_per_profile(temp_db):
+    upsert_program(_program("1", "AI 바우처"))
+    other = get_profile_for_chat("555")
+    record_user_action("support:1", "dismissed", other["id"])
+    assert get_dismissed_keys() == set()
+    assert get_dismissed_keys(other["id"]) == {"support:1"}
+    assert [ap.program.program_key for ap in hot_set.iter_active()] == ["support:1"]
+    assert list(hot_set.iter_active(profile_id=other["id"])) == []
+
+def test_single_profile_tables_are_migrated(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE company_profile (id INTEGER PRIMARY KEY CHECK (id = 1), region_allow TEXT, "
+                 "interests TEXT, include_keywords TEXT, exclude_keywords TEXT, min_score INTEGER DEFAULT 60, "
+                 "notify_enabled INTEGER DEFAULT 1, notify_time_kst TEXT DEFAULT '08:30', due_days_threshold INTEGER DEFAULT 7)")
+    conn.execute("INSERT INTO company_profile (id, interests, min_score) VALUES (1, '[\"AI\"]', 55)")
+    conn.execute("CREATE TABLE user_actions (program_key TEXT, action TEXT, created_at TEXT, UNIQUE(program_key, action))")
+    conn.execute("INSERT INTO user_actions VALUES ('support:1', 'saved', '2024-01-01')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", str(path))
+    monkeypatch.setenv("TELEGRAM_ALLOWED_CHAT_ID", "42")
+    init_db()
+    assert (get_profile()["min_score"], get_profile()["chat_id"]) == (55, "42")
+    assert get_profile_for_chat("42", create=False)["id"] == 1
+    conn = get_connection()
+    assert conn.execute("SELECT profile_id FROM user_actions").fetchall()[0][0] == 1
+    conn.close()
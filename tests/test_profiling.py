@@ -0,0 +1,44 @@
+import asyncio
+import os
+import time
+from collections import Counter
+import pytest
+import src.db as db
+from src import fetch_policy, metrics, profiling
+
+@pytest.fixture
+def armed(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(profiling, "_armed", {"handler": [0, None], "job": [0, None]})
+
+def test_top_functions_counts_each_frame_once_per_stack():
+    stacks = Counter({"main;loop;score;score": 3, "main;loop;fetch": 1})
+    top = profiling.top_functions(stacks)
+    assert set(top) == {("main", 4, 0), ("loop", 4, 0), ("score", 3, 3), ("fetch", 1, 1)}
+    assert top[-1][0] == "fetch"
+
+def test_next_job_is_profiled_including_thread_work(armed, tmp_path):
+    reports = []
+    async def report(text):
+        reports.append(text)
+
+    @metrics.instrument()
+    async def slow_job():
+        # Package code running in a worker thread, as ingestion does
+        await asyncio.to_thread(fetch_policy.call, lambda timeout: time.sleep(0.1), fetch_policy.Policy(), float("inf"))
+
+    profiling.arm("job", 1, report)
+    asyncio.run(slow_job())
+    asyncio.run(slow_job())  # only one call was armed
+
+    assert len(reports) == 1 and reports[0].startswith("🔬 job:slow_job")
+    assert "call (src/fetch_policy.py" in reports[0]
+    files = os.listdir(tmp_path / "profiles")
+    assert len(files) == 1 and files[0].endswith("job_slow_job.folded")
+    line = open(tmp_path / "profiles" / files[0], encoding="utf-8").readline()
+    stack, count = line.rsplit(" ", 1)
+    assert "call (src/fetch_policy.py" in stack and int(count) > 0
+    # Metrics are still recorded for profiled calls
+    assert metrics.snapshot()[("bot_latency_seconds", "job", "slow_job")].count == 2
+    assert profiling.take("handler") == (False, None)
@@ -0,0 +1,46 @@
+import pytest
+import src.db as db
+from src.db import init_db, get_connection, upsert_program, list_program_changes
+from src.models import Program
+from src.telegram_bot import format_changes
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+
+def _program(**kw):
+    base = dict(program_key="support:1", kind="support", seq="1", title="AI 바우처",
+                summary_raw="요약", apply_end_at="2030-01-10", ingested_at="2030-01-01T09:00:00")
+    base.update(kw)
+    return Program(**base)
+
+def test_deadline_extension_is_recorded_per_field(temp_db):
+    assert upsert_program(_program()) == "inserted"
+    assert upsert_program(_program(apply_end_at="2030-01-31", ingested_at="2030-01-02T09:00:00")) == "updated"
+
+    changes = list_program_changes("2030-01-01")
+    assert [(c["field"], c["old_value"], c["new_value"]) for c in changes] == [("apply_end_at", "2030-01-10", "2030-01-31")]
+    assert changes[0]["changed_at"] == "2030-01-02T09:00:00"
+    assert list_program_changes("2030-01-03") == []
+
+    text = format_changes(changes, 7)
+    assert "AI 바우처" in text and "마감: 2030-01-10 → 2030-01-31" in text
+
+def test_unchanged_rows_are_not_written(temp_db):
+    upsert_program(_program())
+    assert upsert_program(_program(ingested_at="2030-01-05T09:00:00")) == "unchanged"
+    row = get_connection().execute("SELECT ingested_at FROM programs").fetchone()
+    assert row[0] == "2030-01-01T09:00:00"
+    assert list_program_changes("2000-01-01") == []
+
+def test_rows_without_field_hashes_compare_values(temp_db):
+    upsert_program(_program())
+    conn = get_connection()
+    conn.execute("UPDATE programs SET field_hashes = NULL")
+    conn.commit()
+    conn.close()
+
+    assert upsert_program(_program()) == "unchanged"
+    assert upsert_program(_program(title="AI 바우처 (연장)")) == "updated"
+    assert [c["field"] for c in list_program_changes("2000-01-01")] == ["title"]
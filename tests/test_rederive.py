@@ -0,0 +1,66 @@
+import pytest
+import src.db as db
+from src.db import init_db, get_connection, upsert_program
+from src.normalizer import normalize_support, unpack_raw_item
+from src.rederive import rederive
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+
+def test_raw_item_roundtrip():
+    item = {"pblancId": "PBLN_1", "pblancNm": "AI 바우처", "reqstBeginEndDe": "20240301 ~ 20240315"}
+    norm = normalize_support(item)
+    assert unpack_raw_item(norm["raw_item"]) == item
+
+def test_rederive_updates_only_changed(temp_db):
+    for i in range(5):
+        item = {"pblancId": f"P{i}", "pblancNm": f"Program {i}", "reqstBeginEndDe": "20240301 ~ 20240315"}
+        upsert_program(normalize_support(item))
+
+    # Simulate rows derived by an older parser
+    conn = get_connection()
+    conn.execute("UPDATE programs SET apply_end_at=NULL WHERE program_key IN ('support:P1', 'support:P3')")
+    conn.commit()
+    conn.close()
+
+    stats = rederive(chunk_size=2, workers=1)
+    assert stats == {"scanned": 5, "changed": 2}
+
+    conn = get_connection()
+    ends = {r[0] for r in conn.execute("SELECT apply_end_at FROM programs")}
+    conn.close()
+    assert ends == {"2024-03-15"}
+
+    assert rederive(chunk_size=2, workers=2)["changed"] == 0
+
+def test_summary_stored_as_plain_text():
+    html = "<div class='x'>\n<p>AI&nbsp;바우처 <b>지원</b></p><script>var a=1;</script>\n\n<p>모집</p></div>"
+    norm = normalize_support({"pblancId": "P9", "pblancNm": "t", "pblancCn": html})
+    assert norm.summary_raw == "AI 바우처 지원 모집"
+    # The original markup is kept only in the compressed raw item
+    assert unpack_raw_item(norm.raw_item)["pblancCn"] == html
+
+def test_rederived_rows_go_through_the_update_hooks(temp_db):
+    import json
+    from src.db import get_program_terms, list_matched_programs, list_program_changes, update_profile
+    update_profile({"interests": json.dumps(["AI"])})
+    item = {"pblancId": "P1", "pblancNm": "AI 바우처", "reqstBeginEndDe": "20240301 ~ 20240315"}
+    upsert_program(normalize_support(item))
+
+    # Stored by an older normalizer: another title, no match, stale terms
+    conn = get_connection()
+    conn.execute("UPDATE programs SET title='바우처' WHERE program_key='support:P1'")
+    conn.execute("DELETE FROM profile_matches")
+    conn.execute("DELETE FROM program_terms WHERE term='ai'")
+    conn.commit()
+    conn.close()
+
+    assert rederive(workers=1)["changed"] == 1
+    assert [(c["field"], c["old_value"], c["new_value"]) for c in list_program_changes("")] == \
+        [("title", "바우처", "AI 바우처")]
+    assert get_program_terms(["support:P1"])["support:P1"][0]["ai"] == 1
+    assert [p.program_key for p in list_matched_programs(1, "")] == ["support:P1"]
+    # Hashes are in step: the next ingest of the same item changes nothing
+    assert upsert_program(normalize_support(item)) == "unchanged"
@@ -0,0 +1,92 @@
+import json
+from datetime import datetime
+import pytest
+import src.db as db
+from src import regions
+from src.db import init_db, upsert_program, update_profile, get_programs, get_profile_for_chat, list_matched_programs
+from src.filters import is_recommended, check_region, build_features
+from src.models import Program
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+
+def _program(seq, title, region_raw=None, agency=None):
+    return Program(program_key=f"support:{seq}", kind="support", seq=seq, title=title,
+                   region_raw=region_raw, agency=agency, ingested_at=datetime.now().isoformat())
+
+def _allow(*names):
+    return {"region_allow": json.dumps(list(names), ensure_ascii=False), "min_score": 0}
+
+def test_aliases_and_sources():
+    seoul, gyeonggi = regions.resolve("서울"), regions.resolve("경기")
+    assert regions.resolve("서울특별시 강남구") == regions.resolve("SBA") == seoul
+    assert regions.resolve("경상남도") == regions.resolve("경남")
+    assert regions.resolve("기술보증기금") == 0
+    # The title tag wins over the (ministry) region_raw, agency is the last resort
+    assert regions.program_mask(_program("1", "[경기] 스마트공장 지원", "중소벤처기업부")) == gyeonggi
+    assert regions.program_mask(_program("2", "스마트공장 지원", None, "서울경제진흥원")) == seoul
+    assert regions.names(seoul | gyeonggi) == ["서울", "경기"]
+
+def test_region_hard_filter():
+    busan = _program("1", "수출 지원", "부산광역시")
+    assert check_region(busan, _allow("서울", "경기"))
+    assert not check_region(busan, _allow("부산"))
+    assert not check_region(busan, _allow("전국"))
+    assert not check_region(busan, _allow())
+    # Unrecognized or nationwide postings are never excluded
+    assert not check_region(_program("2", "수출 지원", "중소벤처기업부"), _allow("서울"))
+    assert not check_region(_program("3", "[전국] 수출 지원"), _allow("서울"))
+
+    seoul = _program("4", "수출 지원", "서울특별시")
+    rec, _, reasons = is_recommended(seoul, _allow("서울"), build_features(seoul))
+    assert rec and "지역 조건 충족(서울)" in reasons
+    assert is_recommended(busan, _allow("서울"), build_features(busan))[0] is False
+
+def test_mask_stored_at_upsert_and_pushed_into_matching(temp_db):
+    update_profile({"region_allow": json.dumps(["서울"])})
+    other = get_profile_for_chat("555")
+    update_profile({"region_allow": json.dumps(["부산"])}, other["id"])
+
+    upsert_program(_program("1", "수출 지원", "부산광역시"))
+    upsert_program(_program("2", "수출 지원", "중소벤처기업부"))
+    assert [p.region_mask for p in get_programs(["support:1", "support:2"])] == [regions.resolve("부산"), 0]
+    assert [p.program_key for p in list_matched_programs(1, "")] == ["support:2"]
+    assert [p.program_key for p in list_matched_programs(other["id"], "")] == ["support:1", "support:2"]
+
+    # Re-tagged posting moves; a profile edit re-matches in SQL
+    upsert_program(_program("1", "[서울] 수출 지원", "부산광역시"))
+    assert {p.program_key for p in list_matched_programs(1, "")} == {"support:1", "support:2"}
+    update_profile({"region_allow": json.dumps(["부산"])})
+    assert [p.program_key for p in list_matched_programs(1, "")] == ["support:2"]
+
+def test_latin_hints_match_whole_tokens_only():
+    seoul = regions.resolve("서울")
+    assert regions.resolve("SBA(서울경제진흥원) 모집") == regions.resolve("sba 지원") == seoul
+    assert regions.resolve("GBSA") == regions.resolve("경기")
+    # Not inside other words or URLs
+    assert regions.resolve("USBAnk 협력사") == 0
+    assert regions.resolve("https://www.sba.kr/notice") == 0
+    assert regions.resolve("gbsa.or.kr 공고") == 0
+
+def test_same_name_city_counts_for_its_province():
+    gyeonggi, gwangju = regions.resolve("경기"), regions.resolve("광주")
+    assert regions.resolve("경기 광주시") == regions.resolve("경기도광주시 오포읍") == gyeonggi
+    assert regions.resolve("광주광역시") == regions.resolve("광주시") == gwangju
+    assert regions.resolve("경기도 광주시, 광주광역시") == gyeonggi | gwangju
+    # A 경기 광주시 posting isn't excluded for 경기, and is for 광주
+    posting = _program("1", "[경기 광주시] 소상공인 지원")
+    assert not check_region(posting, _allow("경기"))
+    assert check_region(posting, _allow("광주"))
+
+def test_masks_re_resolved_on_schema_upgrade(temp_db):
+    upsert_program(_program("1", "[경기 광주시] 소상공인 지원"))
+    conn = db.get_connection()
+    conn.execute("UPDATE programs SET region_mask=? WHERE program_key='support:1'",
+                 (regions.resolve("경기") | regions.resolve("광주"),))
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+    conn.close()
+    init_db()
+    assert get_programs(["support:1"])[0].region_mask == regions.resolve("경기")
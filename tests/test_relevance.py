@@ -0,0 +1,110 @@
+import json
+import math
+import pytest
+import src.db as db
+import src.filters as filters
+from src import hot_set
+from src.db import get_program_terms, init_db, upsert_program
+from src.filters import Corpus, calculate_score, build_features, tokenize
+from src.models import Program
+
+BOILERPLATE = "본 사업은 중소기업의 경영 안정과 성장을 위해 자금과 컨설팅을 지원합니다. " * 5
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(filters, "RELEVANCE_SCORING", "bm25")
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    init_db()
+
+def get_relevance_stats(profile):
+    hot_set.load()  # as after an ingestion commit
+    return hot_set.get_relevance_stats(profile)
+
+def _program(seq, title, summary):
+    return Program(program_key=f"support:{seq}", kind="support", seq=seq, title=title, summary_raw=summary)
+
+PROFILE = {"interests": json.dumps(["AI"]), "include_keywords": "[]", "region_allow": "[]", "due_days_threshold": 7}
+
+def test_tokenize_splits_scripts():
+    assert tokenize("AI바우처를 지원, 2024년") == ["ai", "바우처를", "지원", "2024", "년"]
+
+def test_focused_posting_outranks_passing_mention(temp_db):
+    focused = _program("1", "AI 바우처 지원사업", "AI 솔루션 도입 기업에 AI 바우처를 지원합니다.")
+    mention = _program("2", "경영안정 자금 지원", BOILERPLATE + "(AI 분야 포함)")
+    upsert_program(focused)
+    upsert_program(mention)
+    for i in range(3, 33):
+        upsert_program(_program(str(i), f"수출 지원 {i}", BOILERPLATE))
+
+    stats = get_relevance_stats(PROFILE)
+    focused_score, focused_reasons = calculate_score(focused, PROFILE, build_features(focused), stats)
+    mention_score, _ = calculate_score(mention, PROFILE, build_features(mention), stats)
+
+    assert focused_score == 30 # base 5 + full 25
+    assert focused_reasons == ["관심분야 일치(관련도 100%)"]
+    assert 5 < mention_score < focused_score
+
+    # Without stats the flat bonus applies to both
+    assert calculate_score(mention, PROFILE)[0] == 30
+
+def _doc(terms):
+    return build_features(_program("0", "", ""), terms)
+
+def test_corpus_matches_query_prefixes():
+    corpus = Corpus({"a": _doc({"바우처를": 1, "지원": 1}), "b": _doc({"바우처": 2, "ai": 1, "aix": 1}),
+                     "c": _doc({"수출": 2})})
+    assert corpus.n_docs == 3 and corpus.avgdl == pytest.approx(8 / 3)
+    assert corpus.df("바우처") == 2 and corpus.df("ai") == 1 and corpus.df("r") == 0
+    assert corpus.stats({"ai"}).expansions == {"ai": ("ai", "aix")}
+
+    # Diff updates: replace one document, drop another
+    corpus.update(["c"], {"b": _doc({"수출": 1})})
+    assert corpus.n_docs == 2 and corpus.avgdl == pytest.approx(3 / 2)
+    assert corpus.df("ai") == 0 and corpus.df("수출") == 1 and corpus.df("바우처") == 1
+    assert corpus._terms == ["바우처를", "수출", "지원"]
+
+def test_term_index_kept_at_upsert(temp_db):
+    upsert_program(_program("1", "AI 바우처", "AI 요약"))
+    assert get_program_terms(["support:1", "support:9"]) == {"support:1": ({"ai": 2, "바우처": 1, "요약": 1}, 4)}
+    upsert_program(_program("1", "수출 바우처", "AI 요약"))
+    assert get_program_terms(["support:1"])["support:1"] == ({"수출": 1, "바우처": 1, "ai": 1, "요약": 1}, 4)
+
+def test_reload_updates_corpus_by_diff(temp_db):
+    upsert_program(_program("1", "AI 바우처", "요약"))
+    upsert_program(_program("2", "수출 지원", "요약"))
+    first = {ap.program.program_key: ap for ap in hot_set.load().programs}
+    upsert_program(_program("2", "AI 수출 지원", "요약"))
+    second = hot_set.load()
+    by_key = {ap.program.program_key: ap for ap in second.programs}
+    # The unchanged posting is carried over as is, the changed one re-read from the index
+    assert by_key["support:1"] is first["support:1"]
+    assert by_key["support:2"].features.terms == {"ai": 1, "수출": 1, "지원": 1, "요약": 1}
+    assert second.corpus is hot_set.get().corpus and second.corpus.df("ai") == 2
+
+def test_corpus_follows_updates(temp_db):
+    upsert_program(_program("1", "AI 바우처", "요약"))
+    upsert_program(_program("1", "수출 바우처", "요약"))
+    # No document has "ai" any more: maximal idf for a one-document corpus
+    stats = get_relevance_stats(PROFILE)
+    assert stats.idf["ai"] == pytest.approx(math.log(1 + 1.5 / 0.5)) and stats.avgdl == 3
+    # save/dismiss swap the snapshot without touching the statistics
+    corpus = hot_set.get().corpus
+    hot_set.apply_action("support:1", "saved")
+    assert hot_set.get().corpus is corpus and corpus.n_docs == 1
+
+def test_scoring_off_by_default(temp_db, monkeypatch):
+    monkeypatch.setattr(filters, "RELEVANCE_SCORING", "")
+    upsert_program(_program("1", "AI 바우처", "요약"))
+    assert get_relevance_stats(PROFILE) is None
+
+def test_databases_from_before_the_term_index_are_backfilled(temp_db):
+    upsert_program(_program("1", "AI 바우처", "요약"))
+    conn = db.get_connection()
+    conn.execute("DROP TABLE program_terms")
+    conn.execute("UPDATE programs SET doc_len=NULL")
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+    init_db()
+    assert get_program_terms(["support:1"]) == {"support:1": ({"ai": 1, "바우처": 1, "요약": 1}, 3)}
@@ -0,0 +1,31 @@
+import pytest
+import src.db as db
+from src import hot_set, response_cache
+from src.db import init_db, get_profile, update_profile
+from src.response_cache import ResponseCache, make_key
+
+def test_lru_eviction_and_counters():
+    cache = ResponseCache(max_entries=2, max_chars=100)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    assert cache.get("a") == "x" * 10  # "b" is now least recently used
+    cache.put("c", "z" * 10)
+    assert cache.get("b") is None
+    cache.put("d", "w" * 95)  # over the char budget: evicts until it fits
+    assert cache.stats()["entries"] == 1
+    assert cache.hits == 1 and cache.misses == 1
+
+def test_key_tracks_profile_and_data_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    init_db()
+
+    key = make_key("list", (None, False, 10), get_profile())
+    assert key == make_key("list", (None, False, 10), get_profile())
+
+    hot_set.apply_action("support:1", "saved")
+    after_action = make_key("list", (None, False, 10), get_profile())
+    assert after_action != key
+
+    update_profile({"min_score": 10})
+    assert make_key("list", (None, False, 10), get_profile()) != after_action
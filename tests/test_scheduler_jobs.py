@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+import pytest
+import src.db as db
+from src import scheduler as sched
+from src.db import init_db, get_profile, mark_job_run
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+
+def test_missed_digest_detected_once(temp_db):
+    profile = dict(get_profile(), notify_enabled=1, notify_time_kst="08:30")
+    now = sched.kst.localize(datetime(2024, 3, 5, 10, 0))
+
+    # No baseline yet: a first start never catches up
+    assert not sched._missed_digest(profile, now)
+
+    mark_job_run(sched.DIGEST_JOB_ID, (now - timedelta(days=1)).isoformat())
+    assert sched._missed_digest(profile, now)
+
+    mark_job_run(sched.DIGEST_JOB_ID, now.replace(hour=8, minute=30).isoformat())
+    assert not sched._missed_digest(profile, now)
+    assert not sched._missed_digest(dict(profile, notify_enabled=0), now)
+
+def test_reschedule_follows_profile(temp_db, monkeypatch):
+    monkeypatch.setattr(sched, "_bot_app", object())
+    profile = dict(get_profile(), notify_enabled=1, notify_time_kst="07:15")
+    try:
+        sched.reschedule_digest(profile)
+        trigger = sched.scheduler.get_job(sched.DIGEST_JOB_ID).trigger
+        assert str(trigger.fields[5]) == "7" and str(trigger.fields[6]) == "15"
+
+        sched.reschedule_digest(dict(profile, notify_time_kst="25:00"))  # invalid: keep
+        assert sched.scheduler.get_job(sched.DIGEST_JOB_ID) is not None
+
+        sched.reschedule_digest(dict(profile, notify_enabled=0))
+        assert sched.scheduler.get_job(sched.DIGEST_JOB_ID) is None
+    finally:
+        sched.scheduler.remove_all_jobs()
+
+def test_muted_fire_times_are_not_caught_up(temp_db, monkeypatch):
+    monkeypatch.setattr(sched, "_bot_app", object())
+    profile = dict(get_profile(), notify_time_kst="00:00")
+    mark_job_run(sched.DIGEST_JOB_ID, (datetime.now(sched.kst) - timedelta(days=3)).isoformat())
+    try:
+        # Muted at runtime, then unmuted: the digests skipped meanwhile are handled
+        sched.reschedule_digest(dict(profile, notify_enabled=0))
+        sched.reschedule_digest(dict(profile, notify_enabled=1))
+        assert not sched._missed_digest(dict(profile, notify_enabled=1), datetime.now(sched.kst))
+
+        # A startup reschedule leaves job_runs alone, so real misses are still caught up
+        mark_job_run(sched.DIGEST_JOB_ID, (datetime.now(sched.kst) - timedelta(days=3)).isoformat())
+        sched.scheduler.remove_all_jobs()
+        sched.reschedule_digest(dict(profile, notify_enabled=1), startup=True)
+        assert sched._missed_digest(dict(profile, notify_enabled=1), datetime.now(sched.kst))
+    finally:
+        sched.scheduler.remove_all_jobs()
+
+def test_failed_digest_send_is_caught_up(temp_db, monkeypatch):
+    import asyncio
+    profile = dict(get_profile(), notify_enabled=1, notify_time_kst="00:00")
+    monkeypatch.setenv("TELEGRAM_ALLOWED_CHAT_ID", "1")
+    monkeypatch.setattr(sched, "get_digest_text", lambda p: ("digest", True, {}))
+    yesterday = (datetime.now(sched.kst) - timedelta(days=1, minutes=1)).isoformat()
+    mark_job_run(sched.DIGEST_JOB_ID, yesterday)
+
+    class Bot:
+        fail = True
+        async def send_message(self, chat_id, text):
+            if self.fail:
+                raise RuntimeError("network down")
+    app = type("App", (), {"bot": Bot()})()
+    asyncio.run(sched.run_digest_job(app))
+    assert sched.get_job_run(sched.DIGEST_JOB_ID) == yesterday
+    assert sched._missed_digest(profile, datetime.now(sched.kst))
+
+    app.bot.fail = False
+    asyncio.run(sched.run_digest_job(app))
+    assert not sched._missed_digest(profile, datetime.now(sched.kst))
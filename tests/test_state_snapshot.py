@@ -0,0 +1,117 @@
+import json
+import pytest
+import src.db as db
+from src.db import (
+    init_db, get_connection, get_profile, update_profile, record_user_action, get_dismissed_keys, get_notified,
+    upsert_program
+)
+from src.digest import compute_due_reminders
+from src.state_snapshot import PUSH_CHANNEL, empty_snapshot, load_snapshot, save_snapshot, dump_tables, restore_tables
+from src.actions import parse_action_command, parse_open_command
+from src.models import Program, content_hash
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    init_db()
+    return tmp_path
+
+def test_snapshot_round_trip_restores_state(temp_db, monkeypatch):
+    update_profile({"interests": json.dumps(["AI"]), "min_score": 40})
+    record_user_action("support:1", "dismissed")
+    snapshot = empty_snapshot()
+    snapshot["programs"]["support:1"] = ["abc", "2099-01-01"]
+    snapshot["telegram_offset"] = 42
+    dump_tables(snapshot)
+    path = str(temp_db / "state.json.gz")
+    save_snapshot(snapshot, path)
+
+    # Next CI run: a brand new DB
+    monkeypatch.setattr(db, "DB_PATH", str(temp_db / "fresh.db"))
+    init_db()
+    restored = load_snapshot(path)
+    restore_tables(restored)
+
+    assert restored["programs"] == {"support:1": ["abc", "2099-01-01"]}
+    assert restored["telegram_offset"] == 42
+    assert get_profile()["min_score"] == 40
+    assert get_dismissed_keys() == {"support:1"}
+
+def test_save_prunes_programs_not_seen_for_long(temp_db):
+    snapshot = empty_snapshot()
+    snapshot["programs"] = {"support:old": ["a", "2000-01-01"], "support:new": ["b", "2099-01-01"]}
+    path = str(temp_db / "state.json.gz")
+    save_snapshot(snapshot, path)
+    restored = load_snapshot(path)
+    assert set(restored["programs"]) == {"support:new"}
+
+def test_missing_or_corrupt_snapshot_starts_fresh(temp_db):
+    assert load_snapshot(str(temp_db / "missing.gz")) == empty_snapshot()
+    bad = temp_db / "bad.gz"
+    bad.write_bytes(b"not gzip")
+    assert load_snapshot(str(bad)) == empty_snapshot()
+
+def test_restore_ignores_columns_dropped_from_schema(temp_db):
+    snapshot = {"tables": {"user_actions": {
+        "columns": ["program_key", "action", "created_at", "gone"],
+        "rows": [["event:9", "saved", "2024-01-01T00:00:00", 1]],
+    }}}
+    restore_tables(snapshot)
+    row = get_connection().execute("SELECT action FROM user_actions WHERE program_key='event:9'").fetchone()
+    assert row["action"] == "saved"
+
+def test_content_hash_tracks_content_not_ingest_time():
+    a = Program(program_key="support:1", kind="support", title="A", ingested_at="2024-01-01")
+    assert content_hash(a) == content_hash(a._replace(ingested_at="2024-02-01"))
+    assert content_hash(a) != content_hash(a._replace(apply_end_at="2024-03-01"))
+
+def test_parse_action_command():
+    assert parse_action_command("/save_support_123") == ("saved", "support:123")
+    assert parse_action_command("/dismiss event:ABC") == ("dismissed", "event:ABC")
+    assert parse_action_command("hello") is None
+    assert parse_action_command("/save_support_123@fake_bot") == ("saved", "support:123")
+    # Ordinary chat text is never an action, and never raises
+    for text in ("saved it", "unsave x", "/saved", "/save", "/dismiss_", "   ", "", None):
+        assert parse_action_command(text) is None
+
+def test_parse_open_command():
+    assert parse_open_command("/open_support_123") == "support:123"
+    assert parse_open_command("/open_event_A_B@fake_bot") == "event:A_B"
+    for text in ("/open", "/open_", "/opened", "open_support_1", None):
+        assert parse_open_command(text) is None
+
+def test_push_is_chunked_on_item_boundaries():
+    from src.run_once import chunk_blocks
+    a, b, c = (Program(program_key=f"support:{i}", kind="support") for i in range(3))
+    blocks = [("head\n", None, None), ("x" * 50, "push", a), ("y" * 50, "push", b), ("z" * 30, "due", c)]
+    chunks = chunk_blocks(blocks, limit=100)
+    assert [len(text) for text, _ in chunks] == [55, 80]
+    assert [[p.program_key for _, p in sent] for _, sent in chunks] == [["support:0"], ["support:1", "support:2"]]
+    # Every item is in exactly one chunk, so each is recorded only once it went out
+    assert chunk_blocks([("w" * 150, "push", a)], limit=100)[0][0] == "w" * 100
+
+def test_saved_posting_is_reminded_when_not_fetched_this_run(temp_db, monkeypatch):
+    from datetime import date, timedelta
+    end = (date.today() + timedelta(days=3)).isoformat()
+    upsert_program(Program(program_key="event:7", kind="event", seq="7", title="수출 상담회",
+                           url="https://example.com/7", apply_end_at=end))
+    upsert_program(Program(program_key="event:8", kind="event", seq="8", title="지난 상담회",
+                           apply_end_at="2000-01-01"))
+    upsert_program(Program(program_key="event:9", kind="event", seq="9", title="저장 안 한 상담회",
+                           apply_end_at=end))
+    record_user_action("event:7", "saved")
+    record_user_action("event:8", "saved")
+    snapshot = empty_snapshot()
+    dump_tables(snapshot)
+    path = str(temp_db / "state.json.gz")
+    save_snapshot(snapshot, path)
+
+    # Next run: the feed is skipped or unchanged, so nothing is upserted
+    monkeypatch.setattr(db, "DB_PATH", str(temp_db / "fresh.db"))
+    init_db()
+    restore_tables(load_snapshot(path))
+
+    assert [row[0] for row in get_connection().execute("SELECT program_key FROM programs")] == ["event:7"]
+    due = compute_due_reminders(get_profile(), date.today())
+    assert [(p.program_key, p.title, p.url, p.apply_end_at) for p in due] == \
+        [("event:7", "수출 상담회", "https://example.com/7", end)]
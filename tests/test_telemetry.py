@@ -0,0 +1,43 @@
+import pytest
+import src.db as db
+from src import bizinfo_client, hot_set, scheduler as sched, telemetry
+from src.db import init_db, log_ingestion_run, get_recent_runs, get_stage_percentiles
+from src.normalizer import normalize_support
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    init_db()
+
+def test_stage_percentiles_over_recent_runs(temp_db):
+    for i in range(1, 21):
+        run = telemetry.new_run("support", "closed")
+        run.update(run_at=f"2024-03-05T10:{i:02d}:00", http_ms=i * 10, upsert_ms=5)
+        log_ingestion_run(run)
+    # An old outlier outside the window is ignored
+    log_ingestion_run(dict(telemetry.new_run("support", "closed"), run_at="2024-01-01T00:00:00", http_ms=99999))
+
+    stats = get_stage_percentiles("support", telemetry.STAGES, runs=20)
+    assert stats["http"] == (100, 190, 20)
+    assert stats["upsert"] == (5, 5, 20)
+    assert stats["score"] == (None, None, 0)
+    assert get_stage_percentiles("event", ["http"])["http"][2] == 0
+
+def test_ingest_records_stages_and_exact_counts(temp_db, monkeypatch):
+    items = [{"pblancId": str(i), "pblancNm": f"공고 {i}"} for i in range(3)]
+    def fetch(probe):
+        sched.client.stats[bizinfo_client.SUPPORT_API_URL] = dict(
+            bizinfo_client.empty_stats(), attempts=2, pages=1, bytes=1234, http_status=200, http_ms=80)
+        return items
+    monkeypatch.setitem(sched.FEEDS, "support", (bizinfo_client.SUPPORT_API_URL, fetch, normalize_support))
+
+    sched._ingest("support")
+    items[0] = dict(items[0], pblancNm="공고 0 (수정)")
+    sched._ingest("support")
+
+    second, first = get_recent_runs("support")[:2]
+    assert (first["new_count"], first["updated_count"], first["unchanged_count"]) == (3, 0, 0)
+    assert (second["new_count"], second["updated_count"], second["unchanged_count"]) == (0, 1, 2)
+    assert (second["retries"], second["bytes_downloaded"], second["http_status"], second["http_ms"]) == (1, 1234, 200, 80)
+    assert all(second[f"{stage}_ms"] is not None for stage in ("normalize", "upsert", "score"))
@@ -0,0 +1,81 @@
+import json
+import pytest
+import src.db as db
+from src import bizinfo_client, hot_set, scheduler as sched, tracing
+from src.db import init_db, get_last_trace, save_spans
+from src.normalizer import normalize_support
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(hot_set, "_snapshot", None)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "_buffer", tracing.deque(maxlen=tracing.MAX_BUFFERED_SPANS))
+    init_db()
+
+def _span(span_id, parent_id, name, offset, duration):
+    return {"span_id": span_id, "parent_id": parent_id, "name": name, "started_at": "2024-03-05T10:00:00",
+            "offset_ms": offset, "duration_ms": duration, "attrs": "{}"}
+
+def test_critical_path_follows_the_spans_that_end_last():
+    spans = [
+        _span("r", None, "ingest", 0, 100),
+        _span("a", "r", "fetch", 0, 60),
+        _span("b", "r", "normalize", 60, 10),
+        _span("c", "r", "cache", 5, 20),  # overlaps fetch, not on the path
+        _span("d", "r", "upsert", 70, 30),
+        _span("e", "a", "http.get", 1, 58),
+    ]
+    path = [(depth, s["name"]) for depth, s in tracing.critical_path(spans)]
+    assert path == [(0, "ingest"), (1, "fetch"), (2, "http.get"), (1, "normalize"), (1, "upsert")]
+    assert tracing.critical_path([]) == []
+
+def test_ingest_run_is_traced_with_nested_spans(temp_db, monkeypatch):
+    items = [{"pblancId": str(i), "pblancNm": f"공고 {i}"} for i in range(3)]
+    monkeypatch.setitem(sched.FEEDS, "support", (bizinfo_client.SUPPORT_API_URL, lambda probe: items, normalize_support))
+    sched._ingest("support")
+    # Nothing is written on the traced path, only by flush()
+    assert get_last_trace("ingest") == []
+    tracing.flush()
+
+    spans = get_last_trace("ingest")
+    by_name = {s["name"]: s for s in spans}
+    root = by_name["ingest:support"]
+    assert root["parent_id"] is None and json.loads(root["attrs"])["circuit"] == "closed"
+    assert json.loads(by_name["upsert"]["attrs"])["inserted"] == 3
+    assert by_name["score"]["parent_id"] == root["span_id"]
+    assert by_name["hot_set.load"]["parent_id"] == by_name["score"]["span_id"]
+    assert json.loads(by_name["db.query_programs"]["attrs"])["rows"] == 3
+    assert "임계 경로" in tracing.format_critical_path(spans)
+    assert get_last_trace("digest") == []
+
+def test_sampling_and_jsonl_sink(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    with tracing.trace("list") as root:
+        with tracing.span("score") as child:
+            assert root is tracing.NOOP and child is tracing.NOOP
+    assert get_last_trace() == []
+
+    # Spans outside a trace are no-ops; errors are recorded on the span
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    assert tracing.current() is tracing.NOOP
+    with pytest.raises(ValueError):
+        with tracing.trace("digest:1"):
+            with tracing.span("telegram.send"):
+                raise ValueError("boom")
+    tracing.flush()
+    rows = [json.loads(line) for line in open(tmp_path / "traces.jsonl", encoding="utf-8")]
+    assert [r["name"] for r in rows] == ["telegram.send", "digest:1"]
+    assert "boom" in json.loads(rows[0]["attrs"])["error"]
+
+def test_prune_drops_old_traces(temp_db):
+    old = _span("o", None, "list", 0, 1)
+    old.update(trace_id="t1", started_at="2000-01-01T00:00:00")
+    save_spans([old])
+    with tracing.trace("list"):
+        pass
+    tracing.flush()
+    tracing.prune()
+    assert get_last_trace()[0]["name"] == "list"
+    assert db.get_connection().execute("SELECT COUNT(*) FROM traces").fetchone()[0] == 1
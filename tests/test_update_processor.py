@@ -0,0 +1,95 @@
+import asyncio
+from telegram import Chat, Message, Update
+from src import response_cache
+from src.update_processor import CommandProcessor, classify
+
+def _update(text, chat_id=1, update_id=1):
+    message = Message(message_id=update_id, date=None, chat=Chat(chat_id, "private"), text=text)
+    return Update(update_id, message=message)
+
+def test_classify_by_command():
+    assert classify(_update("/digest")) == "list"
+    assert classify(_update("/changes@fake_bot 7")) == "list"
+    assert classify(_update("/set_profile")) == "conversation"
+    assert classify(_update("서울")) == "conversation"  # an answer inside /set_profile
+    assert classify(_update("/health")) == "interactive"
+    assert classify(_update("/save_support_1")) == "interactive"
+    assert classify(object()) == "interactive"
+
+def test_list_commands_are_capped_while_interactive_ones_run_right_away():
+    async def scenario():
+        processor = CommandProcessor(max_concurrent_updates=16, list_concurrency=2)
+        await processor.initialize()
+        release = asyncio.Event()
+        running = []
+
+        async def slow(name):
+            running.append(name)
+            await release.wait()
+
+        async def fast():
+            running.append("health")
+
+        lists = [asyncio.create_task(processor.process_update(_update("/digest", i), slow(i))) for i in range(4)]
+        await asyncio.sleep(0.01)
+        await processor.process_update(_update("/health"), fast())
+        seen = list(running)
+        release.set()
+        await asyncio.gather(*lists)
+        return seen, processor.stats()
+
+    seen, stats = asyncio.run(scenario())
+    assert seen == [0, 1, "health"]  # two list slots taken, /health not stuck behind the rest
+    assert stats == {"in_flight": 0, "list": 4, "interactive": 1}
+
+def test_conversation_updates_stay_ordered_per_chat():
+    async def scenario():
+        processor = CommandProcessor(max_concurrent_updates=16)
+        await processor.initialize()
+        order = []
+
+        async def answer(chat_id, step, delay):
+            await asyncio.sleep(delay)
+            order.append((chat_id, step))
+
+        await asyncio.gather(*(
+            processor.process_update(_update(text, chat_id), answer(chat_id, step, delay))
+            for step, (text, delay) in enumerate([("/set_profile", 0.03), ("서울", 0.01), ("AI", 0)])
+            for chat_id in (1, 2)
+        ))
+        return order, processor._chat_locks
+
+    order, locks = asyncio.run(scenario())
+    for chat_id in (1, 2):
+        assert [step for chat, step in order if chat == chat_id] == [0, 1, 2]
+    assert locks == {}
+
+def test_identical_renders_in_flight_coalesce():
+    cache = response_cache.ResponseCache()
+    renders = []
+
+    async def render():
+        renders.append(1)
+        await asyncio.sleep(0.01)
+        return "목록"
+
+    async def scenario():
+        return await asyncio.gather(*(cache.render_once("k", render) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["목록"] * 3
+    assert len(renders) == 1 and cache.coalesced == 2
+    assert cache.get("k") == "목록" and cache._inflight == {}
+
+def test_failed_render_reaches_every_waiter_and_is_not_cached():
+    cache = response_cache.ResponseCache()
+
+    async def render():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db locked")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.render_once("k", render) for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.get("k") is None and cache._inflight == {}